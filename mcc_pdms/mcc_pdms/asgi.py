@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mcc_pdms.settings')
 
 application = get_asgi_application()
+
+# preload the models/indexes listed in settings.WARMUP (by default only
+# the on-disk ANN index) before the first request
+from plant.warmup import warm_up  # noqa: E402
+
+warm_up()
@@ -172,3 +172,114 @@ LOGOUT_REDIRECT_URL = "login"
 STATICFILES_DIRS = [
     BASE_DIR / "plant" / "static",
 ]
+
+
+# RAG retrieval
+# seconds between checks of DocumentChunk for new/removed rows
+RAG_INDEX_REFRESH_SECONDS = 5
+# "exact" (in-memory matrix) or "ann" (index published by build_ann_index)
+RAG_RETRIEVAL_BACKEND = os.environ.get("RAG_RETRIEVAL_BACKEND", "exact")
+RAG_ANN_INDEX_DIR = BASE_DIR / "rag_index"
+RAG_ANN_DEFAULT_NPROBE = 8   # ivf: inverted lists scanned per query
+RAG_ANN_DEFAULT_EF = 64      # graph: search beam width per query
+# query caches (see plant.rag_cache); cleared whenever the corpus changes
+RAG_EMBEDDING_CACHE_SIZE = 2048
+RAG_EMBEDDING_CACHE_TTL = 3600      # seconds
+RAG_RETRIEVAL_CACHE_SIZE = 2048
+RAG_RETRIEVAL_CACHE_TTL = 300       # seconds
+# semantic answer cache in front of the LLM call
+RAG_ANSWER_CACHE_SIZE = 512
+RAG_ANSWER_CACHE_TTL = 1800         # seconds
+RAG_ANSWER_CACHE_THRESHOLD = 0.95   # min cosine similarity between questions
+# "groq", "local" (OpenAI-compatible server) or "stub" (deterministic
+# offline answers for tests/load tests)
+RAG_LLM_BACKEND = os.environ.get("RAG_LLM_BACKEND", "groq")
+RAG_LLM_MODEL = "llama-3.1-8b-instant"
+RAG_LLM_LOCAL_URL = os.environ.get("RAG_LLM_LOCAL_URL", "http://127.0.0.1:8080")
+RAG_LLM_LOCAL_MODEL = os.environ.get("RAG_LLM_LOCAL_MODEL", "local")
+RAG_LLM_TIMEOUT = 30.0              # deadline per LLM call, retries included
+RAG_LLM_MAX_RETRIES = 2
+RAG_LLM_RETRY_BACKOFF = 0.5         # base seconds, doubled per attempt, full jitter
+RAG_LLM_MAX_CONNECTIONS = 20        # keep-alive pool size per process
+RAG_STUB_TOKEN_DELAY = 0.0          # seconds per streamed stub token
+# threads for embedding/index scans behind the async (ASGI) RAG views
+RAG_ASYNC_CPU_THREADS = 4
+# "vector" or "hybrid" (vector + BM25 fused with reciprocal-rank fusion)
+RAG_RETRIEVAL_MODE = os.environ.get("RAG_RETRIEVAL_MODE", "vector")
+RAG_HYBRID_CANDIDATES = 50          # candidates taken from each ranker before fusion
+RAG_RRF_K = 60
+# own root: RAG_ANN_INDEX_DIR holds ANN versions only
+RAG_BM25_INDEX_DIR = BASE_DIR / "rag_index_bm25"
+
+# Request coalescing (plant/singleflight.py). Shared mode coordinates
+# workers through CACHES["default"], which must then be Redis/Memcached.
+SINGLEFLIGHT_SHARED = os.environ.get("SINGLEFLIGHT_SHARED", "0") == "1"
+SINGLEFLIGHT_LOCK_TTL = 60          # seconds a worker may hold a key
+SINGLEFLIGHT_RESULT_TTL = 5         # seconds a finished result is visible to other workers
+SINGLEFLIGHT_POLL_INTERVAL = 0.05
+
+# Prompt context packing (plant/context_packer.py)
+RAG_CONTEXT_TOKEN_BUDGET = 1500     # question + batch info + knowledge base
+RAG_CONTEXT_MAX_SENTENCES = 8       # most query-relevant sentences kept per chunk
+RAG_CONTEXT_TOKENIZER = "approx"    # or "tiktoken" (if installed)
+
+# Models/indexes preloaded when a WSGI/ASGI worker boots (plant/warmup.py):
+# comma-separated from embeddings, index, ann, lexical, llm, quality,
+# anomaly - or "all". Everything else loads on first use.
+WARMUP = os.environ.get("WARMUP", "ann")
+
+# Embedding runtime (ragapp/embeddings.py): "torch" or "onnx" (int8,
+# exported with `manage.py export_onnx_embeddings`)
+RAG_EMBEDDING_BACKEND = os.environ.get("RAG_EMBEDDING_BACKEND", "torch")
+RAG_EMBEDDING_THREADS = int(os.environ.get("RAG_EMBEDDING_THREADS", "0"))   # 0 = all cores
+RAG_ONNX_MODEL_DIR = BASE_DIR / "ml_models" / "minilm-onnx"
+
+# RAG chunking (plant/chunking.py). Changing these re-embeds the affected
+# chunks on the next build_rag_index run.
+RAG_CHUNK_SIZE = 800
+RAG_CHUNK_OVERLAP = 0               # e.g. 100 to repeat boundary text in both chunks
+RAG_CHUNK_UNIT = "chars"            # or "tokens"
+
+# Batch RAG endpoint (/api/rag/query/batch/)
+RAG_BATCH_MAX_QUESTIONS = 50
+RAG_BATCH_LLM_CONCURRENCY = 8       # LLM calls in flight per process; keep <= RAG_LLM_MAX_CONNECTIONS
+
+# LLM admission control (plant/admission.py). Waiting requests hold a worker
+# thread under WSGI, so keep concurrent + queue well below the thread count
+# to leave room for the dashboard endpoints; the rest get 429 + Retry-After.
+RAG_ADMISSION_MAX_CONCURRENT = 8    # 0 disables the limiter
+RAG_ADMISSION_MAX_QUEUE = 16
+RAG_ADMISSION_QUEUE_TIMEOUT = 10.0  # seconds a request may wait for a slot
+RAG_ADMISSION_ROLE_PRIORITY = {     # lower is served first; 0 is reserved for urgent
+    "ADMIN": 1,
+    "PLANT_MANAGER": 1,
+    "QC_ANALYST": 1,
+    "OPERATOR": 2,
+}
+RAG_ADMISSION_URGENT_DOC_TYPES = ["INCIDENT"]
+
+# Batch quality prediction (/api/ml/predict-quality/batch/)
+ML_PREDICT_BATCH_MAX_ITEMS = 1000
+
+# Bulk quality predictions (plant/bulk_predictions.py, manage.py run_predictions)
+ML_BULK_PREDICTION_CHUNK_SIZE = 1000
+
+# Model registry (plant/model_registry.py, manage.py register_model). Each
+# worker checks the active version at most every ML_REGISTRY_CHECK_SECONDS
+# and loads a new one in the background; unregistered models fall back to
+# the files below.
+ML_REGISTRY_DIR = BASE_DIR / "ml_models" / "registry"
+ML_REGISTRY_CHECK_SECONDS = 10.0
+ML_LEGACY_MODEL_PATHS = {
+    "quality": BASE_DIR / "quality_model.pkl",
+    "anomaly": BASE_DIR / "ml_models" / "anomaly_iforest.joblib",
+    "batch_anomaly": BASE_DIR / "models" / "anomaly_iforest.joblib",
+}
+# joblib mmap_mode for model artefacts: numpy arrays in the file are mapped
+# read-only and shared between workers (sklearn trees still copy their node
+# arrays on load). None loads everything into process memory.
+ML_MODEL_MMAP_MODE = "r"
+
+# Anomaly score backfill (plant/anomaly_backfill.py, manage.py backfill_anomaly_scores)
+ML_ANOMALY_BACKFILL_CHUNK_SIZE = 5000
+ML_ANOMALY_BACKFILL_CHECKPOINT = BASE_DIR / "ml_models" / "backfill_anomaly_scores.checkpoint"
@@ -0,0 +1,94 @@
+"""
+Per-call latency benchmark for anomaly_service.detect_anomaly.
+
+"before" is the old behaviour: joblib.load of the model file on every call,
+then one score. "after" is detect_anomaly as it is now, served from the
+in-process model cache (plant/model_registry.py). Also compares a cold
+load with and without joblib memory-mapping (time and Python heap).
+
+    python ml_scripts/bench_anomaly_detect.py
+    python ml_scripts/bench_anomaly_detect.py --calls 500 --model anomaly
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+import warnings
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentiles(samples_ms):
+    samples = sorted(samples_ms)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))]
+    return f"p50 {pick(0.50):8.3f} ms   p95 {pick(0.95):8.3f} ms   mean {statistics.mean(samples):8.3f} ms"
+
+
+def timed(fn, calls):
+    out = []
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument(
+        "--model",
+        default="batch_anomaly",
+        help="registry name: batch_anomaly (anomaly_service) or anomaly (QC moisture/particle size)",
+    )
+    args = parser.parse_args()
+
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "mcc_pdms.settings")
+    import django
+
+    django.setup()
+    import joblib
+    import numpy as np
+
+    from plant import anomaly_service, ml_service, model_registry
+
+    warnings.simplefilter("ignore")   # sklearn version / feature-name warnings
+    loaded = model_registry.get_model(args.model)
+    path = loaded.meta.get("legacy_path") or (
+        model_registry.REGISTRY_DIR / args.model / loaded.version / model_registry.ARTEFACT_FILE
+    )
+    features = np.zeros(loaded.model.n_features_in_)
+    print(f"model {args.model} version {loaded.version} ({os.path.getsize(path) / 1024:.0f} KiB), "
+          f"{args.calls} calls\n")
+
+    def before():
+        model = joblib.load(path)
+        model.decision_function([features])
+        model.predict([features])
+
+    if args.model == "batch_anomaly":
+        after = lambda: anomaly_service.detect_anomaly(features)
+    else:
+        after = lambda: ml_service.predict_anomaly(*features)
+
+    before_ms = timed(before, args.calls)
+    after_ms = timed(after, args.calls)
+    print(f"before  load per call   {percentiles(before_ms)}")
+    print(f"after   cached model    {percentiles(after_ms)}")
+    print(f"speed-up (mean)         {statistics.mean(before_ms) / statistics.mean(after_ms):8.1f}x\n")
+
+    for mmap_mode in (None, "r"):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        joblib.load(path, mmap_mode=mmap_mode)
+        seconds = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"cold load mmap_mode={mmap_mode!s:<5} {seconds * 1000:8.1f} ms   heap peak {peak / 1024:8.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
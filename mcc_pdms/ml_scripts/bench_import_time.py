@@ -0,0 +1,113 @@
+"""
+Import-time benchmark for Django startup.
+
+Measures, in fresh interpreters, how long `django.setup()` + `import
+plant.urls` takes (what every manage.py command and worker boot pays) and
+which heavy ML/LLM libraries that pulls in.
+
+    python ml_scripts/bench_import_time.py               # current tree
+    python ml_scripts/bench_import_time.py --ref HEAD~1  # also an older commit
+
+"eager" re-imports the heavy libraries the URL chain used to load at
+import time, as a stand-in for the old behaviour when no --ref is given.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = [
+    "numpy",
+    "sklearn",
+    "joblib",
+    "langchain_core",
+    "langchain_groq",
+    "sentence_transformers",
+    "torch",
+]
+EAGER_IMPORTS = [
+    "numpy",
+    "joblib",
+    "sklearn.ensemble",
+    "langchain_core.messages",
+    "langchain_groq",
+    "sentence_transformers",
+]
+
+CHILD = """
+import importlib, json, sys, time
+t0 = time.perf_counter()
+import django
+django.setup()
+import plant.urls
+for name in {extra!r}:
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        pass
+print(json.dumps({{
+    "seconds": time.perf_counter() - t0,
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure(project_dir, extra, runs):
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "mcc_pdms.settings")
+    code = CHILD.format(extra=extra, heavy=HEAVY)
+    times, heavy = [], []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=project_dir,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if out.returncode:
+            raise SystemExit(f"import failed in {project_dir}:\n{out.stderr.strip().splitlines()[-1]}")
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(result["seconds"])
+        heavy = result["heavy"]
+    return statistics.median(times), heavy
+
+
+def report(label, seconds, heavy):
+    print(f"{label:<22} {seconds * 1000:8.1f} ms   heavy modules: {', '.join(heavy) or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--ref", help="git revision to measure as the 'before' tree")
+    args = parser.parse_args()
+
+    print(f"median of {args.runs} fresh interpreters: django.setup() + import plant.urls\n")
+    report("lazy (this tree)", *measure(BASE_DIR, [], args.runs))
+    report("eager (simulated)", *measure(BASE_DIR, EAGER_IMPORTS, args.runs))
+
+    if args.ref:
+        top = subprocess.run(
+            ["git", "rev-parse", "--show-toplevel"], cwd=BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        with tempfile.TemporaryDirectory() as tmp:
+            tree = os.path.join(tmp, "tree")
+            subprocess.run(["git", "worktree", "add", "--detach", tree, args.ref], cwd=top, check=True,
+                           capture_output=True)
+            try:
+                project = os.path.join(tree, os.path.relpath(BASE_DIR, top))
+                report(f"{args.ref}", *measure(project, [], args.runs))
+            finally:
+                subprocess.run(["git", "worktree", "remove", "--force", tree], cwd=top, check=False,
+                               capture_output=True)
+
+
+if __name__ == "__main__":
+    main()
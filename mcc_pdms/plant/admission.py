@@ -0,0 +1,305 @@
+# plant/admission.py
+"""
+Admission control for LLM calls.
+
+At most RAG_ADMISSION_MAX_CONCURRENT answers are generated at once per
+process; further requests wait in a priority queue of at most
+RAG_ADMISSION_MAX_QUEUE entries for up to RAG_ADMISSION_QUEUE_TIMEOUT
+seconds. When the queue is full a request is rejected at once, unless it
+outranks the lowest-priority waiter, which is then evicted instead. Rejected
+requests surface as HTTP 429 with Retry-After, so a burst of slow LLM calls
+cannot occupy every worker thread and starve the dashboard endpoints.
+
+Priorities come from UserProfile.role (lower is served first); incident
+questions from privileged roles jump ahead of everything else. The view
+sets the priority with request_priority() and the LLM call sites in
+rag_service pick it up from a context variable.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import re
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+
+
+MAX_CONCURRENT = getattr(settings, "RAG_ADMISSION_MAX_CONCURRENT", 8)
+MAX_QUEUE = getattr(settings, "RAG_ADMISSION_MAX_QUEUE", 16)
+QUEUE_TIMEOUT = getattr(settings, "RAG_ADMISSION_QUEUE_TIMEOUT", 10.0)
+ROLE_PRIORITY = getattr(
+    settings,
+    "RAG_ADMISSION_ROLE_PRIORITY",
+    {"ADMIN": 1, "PLANT_MANAGER": 1, "QC_ANALYST": 1, "OPERATOR": 2},
+)
+URGENT_DOC_TYPES = set(getattr(settings, "RAG_ADMISSION_URGENT_DOC_TYPES", ["INCIDENT"]))
+
+URGENT = 0
+DEFAULT_PRIORITY = max(ROLE_PRIORITY.values(), default=2)
+WAIT_SAMPLES = 1000
+
+_INCIDENT_RE = re.compile(r"\bincident", re.IGNORECASE)
+
+_priority = contextvars.ContextVar("rag_priority", default=DEFAULT_PRIORITY)
+
+
+class AdmissionRejected(Exception):
+    """
+    The request was not admitted: "queue_full", "timeout" or "evicted".
+    """
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"LLM capacity exhausted ({reason}); retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def priority_for(user, filters: dict | None = None, question: str = "") -> int:
+    """
+    Priority class for a request (0 = most urgent). Roles map through
+    RAG_ADMISSION_ROLE_PRIORITY; privileged roles asking about incidents
+    (doc_type filter or the word in the question) get URGENT.
+    """
+    profile = getattr(user, "profile", None)
+    role = profile.role if profile else "OPERATOR"
+    priority = ROLE_PRIORITY.get(role, DEFAULT_PRIORITY)
+    if priority < DEFAULT_PRIORITY:
+        doc_types = set((filters or {}).get("doc_types") or ())
+        if doc_types & URGENT_DOC_TYPES or (
+            "INCIDENT" in URGENT_DOC_TYPES and _INCIDENT_RE.search(question or "")
+        ):
+            priority = URGENT
+    return priority
+
+
+@contextmanager
+def request_priority(priority: int):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "enqueued", "state", "event", "loop", "future")
+
+    def __init__(self, priority: int, seq: int, loop=None):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = time.perf_counter()
+        self.state = "waiting"          # -> "granted" | "evicted" | "timeout" | "cancelled"
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionController:
+    """
+    Bounded concurrency with a priority queue, shared by threads and event
+    loops. A released slot is handed directly to the best waiter.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, timeout: float):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._active = 0
+            self._queue = []            # heap of (priority, seq, waiter)
+            self.admitted = 0
+            self.rejected = {"queue_full": 0, "timeout": 0, "evicted": 0}
+            self.cancelled = 0          # callers that gave up while queued
+            self._waits = {}            # priority -> deque of wait ms
+            self._service_avg = 2.0     # seconds, EWMA of slot hold time
+
+    # ---- bookkeeping (callers hold self._lock) ----
+    def _retry_after(self) -> int:
+        backlog = (len(self._queue) + 1) / max(self.max_concurrent, 1)
+        return max(1, math.ceil(self._service_avg * backlog))
+
+    def _admit(self, priority: int, waited: float):
+        self.admitted += 1
+        self._waits.setdefault(priority, deque(maxlen=WAIT_SAMPLES)).append(waited * 1000)
+
+    def _remove(self, waiter):
+        self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+        heapq.heapify(self._queue)
+
+    # ---- protocol ----
+    def check(self, priority: int | None = None):
+        """
+        Raise AdmissionRejected now if a request of this priority would be
+        turned away (used before a streaming response commits to 200).
+        """
+        priority = current_priority() if priority is None else priority
+        with self._lock:
+            if (
+                self.max_concurrent > 0
+                and self._active >= self.max_concurrent
+                and len(self._queue) >= self.max_queue
+                and max((p for p, _, _ in self._queue), default=priority) <= priority
+            ):
+                self.rejected["queue_full"] += 1
+                raise AdmissionRejected("queue_full", self._retry_after())
+
+    def _enter(self, priority: int, loop=None):
+        """
+        Take a slot (returns None) or enqueue (returns the waiter).
+        """
+        with self._lock:
+            if self.max_concurrent <= 0 or (
+                self._active < self.max_concurrent and not self._queue
+            ):
+                self._active += 1
+                self._admit(priority, 0.0)
+                return None
+            if len(self._queue) >= self.max_queue:
+                worst = max(self._queue, key=lambda entry: (entry[0], entry[1])) if self._queue else None
+                if worst is None or worst[0] <= priority:
+                    self.rejected["queue_full"] += 1
+                    raise AdmissionRejected("queue_full", self._retry_after())
+                self._remove(worst[2])
+                worst[2].state = "evicted"
+                self.rejected["evicted"] += 1
+                worst[2].wake()
+            waiter = _Waiter(priority, next(self._seq), loop)
+            heapq.heappush(self._queue, (priority, waiter.seq, waiter))
+            return waiter
+
+    def _settle(self, waiter) -> bool:
+        """
+        After a wait ended: True if the slot was granted, otherwise the
+        waiter is dropped from the queue and AdmissionRejected is raised.
+        """
+        with self._lock:
+            if waiter.state == "granted":
+                return True
+            if waiter.state == "waiting":
+                self._remove(waiter)
+                waiter.state = "timeout"
+                self.rejected["timeout"] += 1
+            raise AdmissionRejected(waiter.state, self._retry_after())
+
+    def _release(self, held: float):
+        with self._lock:
+            self._service_avg = 0.9 * self._service_avg + 0.1 * held
+            while self._queue:
+                _, _, waiter = heapq.heappop(self._queue)
+                if waiter.state == "waiting":
+                    waiter.state = "granted"
+                    self._admit(waiter.priority, time.perf_counter() - waiter.enqueued)
+                    waiter.wake()
+                    return
+            self._active -= 1
+
+    def _cancel(self, waiter) -> bool:
+        """
+        The waiting task was cancelled: drop it from the queue without
+        counting a rejection. True if a slot had already been granted.
+        """
+        with self._lock:
+            if waiter.state == "granted":
+                return True
+            if waiter.state == "waiting":
+                self._remove(waiter)
+                waiter.state = "cancelled"
+                self.cancelled += 1
+            return False
+
+    @contextmanager
+    def slot(self, priority: int | None = None):
+        priority = current_priority() if priority is None else priority
+        waiter = self._enter(priority)
+        if waiter is not None:
+            waiter.event.wait(self.timeout)
+            self._settle(waiter)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def aslot(self, priority: int | None = None):
+        priority = current_priority() if priority is None else priority
+        waiter = self._enter(priority, loop=asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(waiter.future, self.timeout)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                if self._cancel(waiter):
+                    # granted while we were being cancelled; give it back
+                    self._release(0.0)
+                raise
+            self._settle(waiter)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(time.perf_counter() - started)
+
+    # ---- metrics ----
+    def stats(self) -> dict:
+        with self._lock:
+            queued = {}
+            for priority, _, _ in self._queue:
+                queued[priority] = queued.get(priority, 0) + 1
+            all_waits = [w for waits in self._waits.values() for w in waits]
+            by_priority = {p: list(w) for p, w in sorted(self._waits.items())}
+            out = {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queue_depth": len(self._queue),
+                "queued_by_priority": queued,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "cancelled": self.cancelled,
+                "service_seconds_avg": round(self._service_avg, 3),
+            }
+
+        def percentiles(values):
+            if not values:
+                return None
+            values = sorted(values)
+            pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))], 2)
+            return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": round(values[-1], 2)}
+
+        out["wait_ms"] = percentiles(all_waits)
+        out["wait_ms_by_priority"] = {p: percentiles(w) for p, w in by_priority.items()}
+        return out
+
+
+llm_admission = AdmissionController("llm", MAX_CONCURRENT, MAX_QUEUE, QUEUE_TIMEOUT)
+
+
+def admission_stats() -> dict:
+    return llm_admission.stats()
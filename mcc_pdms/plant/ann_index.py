@@ -0,0 +1,325 @@
+# plant/ann_index.py
+import heapq
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .vector_index import normalize_rows
+
+
+ALGORITHMS = ("ivf", "graph")
+
+INDEX_DIR = Path(getattr(settings, "RAG_ANN_INDEX_DIR", Path(settings.BASE_DIR) / "rag_index"))
+DEFAULT_NPROBE = getattr(settings, "RAG_ANN_DEFAULT_NPROBE", 8)
+DEFAULT_EF = getattr(settings, "RAG_ANN_DEFAULT_EF", 64)
+RELOAD_INTERVAL = getattr(settings, "RAG_INDEX_REFRESH_SECONDS", 5.0)
+
+CURRENT_FILE = "CURRENT"
+META_FILE = "meta.json"
+BLOCK_SIZE = 8192
+# names written by AnnIndex.save (older builds had no sub-second/pid part);
+# anything else under INDEX_DIR is not ours to prune
+VERSION_RE = re.compile(rf"\d{{14}}(?:-\d{{9}}-\d+)?-(?:{'|'.join(ALGORITHMS)})")
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), BLOCK_SIZE):
+        block = vectors[start:start + BLOCK_SIZE]
+        out[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def _kmeans(vectors: np.ndarray, nlist: int, iterations: int, rng) -> np.ndarray:
+    """
+    Spherical k-means on (a sample of) the unit vectors.
+    """
+    sample_size = min(len(vectors), nlist * 256)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        counts = np.bincount(assign, minlength=nlist)
+        filled = counts > 0
+        centroids[filled] = normalize_rows(sums[filled])
+    return centroids
+
+
+class AnnIndex:
+    """
+    Approximate nearest-neighbour index over chunk embeddings.
+
+    Vectors are clustered with k-means and stored grouped by cluster
+    (inverted lists). "ivf" scans the `nprobe` closest lists; "graph" walks
+    a fixed-degree k-NN graph (HNSW-style best-first search with beam
+    width `ef`), entering from the cluster representatives closest to the
+    query. Arrays are saved as .npy files and loaded memory-mapped, so
+    workers on the same host share the page cache.
+    """
+
+    def __init__(self, meta, centroids, offsets, entries, vectors, ids, neighbors=None):
+        self.meta = meta
+        self.algorithm = meta["algorithm"]
+        self.centroids = centroids
+        self.offsets = offsets
+        self.entries = entries
+        self.vectors = vectors
+        self.ids = ids
+        self.neighbors = neighbors
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    # ---- build ----
+    @classmethod
+    def build(cls, ids, vectors, algorithm="ivf", nlist=None, degree=16,
+              iterations=10, build_probe=8, seed=42):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown ANN algorithm {algorithm!r}")
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = normalize_rows(vectors)
+        n = len(ids)
+        if n == 0:
+            raise ValueError("Cannot build an ANN index over zero vectors")
+
+        rng = np.random.default_rng(seed)
+        nlist = min(nlist or max(1, int(4 * np.sqrt(n))), n)
+        centroids = _kmeans(vectors, nlist, iterations, rng)
+
+        # group vectors by list so each list is one contiguous slice
+        assign = _assign(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        vectors = np.ascontiguousarray(vectors[order])
+        ids = ids[order]
+        counts = np.bincount(assign, minlength=nlist)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        # list representative = member closest to its centroid
+        entries = np.full(nlist, -1, dtype=np.int64)
+        for l in range(nlist):
+            lo, hi = offsets[l], offsets[l + 1]
+            if hi > lo:
+                entries[l] = lo + int(np.argmax(vectors[lo:hi] @ centroids[l]))
+
+        neighbors = None
+        if algorithm == "graph":
+            neighbors = cls._build_graph(vectors, centroids, offsets, degree, build_probe)
+
+        meta = {
+            "algorithm": algorithm,
+            "count": int(n),
+            "dim": int(vectors.shape[1]),
+            "nlist": int(nlist),
+            "degree": int(degree) if neighbors is not None else None,
+            "max_id": int(ids.max()),
+            "built_at": time.time(),
+        }
+        return cls(meta, centroids, offsets, entries, vectors, ids, neighbors)
+
+    @staticmethod
+    def _build_graph(vectors, centroids, offsets, degree, build_probe):
+        """
+        Approximate k-NN graph: neighbours of a list's members are searched
+        among the members of the `build_probe` lists closest to it.
+        """
+        nlist = len(centroids)
+        neighbors = np.full((len(vectors), degree), -1, dtype=np.int32)
+        probe = min(build_probe, nlist)
+        near_lists = np.argsort(-(centroids @ centroids.T), axis=1)[:, :probe]
+
+        for l in range(nlist):
+            lo, hi = offsets[l], offsets[l + 1]
+            if hi == lo:
+                continue
+            others = [c for c in near_lists[l].tolist() if c != l]
+            cand = np.concatenate(
+                [np.arange(lo, hi)] + [np.arange(offsets[c], offsets[c + 1]) for c in others]
+            )
+            sims = vectors[lo:hi] @ vectors[cand].T
+            # members of list l come first in `cand`: mask self-similarity
+            sims[np.arange(hi - lo), np.arange(hi - lo)] = -np.inf
+            m = min(degree, len(cand) - 1)
+            if m <= 0:
+                continue
+            top = np.argpartition(-sims, m - 1, axis=1)[:, :m]
+            neighbors[lo:hi, :m] = cand[top]
+        return neighbors
+
+    # ---- persistence ----
+    def save(self, root: Path = INDEX_DIR, keep: int = 2) -> Path:
+        """
+        Write the index into a new version directory under `root` and
+        atomically point root/CURRENT at it. Older versions beyond `keep`
+        are removed (workers still mapping them keep their open pages);
+        other directories under `root` are left alone.
+        """
+        root = Path(root)
+        # sub-second and pid suffixes keep builds in the same second apart
+        # while versions still sort chronologically
+        version = (
+            f"{time.strftime('%Y%m%d%H%M%S')}-{time.time_ns() % 1_000_000_000:09d}"
+            f"-{os.getpid()}-{self.algorithm}"
+        )
+        path = root / version
+        path.mkdir(parents=True, exist_ok=False)
+
+        np.save(path / "centroids.npy", self.centroids)
+        np.save(path / "offsets.npy", self.offsets)
+        np.save(path / "entries.npy", self.entries)
+        np.save(path / "vectors.npy", self.vectors)
+        np.save(path / "ids.npy", self.ids)
+        if self.neighbors is not None:
+            np.save(path / "neighbors.npy", self.neighbors)
+        (path / META_FILE).write_text(json.dumps(self.meta, indent=2))
+
+        tmp = root / (CURRENT_FILE + ".tmp")
+        tmp.write_text(version)
+        tmp.replace(root / CURRENT_FILE)
+
+        versions = sorted(p for p in root.iterdir() if p.is_dir() and VERSION_RE.fullmatch(p.name))
+        for old in versions[:-keep]:
+            shutil.rmtree(old, ignore_errors=True)
+        return path
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True):
+        path = Path(path)
+        mode = "r" if mmap else None
+        meta = json.loads((path / META_FILE).read_text())
+        neighbors_path = path / "neighbors.npy"
+        return cls(
+            meta,
+            centroids=np.load(path / "centroids.npy"),
+            offsets=np.load(path / "offsets.npy"),
+            entries=np.load(path / "entries.npy"),
+            vectors=np.load(path / "vectors.npy", mmap_mode=mode),
+            ids=np.load(path / "ids.npy", mmap_mode=mode),
+            neighbors=np.load(neighbors_path, mmap_mode=mode) if neighbors_path.exists() else None,
+        )
+
+    # ---- query ----
+    def search(self, query, k: int = 5, nprobe: int | None = None, ef: int | None = None):
+        """
+        Return (chunk_ids, scores) of the approximate top-k, best first.
+        `nprobe` (ivf) and `ef` (graph) trade recall for latency.
+        """
+        q = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        if q.shape[0] != self.vectors.shape[1]:
+            raise ValueError(
+                f"Query dim {q.shape[0]} does not match index dim {self.vectors.shape[1]}"
+            )
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if self.algorithm == "graph" and self.neighbors is not None:
+            positions, scores = self._search_graph(q, k, ef or DEFAULT_EF)
+        else:
+            positions, scores = self._search_ivf(q, k, nprobe or DEFAULT_NPROBE)
+        return np.asarray(self.ids[positions], dtype=np.int64), scores
+
+    def _closest_lists(self, q, n):
+        c_scores = self.centroids @ q
+        n = min(n, self.nlist)
+        lists = np.argpartition(-c_scores, n - 1)[:n]
+        return lists[np.argsort(-c_scores[lists])]
+
+    def _search_ivf(self, q, k, nprobe):
+        pos_parts, score_parts = [], []
+        for l in self._closest_lists(q, nprobe).tolist():
+            lo, hi = int(self.offsets[l]), int(self.offsets[l + 1])
+            if hi > lo:
+                pos_parts.append(np.arange(lo, hi))
+                score_parts.append(self.vectors[lo:hi] @ q)
+        if not pos_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        positions = np.concatenate(pos_parts)
+        scores = np.concatenate(score_parts)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return positions[top], scores[top]
+
+    def _search_graph(self, q, k, ef):
+        ef = max(ef, k)
+        start = self.entries[self._closest_lists(q, 4)]
+        start = [int(p) for p in start if p >= 0]
+        visited = set(start)
+        start_scores = (self.vectors[start] @ q).tolist()
+
+        candidates = [(-s, p) for s, p in zip(start_scores, start)]   # max-heap
+        heapq.heapify(candidates)
+        results = [(s, p) for s, p in zip(start_scores, start)]       # min-heap of size ef
+        heapq.heapify(results)
+
+        while candidates:
+            neg_score, node = heapq.heappop(candidates)
+            if len(results) >= ef and -neg_score < results[0][0]:
+                break
+            fresh = [n for n in self.neighbors[node].tolist() if n >= 0 and n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for n, s in zip(fresh, (self.vectors[fresh] @ q).tolist()):
+                if len(results) < ef or s > results[0][0]:
+                    heapq.heappush(candidates, (-s, n))
+                    heapq.heappush(results, (s, n))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        best = heapq.nlargest(k, results)
+        positions = np.array([p for _, p in best], dtype=np.int64)
+        scores = np.array([s for s, _ in best], dtype=np.float32)
+        return positions, scores
+
+
+def current_version(root: Path = INDEX_DIR) -> str | None:
+    try:
+        return (Path(root) / CURRENT_FILE).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+_ann = None
+_ann_version = None
+_ann_checked = None
+_ann_lock = threading.Lock()
+
+
+def get_ann_index() -> AnnIndex | None:
+    """
+    Return the memory-mapped index named by INDEX_DIR/CURRENT, reloading
+    (at most every RELOAD_INTERVAL seconds) when a new build is published.
+    """
+    global _ann, _ann_version, _ann_checked
+    now = time.monotonic()
+    if _ann_checked is not None and now - _ann_checked < RELOAD_INTERVAL:
+        return _ann
+    with _ann_lock:
+        version = current_version()
+        if version != _ann_version:
+            _ann = AnnIndex.load(INDEX_DIR / version) if version else None
+            _ann_version = version
+        _ann_checked = now
+    return _ann
+
+
+def preload_ann_index():
+    """
+    Map the published index before the first request when the ANN backend
+    is enabled. Called from the WSGI/ASGI entry points.
+    """
+    if getattr(settings, "RAG_RETRIEVAL_BACKEND", "exact") == "ann":
+        get_ann_index()
@@ -0,0 +1,216 @@
+# plant/anomaly_backfill.py
+"""
+Anomaly scores for all production batches, in id-ordered chunks.
+
+The parent pages through ids and cuts them into id ranges of chunk_size.
+Each range is scored by streaming only the feature columns
+(values_list().iterator()), building one feature matrix, making one decision_function call
+and writing back with one bulk_update, either in-process or in a pool of
+worker processes (--workers). Ranges are completed in order, and after each
+one the last id is written to a checkpoint file, so an interrupted run
+resumes after the last fully written range. Used by
+`manage.py backfill_anomaly_scores`.
+"""
+import json
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.db import connections, transaction
+
+from . import model_registry
+from .anomaly_service import MODEL_NAME, detect_anomaly_many, feature_columns, feature_matrix
+from .models import ProductionBatch
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = getattr(settings, "ML_ANOMALY_BACKFILL_CHUNK_SIZE", 5000)
+CHECKPOINT_PATH = Path(
+    getattr(
+        settings,
+        "ML_ANOMALY_BACKFILL_CHECKPOINT",
+        Path(settings.BASE_DIR) / "ml_models" / "backfill_anomaly_scores.checkpoint",
+    )
+)
+UPDATE_FIELDS = ["anomaly_score", "is_anomaly"]
+
+
+# ---- checkpoint ----
+def read_checkpoint(path: Path = CHECKPOINT_PATH) -> dict | None:
+    try:
+        return json.loads(Path(path).read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_checkpoint(state: dict, path: Path = CHECKPOINT_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(state))
+    tmp.replace(path)
+
+
+def clear_checkpoint(path: Path = CHECKPOINT_PATH):
+    Path(path).unlink(missing_ok=True)
+
+
+# ---- planning / scoring ----
+def _queryset(only_missing: bool):
+    qs = ProductionBatch.objects.all()
+    if only_missing:
+        qs = qs.filter(anomaly_score__isnull=True)
+    return qs
+
+
+def plan_ranges(only_missing: bool, after_id: int, chunk_size: int, limit: int | None = None):
+    """
+    Yield (first_id, last_id) ranges of up to chunk_size batches with
+    id > after_id. Pages by id reading only ids, so no cursor stays open
+    while workers write.
+    """
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = chunk_size if remaining is None else min(chunk_size, remaining)
+        ids = list(
+            _queryset(only_missing)
+            .filter(id__gt=after_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:size]
+        )
+        if not ids:
+            return
+        yield ids[0], ids[-1]
+        after_id = ids[-1]
+        if remaining is not None:
+            remaining -= len(ids)
+
+
+def score_range(first_id: int, last_id: int, only_missing: bool, loaded) -> int:
+    """
+    Score and write the batches with first_id <= id <= last_id. Returns the
+    number of rows updated.
+    """
+    columns = feature_columns()
+    rows = list(
+        _queryset(only_missing)
+        .filter(id__gte=first_id, id__lte=last_id)
+        .order_by("id")
+        .values_list("id", *columns)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    if not rows:
+        return 0
+    scores, flags = detect_anomaly_many(feature_matrix([row[1:] for row in rows], columns), loaded)
+    with transaction.atomic():
+        # the version is the same for the whole range: one plain UPDATE, and
+        # bulk_update (a CASE per field and row) only for the per-row values
+        _queryset(only_missing).filter(id__gte=first_id, id__lte=last_id).update(
+            anomaly_model_version=loaded.version
+        )
+        ProductionBatch.objects.bulk_update(
+            [
+                ProductionBatch(id=row[0], anomaly_score=float(score), is_anomaly=bool(flag))
+                for row, score, flag in zip(rows, scores, flags)
+            ],
+            UPDATE_FIELDS,
+            batch_size=1000,
+        )
+    return len(rows)
+
+
+# ---- worker processes ----
+_worker_models = {}
+
+
+def _score_range_in_worker(first_id, last_id, only_missing, version):
+    """
+    score_range in a pool process, loading the parent's model version once
+    per process (None = the unregistered legacy file).
+    """
+    loaded = _worker_models.get(version)
+    if loaded is None:
+        loaded = _worker_models[version] = model_registry.load_version(MODEL_NAME, version)
+    return score_range(first_id, last_id, only_missing, loaded)
+
+
+def run_backfill(
+    chunk_size: int = CHUNK_SIZE,
+    workers: int = 1,
+    only_missing: bool = False,
+    limit: int | None = None,
+    restart: bool = False,
+    checkpoint: Path = CHECKPOINT_PATH,
+    progress=None,
+) -> dict:
+    """
+    Score every (or every unscored) batch, resuming from `checkpoint`
+    unless `restart`. `progress(stats)` is called after each range. Raises
+    FileNotFoundError when there is no anomaly model.
+    """
+    started = time.perf_counter()
+    loaded = model_registry.get_model(MODEL_NAME)
+    state = None if restart else read_checkpoint(checkpoint)
+    if state and (state.get("model_version") != loaded.version or state.get("only_missing") != only_missing):
+        logger.info("anomaly backfill: checkpoint %s is for another run, starting over", state)
+        state = None
+    after_id = state["last_id"] if state else 0
+    stats = {
+        "model_version": loaded.version,
+        "resumed_after_id": after_id,
+        "batches": 0,
+        "chunks": 0,
+        "workers": workers,
+    }
+
+    def done(last_id, count):
+        stats["batches"] += count
+        stats["chunks"] += 1
+        stats["last_id"] = last_id
+        stats["seconds"] = round(time.perf_counter() - started, 2)
+        write_checkpoint(
+            {"last_id": last_id, "model_version": loaded.version, "only_missing": only_missing},
+            checkpoint,
+        )
+        if progress is not None:
+            progress(dict(stats))
+
+    ranges = plan_ranges(only_missing, after_id, chunk_size, limit)
+    if workers <= 1:
+        for first_id, last_id in ranges:
+            done(last_id, score_range(first_id, last_id, only_missing, loaded))
+    else:
+        # spawn: children start clean (no inherited DB connections or
+        # registry threads) and run django.setup() before their first task
+        connections.close_all()
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+        version = None if loaded.legacy else loaded.version
+        pending = deque()
+        try:
+            for first_id, last_id in ranges:
+                pending.append((last_id, pool.submit(_score_range_in_worker, first_id, last_id, only_missing, version)))
+                # bounded look-ahead; results are consumed in id order so
+                # the checkpoint only ever covers fully written ranges
+                while len(pending) >= workers * 2:
+                    last, future = pending.popleft()
+                    done(last, future.result())
+            while pending:
+                last, future = pending.popleft()
+                done(last, future.result())
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    if not limit or stats["batches"] < limit:
+        clear_checkpoint(checkpoint)    # finished; a --limit run resumes next time
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
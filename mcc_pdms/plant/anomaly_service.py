@@ -1,44 +1,91 @@
 # plant/anomaly_service.py
-import numpy as np
-from sklearn.ensemble import IsolationForest
-from pathlib import Path
-import joblib
+from .model_registry import get_model, register_model
 from .models import ProductionBatch
 
+# numpy / sklearn / joblib are imported on first use (see plant/warmup.py)
 
-MODEL_PATH = Path("models/anomaly_iforest.joblib")
+# registry name; unregistered, this falls back to BASE_DIR/models/anomaly_iforest.joblib
+MODEL_NAME = "batch_anomaly"
 
 FEATURES = ["temp", "pressure", "ph"]  # replace with real fields
+# value used when a batch has no such attribute (none of the dummies are fields yet)
+FEATURE_DEFAULTS = {"temp": 0.0, "pressure": 0.0, "ph": 7.0}
 
 def extract_features(batch: ProductionBatch):
+    import numpy as np
+
     # dummy: replace with real numeric fields
-    return np.array([
-        float(getattr(batch, "temp", 0.0)),
-        float(getattr(batch, "pressure", 0.0)),
-        float(getattr(batch, "ph", 7.0)),
-    ])
+    return np.array([float(getattr(batch, f, FEATURE_DEFAULTS[f])) for f in FEATURES])
+
+def feature_columns() -> list[str]:
+    """
+    FEATURES that are concrete ProductionBatch columns, i.e. what a
+    values_list() query has to read to build the feature matrix.
+    """
+    names = {f.attname for f in ProductionBatch._meta.concrete_fields}
+    return [f for f in FEATURES if f in names]
+
+def feature_matrix(rows, columns):
+    """
+    N x len(FEATURES) matrix from values_list rows holding `columns`, with
+    the same defaults extract_features applies.
+    """
+    import numpy as np
+
+    X = np.tile(np.array([FEATURE_DEFAULTS[f] for f in FEATURES], dtype=np.float64), (len(rows), 1))
+    if columns and len(rows):
+        # None -> NaN in one conversion, then NaN -> default per column
+        values = np.array(rows, dtype=object).reshape(len(rows), len(columns))
+        values = np.where(values == None, np.nan, values).astype(np.float64)  # noqa: E711
+        for j, name in enumerate(columns):
+            col = FEATURES.index(name)
+            X[:, col] = np.where(np.isnan(values[:, j]), X[:, col], values[:, j])
+    return X
 
 def train_anomaly_model():
+    from sklearn.ensemble import IsolationForest
+
+    columns = feature_columns()
     qs = ProductionBatch.objects.all()
-    X = np.array([extract_features(b) for b in qs])
+    X = feature_matrix(list(qs.values_list(*columns)) if columns else [()] * qs.count(), columns)
     if len(X) < 10:
         return None
     model = IsolationForest(contamination=0.05, random_state=42)
     model.fit(X)
-    MODEL_PATH.parent.mkdir(parents=True, exist_ok=True)
-    joblib.dump(model, MODEL_PATH)
+    register_model(
+        MODEL_NAME,
+        model,
+        features=FEATURES,
+        metrics={"n_samples": len(X), "contamination": 0.05},
+    )
     return model
 
+def loaded_model():
+    """
+    Current registry snapshot, or None when no model has been trained yet.
+    """
+    try:
+        return get_model(MODEL_NAME)
+    except FileNotFoundError:
+        return None
+
 def load_model():
-    if MODEL_PATH.exists():
-        return joblib.load(MODEL_PATH)
-    return None
+    loaded = loaded_model()
+    return loaded.model if loaded else None
+
+def detect_anomaly_many(X, loaded):
+    """
+    Score an N x len(FEATURES) matrix with one decision_function call.
+    Returns (scores, is_anomaly) arrays; higher score = more anomalous.
+    """
+    # IsolationForest.predict is decision_function < 0; score the trees once
+    decision = loaded.model.decision_function(X)
+    return -decision, decision < 0
 
-def detect_anomaly(features: np.ndarray):
-    model = load_model()
-    if model is None:
+def detect_anomaly(features):
+    loaded = loaded_model()
+    if loaded is None:
         # Optional: train on demand
-        return {"score": 0.0, "is_anomaly": False}
-    score = -model.decision_function([features])[0]
-    is_anomaly = model.predict([features])[0] == -1
-    return {"score": float(score), "is_anomaly": bool(is_anomaly)}
+        return {"score": 0.0, "is_anomaly": False, "model_version": ""}
+    scores, flags = detect_anomaly_many([features], loaded)
+    return {"score": float(scores[0]), "is_anomaly": bool(flags[0]), "model_version": loaded.version}
@@ -0,0 +1,166 @@
+# plant/bulk_predictions.py
+"""
+Quality predictions for all COMPLETED batches.
+
+Batches are read in id-ordered chunks together with the id and model
+version of their latest QCReport (one subquery, no per-batch lookups).
+Each chunk is scored with one predict_proba call and written with one
+bulk_update plus one bulk_create. Used by `manage.py run_predictions` and,
+as a background thread, by the dashboard's "run predictions" action.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .ml_service import predict_quality_many, quality_model
+from .models import ProductionBatch, QCReport
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = getattr(settings, "ML_BULK_PREDICTION_CHUNK_SIZE", 1000)
+PREDICTION_FIELDS = ["predicted_pass", "predicted_probability", "model_version", "predicted_at"]
+
+
+def completed_batches(only_stale: bool = False, version: str | None = None):
+    """
+    COMPLETED batches annotated with their latest QCReport. With only_stale,
+    batches whose latest report was already predicted by `version` are
+    left out.
+    """
+    latest = QCReport.objects.filter(batch=OuterRef("pk")).order_by("-created_at", "-id")
+    qs = ProductionBatch.objects.filter(status="COMPLETED").annotate(
+        latest_qc_id=Subquery(latest.values("id")[:1]),
+        latest_qc_version=Subquery(latest.values("model_version")[:1]),
+        latest_predicted_at=Subquery(latest.values("predicted_at")[:1]),
+    )
+    if only_stale:
+        qs = qs.filter(
+            Q(latest_qc_id__isnull=True)
+            | Q(latest_predicted_at__isnull=True)
+            | ~Q(latest_qc_version=version)
+        )
+    return qs
+
+
+def iter_batch_chunks(qs, chunk_size: int = CHUNK_SIZE):
+    """
+    Yield lists of (batch_id, process_parameters_json, latest_qc_id),
+    paging by id so each chunk is one indexed query.
+    """
+    last_id = 0
+    while True:
+        rows = list(
+            qs.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "process_parameters_json", "latest_qc_id")[:chunk_size]
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def _apply_chunk(rows, loaded, stats: dict):
+    predictions = predict_quality_many([params or {} for _, params, _ in rows], loaded)
+    now = timezone.now()
+    updates, creates = [], []
+    for (batch_id, _, qc_id), prediction in zip(rows, predictions):
+        if isinstance(prediction, ValueError):
+            stats["invalid"] += 1
+            continue
+        predicted_pass, probability = prediction
+        fields = {
+            "predicted_pass": predicted_pass,
+            "predicted_probability": probability,
+            "model_version": loaded.version,
+            "predicted_at": now,
+        }
+        if qc_id:
+            updates.append(QCReport(id=qc_id, **fields))
+        else:
+            creates.append(QCReport(batch_id=batch_id, **fields))
+    with transaction.atomic():
+        QCReport.objects.bulk_update(updates, PREDICTION_FIELDS, batch_size=500)
+        QCReport.objects.bulk_create(creates, batch_size=500)
+    stats["updated"] += len(updates)
+    stats["created"] += len(creates)
+
+
+def run_bulk_predictions(chunk_size: int = CHUNK_SIZE, only_stale: bool = False, progress=None) -> dict:
+    """
+    Predict every (or every stale) completed batch. `progress(stats)` is
+    called after each chunk. Returns counts and timings.
+    """
+    started = time.perf_counter()
+    # one snapshot for the whole run, so a hot reload midway cannot mix versions
+    loaded = quality_model()
+    version = loaded.version
+    stats = {
+        "model_version": version,
+        "only_stale": only_stale,
+        "batches": 0,
+        "updated": 0,
+        "created": 0,
+        "invalid": 0,
+        "chunks": 0,
+    }
+    qs = completed_batches(only_stale=only_stale, version=version)
+    for rows in iter_batch_chunks(qs, chunk_size):
+        _apply_chunk(rows, loaded, stats)
+        stats["batches"] += len(rows)
+        stats["chunks"] += 1
+        stats["seconds"] = round(time.perf_counter() - started, 2)
+        if progress is not None:
+            progress(dict(stats))
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
+
+
+# ---- background job (one per process) ----
+_job_lock = threading.Lock()
+_job = {"state": "idle"}
+
+
+def _run_job(options: dict):
+    def progress(stats):
+        with _job_lock:
+            _job["progress"] = stats
+
+    try:
+        result = run_bulk_predictions(progress=progress, **options)
+    except Exception as exc:
+        logger.exception("bulk predictions failed")
+        with _job_lock:
+            _job.update(state="failed", error=str(exc), finished_at=timezone.now().isoformat())
+    else:
+        logger.info("bulk predictions: %s", result)
+        with _job_lock:
+            _job.update(state="done", result=result, finished_at=timezone.now().isoformat())
+    finally:
+        # this thread opened its own DB connections
+        connections.close_all()
+
+
+def start_background_run(**options) -> bool:
+    """
+    Start run_bulk_predictions(**options) in a daemon thread. Returns False
+    if a run is already in progress in this process.
+    """
+    with _job_lock:
+        if _job["state"] == "running":
+            return False
+        _job.clear()
+        _job.update(state="running", options=options, started_at=timezone.now().isoformat())
+    threading.Thread(target=_run_job, args=(options,), name="bulk-predictions", daemon=True).start()
+    return True
+
+
+def job_status() -> dict:
+    with _job_lock:
+        return dict(_job)
@@ -0,0 +1,131 @@
+# plant/chunking.py
+"""
+Streaming text chunker for RAG ingestion.
+
+Files are read in fixed-size blocks and chunks are produced by generators,
+so memory stays bounded by one chunk (plus one read block) however large
+the document is. Lines are the packing unit, as before. A line longer than
+the chunk size is packed as its sentences instead (rejoined with spaces),
+and a sentence that is still too long as its words. Consecutive chunks can
+share a tail of up to `overlap` units, so text at a boundary appears in
+both, including inside a long paragraph.
+
+With overlap=0 and unit="chars" the output is identical to the original
+line-packing splitter only while no line is longer than max_size. The old
+splitter kept such a line as one oversized chunk. Documents containing one
+are re-chunked and re-embedded on their first build after the switch.
+"""
+import re
+
+from django.conf import settings
+
+
+CHUNK_SIZE = getattr(settings, "RAG_CHUNK_SIZE", 800)
+CHUNK_OVERLAP = getattr(settings, "RAG_CHUNK_OVERLAP", 0)
+CHUNK_UNIT = getattr(settings, "RAG_CHUNK_UNIT", "chars")
+READ_BLOCK = 1 << 20            # characters read per I/O call
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?;])\s+")
+
+
+def _measure(unit: str):
+    if unit == "chars":
+        return len, 1           # units are joined with "\n"
+    if unit == "tokens":
+        from .context_packer import count_tokens
+
+        return count_tokens, 0
+    raise ValueError(f"unit must be 'chars' or 'tokens', not {unit!r}")
+
+
+def iter_lines(fileobj, block_size: int = READ_BLOCK):
+    """
+    Yield lines from a text file object, reading `block_size` characters at
+    a time. A line longer than one block is yielded in block-sized pieces
+    (cut at the last whitespace) instead of being buffered whole.
+    """
+    pending = ""
+    while True:
+        block = fileobj.read(block_size)
+        if not block:
+            break
+        pending += block
+        lines = pending.split("\n")
+        pending = lines.pop()
+        yield from lines
+        if len(pending) > block_size:
+            cut = pending.rfind(" ", 0, block_size)
+            cut = cut if cut > 0 else block_size
+            yield pending[:cut]
+            pending = pending[cut:]
+    if pending:
+        yield pending
+
+
+def _joined(units, joins) -> str:
+    return units[0] + "".join(j + u for j, u in zip(joins[1:], units[1:]))
+
+
+def _split_long(text: str, max_size: int, size):
+    """
+    Yield a unit larger than max_size as its sentences, and a sentence that
+    is still too long as its words. They are packed (and carried as overlap)
+    by iter_chunks like any other unit.
+    """
+    if size(text) <= max_size:
+        yield text
+        return
+    for sentence in _SENTENCE_END_RE.split(text):
+        if size(sentence) <= max_size:
+            yield sentence
+        else:
+            yield from sentence.split()
+
+
+def iter_chunks(lines, max_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP, unit: str = CHUNK_UNIT):
+    """
+    Pack lines into chunks of at most `max_size` chars/tokens, repeating up
+    to `overlap` of trailing units at the start of the next chunk.
+    """
+    if overlap >= max_size:
+        raise ValueError("overlap must be smaller than the chunk size")
+    size, sep = _measure(unit)
+    units, sizes, joins = [], [], []    # current chunk; joins[i] precedes units[i]
+    total = 0                           # size of the joined chunk
+    fresh = 0                           # units not carried over from the previous chunk
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        # pieces of one line are rejoined with " ", lines with "\n"
+        join = "\n"
+        for piece in _split_long(line, max_size, size):
+            piece_size = size(piece)
+            if units and total + sep + piece_size > max_size:
+                if fresh:
+                    yield _joined(units, joins)
+                # carry the tail that fits in `overlap` and leaves room for piece
+                keep, kept = 0, 0
+                for s in reversed(sizes):
+                    added = s + (sep if keep else 0)
+                    if kept + added > overlap or kept + added + sep + piece_size > max_size:
+                        break
+                    kept += added
+                    keep += 1
+                cut = len(units) - keep
+                units, sizes, joins = units[cut:], sizes[cut:], joins[cut:]
+                total, fresh = kept, 0
+            total += piece_size + (sep if units else 0)
+            units.append(piece)
+            sizes.append(piece_size)
+            joins.append(join)
+            fresh += 1
+            join = " "
+    if fresh:
+        yield _joined(units, joins)
+
+
+def iter_file_chunks(path, max_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP, unit: str = CHUNK_UNIT):
+    with open(path, encoding="utf-8") as f:
+        yield from iter_chunks(iter_lines(f), max_size=max_size, overlap=overlap, unit=unit)
@@ -0,0 +1,119 @@
+# plant/context_packer.py
+"""
+Fits retrieved chunks into a token budget before they go into the LLM
+prompt. Chunks are taken in retrieval-score order; sentences already
+packed from an earlier (overlapping) chunk are dropped, each chunk is
+trimmed to its most query-relevant sentences and packing stops when the
+budget is full.
+"""
+import re
+from functools import lru_cache
+
+from django.conf import settings
+
+from .lexical_index import tokenize
+
+
+TOKEN_BUDGET = getattr(settings, "RAG_CONTEXT_TOKEN_BUDGET", 1500)
+MAX_SENTENCES = getattr(settings, "RAG_CONTEXT_MAX_SENTENCES", 8)
+MIN_SECTION_TOKENS = 24        # don't start a section that can't hold a sentence or two
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+# words, numbers and single punctuation marks: close to BPE token counts
+# for English SOP text without needing a model download
+_APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "in", "is", "it", "of", "on", "or", "should", "that",
+    "the", "this", "to", "was", "we", "what", "when", "where", "which", "who",
+    "why", "with",
+}
+
+
+@lru_cache(maxsize=1)
+def _tiktoken_encoding():
+    import tiktoken
+
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count with the configured local tokenizer
+    (RAG_CONTEXT_TOKENIZER = "approx" or "tiktoken").
+    """
+    if not text:
+        return 0
+    if getattr(settings, "RAG_CONTEXT_TOKENIZER", "approx") == "tiktoken":
+        return len(_tiktoken_encoding().encode(text))
+    return len(_APPROX_TOKEN_RE.findall(text))
+
+
+def split_sentences(text: str) -> list[str]:
+    return [s.strip() for s in _SENTENCE_RE.split(text) if s and s.strip()]
+
+
+def _sentence_key(sentence: str) -> str:
+    return " ".join(tokenize(sentence))
+
+
+def section_header(chunk) -> str:
+    return f"Document: {chunk.document.title} [type={chunk.document.doc_type}]"
+
+
+def pack_context(question: str, chunks, batch_context: str | None = None, budget: int | None = None):
+    """
+    Return ([(chunk, packed_text)], stats). The question and batch context
+    are always sent, so they are charged to the budget first.
+    """
+    budget = TOKEN_BUDGET if budget is None else budget
+    query_terms = set(tokenize(question)) - _STOPWORDS
+    remaining = budget - count_tokens(question) - count_tokens(batch_context or "")
+
+    sections, seen = [], set()
+    tokens_before = 0
+    deduped = trimmed = 0
+    for chunk in chunks:
+        header = section_header(chunk)
+        header_tokens = count_tokens(header)
+        tokens_before += header_tokens + count_tokens(chunk.text)
+
+        sentences = []
+        for sentence in split_sentences(chunk.text):
+            key = _sentence_key(sentence)
+            if key and key not in seen:
+                sentences.append((sentence, key))
+        if not sentences:
+            deduped += 1
+            continue
+        if remaining < header_tokens + MIN_SECTION_TOKENS:
+            continue
+
+        def relevance(i):
+            terms = set(sentences[i][1].split())
+            return len(query_terms & terms)
+
+        ranked = sorted(range(len(sentences)), key=lambda i: (-relevance(i), i))
+        keep, cost = [], header_tokens
+        for i in ranked[:MAX_SENTENCES]:
+            tokens = count_tokens(sentences[i][0])
+            if cost + tokens <= remaining:
+                keep.append(i)
+                cost += tokens
+        if not keep:
+            continue
+        if len(keep) < len(sentences):
+            trimmed += 1
+        keep.sort()   # original order reads better than relevance order
+        seen.update(sentences[i][1] for i in keep)
+        sections.append((chunk, "\n".join(sentences[i][0] for i in keep)))
+        remaining -= cost
+
+    tokens_after = sum(count_tokens(section_header(c)) + count_tokens(t) for c, t in sections)
+    return sections, {
+        "context_tokens": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+        "chunks_packed": len(sections),
+        "chunks_deduped": deduped,
+        "chunks_trimmed": trimmed,
+    }
@@ -0,0 +1,317 @@
+# plant/lexical_index.py
+import json
+import math
+import re
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from ragapp.models import DocumentChunk
+
+
+INDEX_DIR = Path(getattr(settings, "RAG_BM25_INDEX_DIR", Path(settings.BASE_DIR) / "rag_index_bm25"))
+REFRESH_INTERVAL = getattr(settings, "RAG_INDEX_REFRESH_SECONDS", 5.0)
+BM25_K1 = 1.2
+BM25_B = 0.75
+COMPACT_THRESHOLD = 50_000     # pending postings before they are merged into CSR arrays
+LOAD_CHUNK_SIZE = 2000
+
+# keeps codes like "PB-2025-010", "pH", "105.5" or "TT-101" together
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_SPLIT_RE = re.compile(r"[-_./]")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lower-cased word tokens. Compound codes are kept whole and also emitted
+    as their parts, so "PB-2025-010" matches both exactly and on "2025".
+    """
+    tokens = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        tokens.append(tok)
+        if _SPLIT_RE.search(tok):
+            tokens.extend(p for p in _SPLIT_RE.split(tok) if p)
+    return tokens
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over DocumentChunk.text.
+
+    Postings are stored CSR-style in integer arrays (term -> slice of doc
+    positions and term frequencies). Incremental additions go to small
+    per-term pending lists and are merged into the arrays in bulk; removed
+    chunks are tombstoned until the next compaction.
+    """
+
+    def __init__(self):
+        self.vocab = {}                                   # term -> term id
+        self.ptr = np.zeros(1, dtype=np.int64)            # CSR offsets per term id
+        self.post_docs = np.empty(0, dtype=np.int32)      # doc positions
+        self.post_tfs = np.empty(0, dtype=np.int32)       # term frequencies
+        self.pending = {}                                 # term id -> ([docs], [tfs])
+        self.pending_count = 0
+        self.chunk_ids = np.empty(0, dtype=np.int64)      # doc position -> chunk id
+        self.doc_len = np.empty(0, dtype=np.int32)
+        self.deleted = np.empty(0, dtype=bool)
+        self.positions = {}                               # chunk id -> doc position
+        self.max_id = 0
+        self.version = 0
+        self._lock = threading.RLock()
+        self._last_refresh = None
+
+    def __len__(self):
+        return len(self.positions)
+
+    # ---- updates ----
+    def add(self, ids, texts):
+        with self._lock:
+            start = len(self.chunk_ids)
+            new_ids, lengths = [], []
+            for chunk_id, text in zip(ids, texts):
+                if chunk_id in self.positions:
+                    continue
+                pos = start + len(new_ids)
+                tokens = tokenize(text)
+                counts = {}
+                for tok in tokens:
+                    counts[tok] = counts.get(tok, 0) + 1
+                for tok, tf in counts.items():
+                    term_id = self.vocab.setdefault(tok, len(self.vocab))
+                    docs, tfs = self.pending.setdefault(term_id, ([], []))
+                    docs.append(pos)
+                    tfs.append(tf)
+                self.pending_count += len(counts)
+                self.positions[int(chunk_id)] = pos
+                new_ids.append(int(chunk_id))
+                lengths.append(len(tokens))
+            if not new_ids:
+                return
+            self.chunk_ids = np.concatenate([self.chunk_ids, np.asarray(new_ids, dtype=np.int64)])
+            self.doc_len = np.concatenate([self.doc_len, np.asarray(lengths, dtype=np.int32)])
+            self.deleted = np.concatenate([self.deleted, np.zeros(len(new_ids), dtype=bool)])
+            self.max_id = max(self.max_id, max(new_ids))
+            self.version += 1
+            if self.pending_count >= COMPACT_THRESHOLD:
+                self.compact()
+
+    def remove(self, ids):
+        with self._lock:
+            removed = 0
+            for chunk_id in ids:
+                pos = self.positions.pop(int(chunk_id), None)
+                if pos is not None:
+                    self.deleted[pos] = True
+                    removed += 1
+            if removed:
+                self.version += 1
+
+    def compact(self):
+        """
+        Merge pending postings into the CSR arrays and drop tombstoned docs.
+        """
+        with self._lock:
+            n_terms = len(self.vocab)
+            keep = ~self.deleted
+            remap = np.full(len(self.chunk_ids), -1, dtype=np.int64)
+            remap[keep] = np.arange(int(keep.sum()))
+
+            term_parts, doc_parts, tf_parts = [], [], []
+            counts = np.diff(self.ptr)
+            if len(self.post_docs):
+                term_parts.append(np.repeat(np.arange(len(counts)), counts))
+                doc_parts.append(self.post_docs.astype(np.int64))
+                tf_parts.append(self.post_tfs)
+            for term_id, (docs, tfs) in self.pending.items():
+                term_parts.append(np.full(len(docs), term_id, dtype=np.int64))
+                doc_parts.append(np.asarray(docs, dtype=np.int64))
+                tf_parts.append(np.asarray(tfs, dtype=np.int32))
+
+            if term_parts:
+                terms = np.concatenate(term_parts)
+                docs = remap[np.concatenate(doc_parts)]
+                tfs = np.concatenate(tf_parts)
+                live = docs >= 0
+                terms, docs, tfs = terms[live], docs[live], tfs[live]
+                order = np.lexsort((docs, terms))
+                terms, docs, tfs = terms[order], docs[order], tfs[order]
+            else:
+                terms = docs = np.empty(0, dtype=np.int64)
+                tfs = np.empty(0, dtype=np.int32)
+
+            self.ptr = np.zeros(n_terms + 1, dtype=np.int64)
+            np.cumsum(np.bincount(terms, minlength=n_terms), out=self.ptr[1:])
+            self.post_docs = docs.astype(np.int32)
+            self.post_tfs = tfs.astype(np.int32)
+            self.pending = {}
+            self.pending_count = 0
+
+            self.chunk_ids = self.chunk_ids[keep]
+            self.doc_len = self.doc_len[keep]
+            self.deleted = np.zeros(len(self.chunk_ids), dtype=bool)
+            self.positions = {int(c): i for i, c in enumerate(self.chunk_ids.tolist())}
+
+    # ---- query ----
+    def _postings(self, term_id):
+        docs, tfs = [], []
+        if term_id + 1 < len(self.ptr):
+            lo, hi = self.ptr[term_id], self.ptr[term_id + 1]
+            docs.append(self.post_docs[lo:hi])
+            tfs.append(self.post_tfs[lo:hi])
+        pending = self.pending.get(term_id)
+        if pending is not None:
+            docs.append(np.asarray(pending[0], dtype=np.int32))
+            tfs.append(np.asarray(pending[1], dtype=np.int32))
+        if not docs:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+        return np.concatenate(docs), np.concatenate(tfs)
+
+    def search(self, query: str, k: int = 5):
+        """
+        Return (chunk_ids, bm25 scores) of the k best matching chunks.
+        """
+        with self._lock:
+            n_docs = len(self.chunk_ids)
+            n_live = len(self.positions)
+            if not n_live or k <= 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+            live = ~self.deleted
+            avgdl = float(self.doc_len[live].mean()) or 1.0
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len / avgdl)
+            scores = np.zeros(n_docs, dtype=np.float64)
+            for tok in set(tokenize(query)):
+                term_id = self.vocab.get(tok)
+                if term_id is None:
+                    continue
+                docs, tfs = self._postings(term_id)
+                if not len(docs):
+                    continue
+                df = int(live[docs].sum())
+                if not df:
+                    continue
+                idf = math.log(1 + (n_live - df + 0.5) / (df + 0.5))
+                weights = idf * tfs * (BM25_K1 + 1) / (tfs + norm[docs])
+                scores += np.bincount(docs, weights=weights, minlength=n_docs)
+
+            scores[self.deleted] = 0.0
+            hits = np.flatnonzero(scores > 0)
+            if not len(hits):
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            k = min(k, len(hits))
+            top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            return self.chunk_ids[top].copy(), scores[top].astype(np.float32)
+
+    # ---- persistence ----
+    def save(self, path: Path = INDEX_DIR):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self.compact()
+            terms = sorted(self.vocab, key=self.vocab.get)
+            tmp = path / "tmp"
+            tmp.mkdir(exist_ok=True)
+            (tmp / "terms.json").write_text(json.dumps(terms))
+            np.save(tmp / "ptr.npy", self.ptr)
+            np.save(tmp / "post_docs.npy", self.post_docs)
+            np.save(tmp / "post_tfs.npy", self.post_tfs)
+            np.save(tmp / "chunk_ids.npy", self.chunk_ids)
+            np.save(tmp / "doc_len.npy", self.doc_len)
+            for f in tmp.iterdir():
+                f.replace(path / f.name)
+            tmp.rmdir()
+
+    @classmethod
+    def load(cls, path: Path = INDEX_DIR):
+        path = Path(path)
+        index = cls()
+        if not (path / "terms.json").exists():
+            return index
+        terms = json.loads((path / "terms.json").read_text())
+        index.vocab = {t: i for i, t in enumerate(terms)}
+        index.ptr = np.load(path / "ptr.npy")
+        index.post_docs = np.load(path / "post_docs.npy")
+        index.post_tfs = np.load(path / "post_tfs.npy")
+        index.chunk_ids = np.load(path / "chunk_ids.npy")
+        index.doc_len = np.load(path / "doc_len.npy")
+        index.deleted = np.zeros(len(index.chunk_ids), dtype=bool)
+        index.positions = {int(c): i for i, c in enumerate(index.chunk_ids.tolist())}
+        index.max_id = int(index.chunk_ids.max()) if len(index.chunk_ids) else 0
+        return index
+
+    # ---- DB sync ----
+    def sync_from_db(self):
+        """
+        Add chunks newer than max_id and tombstone chunks that were deleted.
+        """
+        ids, texts = [], []
+        qs = DocumentChunk.objects.filter(id__gt=self.max_id).order_by("id")
+        for chunk_id, text in qs.values_list("id", "text").iterator(chunk_size=LOAD_CHUNK_SIZE):
+            ids.append(chunk_id)
+            texts.append(text)
+            if len(ids) >= LOAD_CHUNK_SIZE:
+                self.add(ids, texts)
+                ids, texts = [], []
+        if ids:
+            self.add(ids, texts)
+
+        if DocumentChunk.objects.count() != len(self):
+            existing = set(DocumentChunk.objects.values_list("id", flat=True))
+            self.remove([c for c in list(self.positions) if c not in existing])
+
+    def refresh(self, force: bool = False):
+        now = time.monotonic()
+        if (
+            not force
+            and self._last_refresh is not None
+            and now - self._last_refresh < REFRESH_INTERVAL
+        ):
+            return
+        self.sync_from_db()
+        self._last_refresh = now
+
+
+def update_lexical_index(path: Path = INDEX_DIR) -> LexicalIndex:
+    """
+    Bring the on-disk index in line with DocumentChunk (called by
+    build_rag_index after each indexing pass).
+    """
+    index = LexicalIndex.load(path)
+    index.sync_from_db()
+    index.save(path)
+    return index
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index(refresh: bool = True) -> LexicalIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LexicalIndex.load()
+    if refresh:
+        _index.refresh()
+    return _index
+
+
+def reciprocal_rank_fusion(rankings, k: int, rrf_k: int = 60):
+    """
+    Fuse several ranked id lists: score(id) = sum 1 / (rrf_k + rank).
+    Returns (ids, fused scores) of the top k.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:k]
+    return (
+        np.array([c for c, _ in best], dtype=np.int64),
+        np.array([s for _, s in best], dtype=np.float32),
+    )
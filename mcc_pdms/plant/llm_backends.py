@@ -0,0 +1,541 @@
+# plant/llm_backends.py
+"""
+Chat model backends for the RAG answer step.
+
+One client is built per process and reused, so the HTTP connection pool
+(and its TLS sessions) survives across questions. Every backend exposes
+invoke / stream / ainvoke / astream over LangChain-style messages and is
+wrapped in LLMClient, which adds per-call deadlines, bounded retries with
+jitter and latency/token metrics.
+
+RAG_LLM_BACKEND selects the backend:
+  "groq"  - ChatGroq (default)
+  "local" - any OpenAI-compatible /v1/chat/completions server
+            (llama.cpp, vLLM, Ollama) at RAG_LLM_LOCAL_URL
+  "stub"  - deterministic offline answers, for load tests
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+
+from django.conf import settings
+
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+LATENCY_WINDOW = 1000      # recent calls kept for the latency percentiles
+
+
+class LLMMessage:
+    def __init__(self, content: str, input_tokens: int | None = None, output_tokens: int | None = None):
+        self.content = content
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+def _approx_tokens(text: str) -> int:
+    # ~4 characters per token for English text; used when the backend
+    # does not report usage
+    return max(1, len(text) // 4) if text else 0
+
+
+def _prompt_tokens(messages) -> int:
+    return sum(_approx_tokens(m.content) for m in messages)
+
+
+# ---- backends ----
+class StubBackend:
+    """
+    Deterministic offline stand-in for the LLM. Streams a canned answer word
+    by word, optionally with a per-token delay so streaming and concurrency
+    can be exercised without network access.
+    """
+
+    name = "stub"
+
+    def __init__(self, token_delay: float = 0.0):
+        self.token_delay = token_delay
+
+    def _answer(self, messages) -> str:
+        prompt = messages[-1].content
+        question = prompt.split("\n", 1)[0].removeprefix("Question: ")
+        sources = prompt.count("Document: ")
+        return f"Stub answer to '{question}' based on {sources} knowledge base chunk(s)."
+
+    def _words(self, messages):
+        words = self._answer(messages).split(" ")
+        return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+    def invoke(self, messages, timeout=None):
+        words = self._words(messages)
+        if self.token_delay:
+            time.sleep(self.token_delay * len(words))
+        return LLMMessage("".join(words), _prompt_tokens(messages), len(words))
+
+    def stream(self, messages, timeout=None):
+        for word in self._words(messages):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield LLMMessage(word)
+
+    async def ainvoke(self, messages, timeout=None):
+        words = self._words(messages)
+        if self.token_delay:
+            await asyncio.sleep(self.token_delay * len(words))
+        return LLMMessage("".join(words), _prompt_tokens(messages), len(words))
+
+    async def astream(self, messages, timeout=None):
+        for word in self._words(messages):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield LLMMessage(word)
+
+
+class _PerLoopClients:
+    """
+    One async client per event loop: an httpx AsyncClient's pool belongs to
+    the loop it was first used on. Entries of closed loops (e.g. the
+    short-lived loops async_to_sync creates) are dropped on the next lookup,
+    and collected loops drop out of the weak mapping on their own.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._clients = weakref.WeakKeyDictionary()   # event loop -> client
+        self._lock = threading.Lock()
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None:
+                for closed in [lp for lp in self._clients if lp.is_closed()]:
+                    del self._clients[closed]
+                client = self._clients[loop] = self.factory()
+        return client
+
+    def __len__(self):
+        return len(self._clients)
+
+
+class GroqBackend:
+    """
+    ChatGroq with explicitly owned keep-alive httpx clients. LangChain's
+    own retries are disabled; LLMClient does them with jitter and passes the
+    time left before its deadline as the per-request timeout.
+    """
+
+    name = "groq"
+
+    def __init__(self, model: str, timeout: float, max_connections: int):
+        import httpx
+
+        self.model = model
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60.0,
+        )
+        self.llm = self._chat(http_client=httpx.Client(limits=self.limits, timeout=timeout))
+        self._allms = _PerLoopClients(
+            lambda: self._chat(http_async_client=httpx.AsyncClient(limits=self.limits, timeout=timeout))
+        )
+
+    def _chat(self, **clients):
+        from langchain_groq import ChatGroq
+
+        return ChatGroq(
+            model=self.model,
+            api_key=os.environ.get("GROQ_API_KEY"),
+            temperature=0.1,
+            timeout=self.timeout,
+            max_retries=0,
+            **clients,
+        )
+
+    @staticmethod
+    def _options(timeout) -> dict:
+        # forwarded by ChatGroq to the groq SDK as the per-request timeout
+        return {"timeout": timeout} if timeout else {}
+
+    @staticmethod
+    def _wrap(response) -> LLMMessage:
+        usage = getattr(response, "usage_metadata", None) or {}
+        return LLMMessage(response.content, usage.get("input_tokens"), usage.get("output_tokens"))
+
+    def invoke(self, messages, timeout=None):
+        return self._wrap(self.llm.invoke(messages, **self._options(timeout)))
+
+    def stream(self, messages, timeout=None):
+        for piece in self.llm.stream(messages, **self._options(timeout)):
+            yield LLMMessage(piece.content)
+
+    async def ainvoke(self, messages, timeout=None):
+        return self._wrap(await self._allms.get().ainvoke(messages, **self._options(timeout)))
+
+    async def astream(self, messages, timeout=None):
+        async for piece in self._allms.get().astream(messages, **self._options(timeout)):
+            yield LLMMessage(piece.content)
+
+
+_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+
+class LocalHTTPBackend:
+    """
+    OpenAI-compatible chat completions server (llama.cpp, vLLM, Ollama)
+    reached over pooled keep-alive connections.
+    """
+
+    name = "local"
+
+    def __init__(self, base_url: str, model: str, timeout: float, max_connections: int):
+        import httpx
+
+        self.url = base_url.rstrip("/") + "/v1/chat/completions"
+        self.model = model
+        self.timeout = timeout
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60.0,
+        )
+        self.client = httpx.Client(limits=limits, timeout=timeout)
+        self._aclients = _PerLoopClients(lambda: httpx.AsyncClient(limits=limits, timeout=timeout))
+
+    def _aclient(self):
+        return self._aclients.get()
+
+    def _payload(self, messages, stream: bool) -> dict:
+        return {
+            "model": self.model,
+            "temperature": 0.1,
+            "stream": stream,
+            "messages": [
+                {"role": _ROLES.get(getattr(m, "type", "human"), "user"), "content": m.content}
+                for m in messages
+            ],
+        }
+
+    @staticmethod
+    def _message(data: dict) -> LLMMessage:
+        usage = data.get("usage") or {}
+        return LLMMessage(
+            data["choices"][0]["message"]["content"],
+            usage.get("prompt_tokens"),
+            usage.get("completion_tokens"),
+        )
+
+    @staticmethod
+    def _delta(line: str):
+        if not line.startswith("data:"):
+            return None
+        body = line[5:].strip()
+        if body == "[DONE]":
+            return None
+        choices = json.loads(body).get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content")
+
+    def invoke(self, messages, timeout=None):
+        resp = self.client.post(self.url, json=self._payload(messages, False), timeout=timeout or self.timeout)
+        resp.raise_for_status()
+        return self._message(resp.json())
+
+    def stream(self, messages, timeout=None):
+        with self.client.stream(
+            "POST", self.url, json=self._payload(messages, True), timeout=timeout or self.timeout
+        ) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                text = self._delta(line)
+                if text:
+                    yield LLMMessage(text)
+
+    async def ainvoke(self, messages, timeout=None):
+        resp = await self._aclient().post(
+            self.url, json=self._payload(messages, False), timeout=timeout or self.timeout
+        )
+        resp.raise_for_status()
+        return self._message(resp.json())
+
+    async def astream(self, messages, timeout=None):
+        async with self._aclient().stream(
+            "POST", self.url, json=self._payload(messages, True), timeout=timeout or self.timeout
+        ) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                text = self._delta(line)
+                if text:
+                    yield LLMMessage(text)
+
+
+# ---- metrics ----
+class LLMMetrics:
+    """
+    Per-process counters for LLM calls; exported by /api/rag/stats/.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.errors = 0
+            self.retries = 0
+            self.timeouts = 0
+            self.input_tokens = 0
+            self.output_tokens = 0
+            self.latencies = deque(maxlen=LATENCY_WINDOW)
+            self.first_token = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, latency, input_tokens=0, output_tokens=0, first_token=None):
+        with self._lock:
+            self.calls += 1
+            self.input_tokens += input_tokens or 0
+            self.output_tokens += output_tokens or 0
+            self.latencies.append(latency)
+            if first_token is not None:
+                self.first_token.append(first_token)
+
+    def record_failure(self, exc, timed_out: bool):
+        with self._lock:
+            self.errors += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    @staticmethod
+    def _percentiles(values) -> dict:
+        if not values:
+            return {"p50_ms": None, "p95_ms": None, "max_ms": None}
+        ordered = sorted(values)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+        return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "max_ms": round(ordered[-1] * 1000, 1)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies, first_token = list(self.latencies), list(self.first_token)
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "retries": self.retries,
+                "timeouts": self.timeouts,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+                "latency": self._percentiles(latencies),
+                "first_token": self._percentiles(first_token),
+            }
+
+
+llm_metrics = LLMMetrics()
+
+
+def _is_timeout(exc) -> bool:
+    return isinstance(exc, (TimeoutError, asyncio.TimeoutError)) or "Timeout" in type(exc).__name__
+
+
+def _is_retryable(exc) -> bool:
+    if _is_timeout(exc) or isinstance(exc, ConnectionError):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # httpx / groq transport failures
+    return any(n in type(exc).__name__ for n in ("Connection", "Transport", "Protocol"))
+
+
+class LLMClient:
+    """
+    Backend wrapper adding a per-call deadline, bounded retries with full
+    jitter and metrics. Streams are only retried before the first token
+    has been handed to the caller.
+    """
+
+    def __init__(self, backend, timeout: float = 30.0, max_retries: int = 2, backoff: float = 0.5):
+        self.backend = backend
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.metrics = llm_metrics
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    def _delay(self, attempt: int, deadline: float):
+        """
+        Seconds to sleep before the next attempt, or None to give up.
+        """
+        if attempt >= self.max_retries:
+            return None
+        delay = random.uniform(0, self.backoff * 2 ** attempt)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def _remaining(self, deadline: float) -> float:
+        return max(0.01, deadline - time.monotonic())
+
+    def _fail(self, exc, attempt, deadline):
+        timed_out = _is_timeout(exc)
+        delay = self._delay(attempt, deadline) if _is_retryable(exc) else None
+        if delay is None:
+            self.metrics.record_failure(exc, timed_out)
+            if timed_out and not isinstance(exc, TimeoutError):
+                raise TimeoutError(f"LLM call exceeded {self.timeout}s") from exc
+            raise exc
+        self.metrics.record_retry()
+        return delay
+
+    def invoke(self, messages) -> LLMMessage:
+        started = time.monotonic()
+        deadline = started + self.timeout
+        attempt = 0
+        while True:
+            try:
+                response = self.backend.invoke(messages, timeout=self._remaining(deadline))
+                break
+            except Exception as exc:
+                time.sleep(self._fail(exc, attempt, deadline))
+                attempt += 1
+        self.metrics.record(
+            time.monotonic() - started,
+            response.input_tokens or _prompt_tokens(messages),
+            response.output_tokens or _approx_tokens(response.content),
+        )
+        return response
+
+    def stream(self, messages):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        attempt = 0
+        parts, first_token = [], None
+        while True:
+            try:
+                for piece in self.backend.stream(messages, timeout=self._remaining(deadline)):
+                    if first_token is None:
+                        first_token = time.monotonic() - started
+                    parts.append(piece.content)
+                    yield piece
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"LLM stream exceeded {self.timeout}s")
+                break
+            except Exception as exc:
+                if parts:
+                    self.metrics.record_failure(exc, _is_timeout(exc))
+                    raise
+                time.sleep(self._fail(exc, attempt, deadline))
+                attempt += 1
+        self.metrics.record(
+            time.monotonic() - started,
+            _prompt_tokens(messages),
+            len(parts),
+            first_token,
+        )
+
+    async def ainvoke(self, messages) -> LLMMessage:
+        started = time.monotonic()
+        deadline = started + self.timeout
+        attempt = 0
+        while True:
+            remaining = self._remaining(deadline)
+            try:
+                response = await asyncio.wait_for(
+                    self.backend.ainvoke(messages, timeout=remaining), remaining
+                )
+                break
+            except Exception as exc:
+                await asyncio.sleep(self._fail(exc, attempt, deadline))
+                attempt += 1
+        self.metrics.record(
+            time.monotonic() - started,
+            response.input_tokens or _prompt_tokens(messages),
+            response.output_tokens or _approx_tokens(response.content),
+        )
+        return response
+
+    async def astream(self, messages):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        attempt = 0
+        parts, first_token = [], None
+        while True:
+            try:
+                stream = self.backend.astream(messages, timeout=self._remaining(deadline))
+                while True:
+                    try:
+                        piece = await asyncio.wait_for(anext(stream), self._remaining(deadline))
+                    except StopAsyncIteration:
+                        break
+                    if first_token is None:
+                        first_token = time.monotonic() - started
+                    parts.append(piece.content)
+                    yield piece
+                break
+            except Exception as exc:
+                if parts:
+                    self.metrics.record_failure(exc, _is_timeout(exc))
+                    raise
+                await asyncio.sleep(self._fail(exc, attempt, deadline))
+                attempt += 1
+        self.metrics.record(
+            time.monotonic() - started,
+            _prompt_tokens(messages),
+            len(parts),
+            first_token,
+        )
+
+
+def build_backend(name: str):
+    timeout = getattr(settings, "RAG_LLM_TIMEOUT", 30.0)
+    max_connections = getattr(settings, "RAG_LLM_MAX_CONNECTIONS", 20)
+    if name == "stub":
+        return StubBackend(getattr(settings, "RAG_STUB_TOKEN_DELAY", 0.0))
+    if name == "local":
+        return LocalHTTPBackend(
+            getattr(settings, "RAG_LLM_LOCAL_URL", "http://127.0.0.1:8080"),
+            getattr(settings, "RAG_LLM_LOCAL_MODEL", "local"),
+            timeout,
+            max_connections,
+        )
+    if name == "groq":
+        return GroqBackend(
+            getattr(settings, "RAG_LLM_MODEL", "llama-3.1-8b-instant"), timeout, max_connections
+        )
+    raise ValueError(f"Unknown RAG_LLM_BACKEND {name!r}")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm() -> LLMClient:
+    """
+    Process-wide client for the configured backend (built on first use).
+    """
+    name = getattr(settings, "RAG_LLM_BACKEND", "groq")
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = LLMClient(
+                    build_backend(name),
+                    timeout=getattr(settings, "RAG_LLM_TIMEOUT", 30.0),
+                    max_retries=getattr(settings, "RAG_LLM_MAX_RETRIES", 2),
+                    backoff=getattr(settings, "RAG_LLM_RETRY_BACKOFF", 0.5),
+                )
+                _clients[name] = client
+    return client
@@ -1,12 +1,16 @@
 # plant/management/commands/backfill_anomaly_scores.py
 
-from django.core.management.base import BaseCommand
-from plant.models import ProductionBatch
-from plant.ml_anomaly import detect_anomaly_for_batch
+from django.core.management.base import BaseCommand, CommandError
+
+from plant.anomaly_backfill import CHECKPOINT_PATH, CHUNK_SIZE, run_backfill
 
 
 class Command(BaseCommand):
-    help = "Compute anomaly scores for existing batches and store them."
+    help = (
+        "Compute anomaly scores for existing batches and store them: one "
+        "model call and one bulk update per chunk, resumable from a "
+        "checkpoint, optionally across several worker processes."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -20,33 +24,55 @@ class Command(BaseCommand):
             action="store_true",
             help="Only process batches without anomaly_score.",
         )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Worker processes scoring and writing chunks in parallel.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=str(CHECKPOINT_PATH),
+            help="File recording the last fully written batch id.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and start from the first batch.",
+        )
 
     def handle(self, *args, **options):
-        qs = ProductionBatch.objects.all().order_by("id")
+        if options["chunk_size"] < 1 or options["workers"] < 1:
+            raise CommandError("--chunk-size and --workers must be at least 1")
 
-        if options["only_missing"]:
-            qs = qs.filter(anomaly_score__isnull=True)
+        def progress(stats):
+            if options["verbosity"] >= 1:
+                self.stdout.write(
+                    f"Processed {stats['batches']} batches (up to id {stats['last_id']}) "
+                    f"in {stats['seconds']:.1f}s..."
+                )
 
-        if options["limit"]:
-            qs = qs[: options["limit"]]
+        try:
+            stats = run_backfill(
+                chunk_size=options["chunk_size"],
+                workers=options["workers"],
+                only_missing=options["only_missing"],
+                limit=options["limit"],
+                restart=options["restart"],
+                checkpoint=options["checkpoint"],
+                progress=progress,
+            )
+        except FileNotFoundError as exc:
+            raise CommandError(f"{exc}; run `manage.py train_anomaly` first")
 
-        total = qs.count()
-        if not total:
+        if not stats["batches"]:
             self.stdout.write(self.style.WARNING("No batches to process"))
             return
-
-        processed = 0
-        for batch in qs:
-            result = detect_anomaly_for_batch(batch)  # returns dict
-            score = float(result["score"])
-            is_anom = bool(result["is_anomaly"])
-
-            batch.anomaly_score = score
-            batch.is_anomaly = is_anom
-            batch.save(update_fields=["anomaly_score", "is_anomaly"])
-
-            processed += 1
-            if processed % 50 == 0:
-                self.stdout.write(f"Processed {processed}/{total} batches...")
-
-        self.stdout.write(self.style.SUCCESS(f"Done. Processed {processed} batches."))
+        resumed = f", resumed after id {stats['resumed_after_id']}" if stats["resumed_after_id"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done. Processed {stats['batches']} batches with model {stats['model_version']} "
+                f"in {stats['seconds']:.1f}s ({stats['workers']} worker(s){resumed})."
+            )
+        )
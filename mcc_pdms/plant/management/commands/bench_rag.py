@@ -0,0 +1,405 @@
+# plant/management/commands/bench_rag.py
+import json
+import os
+import platform
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from plant.ann_index import AnnIndex
+from plant.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from plant.vector_index import VectorIndex, normalize_rows
+
+
+BACKENDS = ("bruteforce", "vector", "ann-ivf", "ann-graph", "bm25", "hybrid")
+DOC_TYPES = ("SOP", "MANUAL", "QC", "INCIDENT")
+COMMON_WORDS = (
+    "batch dryer mixer granulator temperature pressure moisture sample check "
+    "operator shift alarm limit valve pump filter line cleaning record"
+).split()
+
+
+# ---- synthetic corpus ----
+def make_corpus(n, queries, dim, topics, query_noise, seed):
+    """
+    Chunks are noisy copies of topic centroids, written with the topic's own
+    vocabulary plus a unique batch code. Each query is a perturbed copy of
+    one chunk (its single relevant chunk), with a few of its words and, for
+    half the queries, its batch code.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = normalize_rows(rng.standard_normal((topics, dim)))
+    topic = rng.integers(0, topics, n)
+    vectors = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 50_000):
+        end = min(n, start + 50_000)
+        noise = normalize_rows(rng.standard_normal((end - start, dim)))
+        vectors[start:end] = normalize_rows(centroids[topic[start:end]] + 0.8 * noise)
+
+    vocab = 40
+    words = rng.integers(0, vocab, (n, 24))
+    common = rng.integers(0, len(COMMON_WORDS), (n, 6))
+    texts = [
+        " ".join(
+            [f"t{topic[i]}w{w}" for w in words[i]]
+            + [COMMON_WORDS[c] for c in common[i]]
+            + [f"PB-{i + 1:07d}"]
+        )
+        for i in range(n)
+    ]
+
+    relevant = rng.choice(n, size=min(queries, n), replace=False)
+    noise = normalize_rows(rng.standard_normal((len(relevant), dim)))
+    q_vectors = normalize_rows(vectors[relevant] + query_noise * noise)
+    q_texts = []
+    for j, i in enumerate(relevant):
+        picked = rng.choice(words[i], 4, replace=False)
+        text = " ".join(f"t{topic[i]}w{w}" for w in picked)
+        if j % 2 == 0:
+            text += f" PB-{i + 1:07d}"
+        q_texts.append(text)
+
+    return {
+        "ids": np.arange(1, n + 1, dtype=np.int64),
+        "vectors": vectors,
+        "texts": np.array(texts, dtype=object),
+        "doc_types": np.array([DOC_TYPES[t % len(DOC_TYPES)] for t in topic], dtype=object),
+        "query_vectors": q_vectors.astype(np.float32),
+        "query_texts": np.array(q_texts, dtype=object),
+        "relevant": (relevant + 1).astype(np.int64),
+    }
+
+
+def save_corpus(path, corpus):
+    np.savez(path, **corpus)
+
+
+def load_corpus(path):
+    data = np.load(path, allow_pickle=True)
+    return {key: data[key] for key in data.files}
+
+
+# ---- backends: build(corpus, options) -> search(i, k) ----
+def _bruteforce(corpus, options):
+    # the original retrieve_top_k: one Python cosine per stored chunk
+    from plant.rag_service import cosine_sim
+
+    rows = list(zip(corpus["ids"].tolist(), corpus["vectors"].tolist()))
+    queries = corpus["query_vectors"].tolist()
+
+    def search(i, k):
+        q = queries[i]
+        scored = sorted(((cosine_sim(q, v), cid) for cid, v in rows), reverse=True)
+        return [cid for _, cid in scored[:k]]
+
+    return search
+
+
+def _vector(corpus, options):
+    index = VectorIndex()
+    index.add(corpus["ids"], corpus["vectors"], doc_types=corpus["doc_types"])
+
+    def search(i, k):
+        return index.search(corpus["query_vectors"][i], k)[0].tolist()
+
+    return search
+
+
+def _ann(algorithm):
+    def build(corpus, options):
+        index = AnnIndex.build(corpus["ids"], corpus["vectors"], algorithm=algorithm)
+
+        def search(i, k):
+            return index.search(
+                corpus["query_vectors"][i], k, nprobe=options["nprobe"], ef=options["ef"]
+            )[0].tolist()
+
+        return search
+
+    return build
+
+
+def _lexical(corpus):
+    index = LexicalIndex()
+    index.add(corpus["ids"].tolist(), corpus["texts"].tolist())
+    index.compact()
+    return index
+
+
+def _bm25(corpus, options):
+    index = _lexical(corpus)
+
+    def search(i, k):
+        return index.search(corpus["query_texts"][i], k)[0].tolist()
+
+    return search
+
+
+def _hybrid(corpus, options):
+    vector = _vector(corpus, options)
+    lexical = _lexical(corpus)
+    candidates = options["candidates"]
+
+    def search(i, k):
+        n = max(k, candidates)
+        lex_ids = lexical.search(corpus["query_texts"][i], n)[0].tolist()
+        return reciprocal_rank_fusion([vector(i, n), lex_ids], k)[0].tolist()
+
+    return search
+
+
+BUILDERS = {
+    "bruteforce": _bruteforce,
+    "vector": _vector,
+    "ann-ivf": _ann("ivf"),
+    "ann-graph": _ann("graph"),
+    "bm25": _bm25,
+    "hybrid": _hybrid,
+}
+
+
+def _percentiles(values) -> dict:
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark RAG retrieval offline on a synthetic corpus with labelled "
+        "query->relevant-chunk pairs: recall@k, MRR, query latency "
+        "p50/p95/p99, index build time and memory for each backend, plus "
+        "prompt packing and a stub LLM call. Writes JSON for comparing runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunks", type=int, default=10_000, help="Corpus size (1k to 1M).")
+        parser.add_argument("--queries", type=int, default=500)
+        parser.add_argument("--dim", type=int, default=384)
+        parser.add_argument("--topics", type=int, default=200)
+        parser.add_argument(
+            "--query-noise",
+            type=float,
+            default=1.2,
+            help="Perturbation of query vectors; higher makes retrieval harder.",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--corpus", type=str, help="Load a corpus saved with --save-corpus (.npz).")
+        parser.add_argument("--save-corpus", type=str)
+        parser.add_argument(
+            "--embed",
+            action="store_true",
+            help="Re-embed chunk and query texts with the configured embedding "
+                 "backend instead of using the synthetic vectors.",
+        )
+        parser.add_argument(
+            "--backends",
+            type=str,
+            default=",".join(BACKENDS),
+            help=f"Comma-separated subset of {', '.join(BACKENDS)}.",
+        )
+        parser.add_argument("--k", type=str, default="1,5,10", help="Cut-offs for recall@k.")
+        parser.add_argument("--nprobe", type=int, default=None)
+        parser.add_argument("--ef", type=int, default=None)
+        parser.add_argument("--candidates", type=int, default=50, help="Per-ranker candidates for hybrid.")
+        parser.add_argument(
+            "--bruteforce-max",
+            type=int,
+            default=20_000,
+            help="Skip the pure-Python baseline above this many chunks.",
+        )
+        parser.add_argument(
+            "--bruteforce-queries",
+            type=int,
+            default=50,
+            help="Queries run against the pure-Python baseline (it is slow).",
+        )
+        parser.add_argument("--no-memory", action="store_true", help="Do not trace build memory.")
+        parser.add_argument("--e2e-queries", type=int, default=100, help="Queries run through packing + stub LLM.")
+        parser.add_argument("--output", type=str, help="Write results as JSON to this path.")
+        parser.add_argument("--baseline", type=str, help="Print deltas against an earlier --output file.")
+
+    # ---- corpus ----
+    def _corpus(self, options):
+        started = time.perf_counter()
+        if options["corpus"]:
+            corpus = load_corpus(options["corpus"])
+        else:
+            corpus = make_corpus(
+                options["chunks"],
+                options["queries"],
+                options["dim"],
+                options["topics"],
+                options["query_noise"],
+                options["seed"],
+            )
+        if options["embed"]:
+            from ragapp.embeddings import embed_texts
+
+            corpus["vectors"] = np.asarray(embed_texts(corpus["texts"].tolist()), dtype=np.float32)
+            corpus["query_vectors"] = np.asarray(embed_texts(corpus["query_texts"].tolist()), dtype=np.float32)
+        if options["save_corpus"]:
+            save_corpus(options["save_corpus"], corpus)
+        self.stdout.write(
+            f"Corpus: {len(corpus['ids'])} chunks, {len(corpus['relevant'])} queries, "
+            f"dim {corpus['vectors'].shape[1]} ({time.perf_counter() - started:.1f}s)"
+        )
+        return corpus
+
+    # ---- one backend ----
+    def _run(self, name, corpus, options, ks, queries=None):
+        trace = not options["no_memory"]
+        if trace:
+            tracemalloc.start()
+        started = time.perf_counter()
+        search = BUILDERS[name](corpus, options)
+        build_s = time.perf_counter() - started
+        memory = None
+        if trace:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            memory = {"retained_mb": round(current / 1e6, 1), "peak_mb": round(peak / 1e6, 1)}
+
+        depth = max(ks)
+        hits = {k: 0 for k in ks}
+        reciprocal = 0.0
+        latencies = []
+        for i, relevant in enumerate(corpus["relevant"][:queries].tolist()):
+            t0 = time.perf_counter()
+            found = search(i, depth)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            rank = found.index(relevant) + 1 if relevant in found else None
+            if rank is not None:
+                reciprocal += 1.0 / rank
+                for k in ks:
+                    hits[k] += rank <= k
+        n = len(latencies)
+        return {
+            "queries": n,
+            "build_s": round(build_s, 3),
+            "memory": memory,
+            "recall": {f"@{k}": round(hits[k] / n, 4) for k in ks},
+            f"mrr@{depth}": round(reciprocal / n, 4),
+            "latency_ms": _percentiles(latencies),
+            "qps": round(n / (sum(latencies) / 1000), 1),
+        }
+
+    # ---- prompt packing + stub LLM ----
+    def _end_to_end(self, corpus, queries):
+        from plant.llm_backends import LLMClient, StubBackend
+        from plant.rag_service import build_prompt
+        from ragapp.models import Document, DocumentChunk
+
+        index = VectorIndex()
+        index.add(corpus["ids"], corpus["vectors"])
+        llm = LLMClient(StubBackend())
+        texts, doc_types = corpus["texts"], corpus["doc_types"]
+        latencies, prompt_tokens = [], []
+        for i in range(min(queries, len(corpus["relevant"]))):
+            question = corpus["query_texts"][i]
+            t0 = time.perf_counter()
+            ids = index.search(corpus["query_vectors"][i], 5)[0]
+            # unsaved model instances: the benchmark never touches the DB
+            chunks = [
+                DocumentChunk(
+                    id=int(cid),
+                    chunk_index=0,
+                    text=texts[cid - 1],
+                    document=Document(id=int(cid), title=f"doc-{cid}", doc_type=doc_types[cid - 1]),
+                )
+                for cid in ids
+            ]
+            messages, packing = build_prompt(question, None, chunks)
+            llm.invoke(messages)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            prompt_tokens.append(packing["prompt_tokens"])
+        return {
+            "queries": len(latencies),
+            "latency_ms": _percentiles(latencies),
+            "prompt_tokens_mean": round(float(np.mean(prompt_tokens)), 1),
+        }
+
+    def _report(self, results, baseline):
+        previous = baseline["backends"] if baseline else {}
+        self.stdout.write(
+            f"{'backend':<11} {'build s':>8} {'peak MB':>8} {'recall':>22} {'MRR':>7} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        )
+        for name, r in results.items():
+            if "skipped" in r:
+                self.stdout.write(f"{name:<11} skipped: {r['skipped']}")
+                continue
+            recall = " ".join(f"{k}={v:.3f}" for k, v in r["recall"].items())
+            mrr = next(v for key, v in r.items() if key.startswith("mrr@"))
+            peak = r["memory"]["peak_mb"] if r["memory"] else float("nan")
+            lat = r["latency_ms"]
+            self.stdout.write(
+                f"{name:<11} {r['build_s']:>8.2f} {peak:>8.1f} {recall:>22} {mrr:>7.3f} "
+                f"{lat['p50']:>8.3f} {lat['p95']:>8.3f} {lat['p99']:>8.3f}"
+            )
+            old = previous.get(name)
+            if old and "recall" in old:
+                deltas = " ".join(
+                    f"{k}={v - old['recall'].get(k, 0):+.3f}" for k, v in r["recall"].items()
+                )
+                p50 = lat["p50"] - old["latency_ms"]["p50"]
+                self.stdout.write(f"{'  vs base':<11} {'':>8} {'':>8} {deltas:>22} {'':>7} {p50:>+8.3f}")
+
+    def handle(self, *args, **options):
+        names = [b.strip() for b in options["backends"].split(",") if b.strip()]
+        unknown = sorted(set(names) - set(BACKENDS))
+        if unknown:
+            raise CommandError(f"Unknown backends: {', '.join(unknown)}")
+        try:
+            ks = sorted({int(k) for k in options["k"].split(",")})
+        except ValueError:
+            raise CommandError("--k must be comma-separated integers")
+        baseline = None
+        if options["baseline"]:
+            baseline = json.loads(Path(options["baseline"]).read_text())
+
+        corpus = self._corpus(options)
+        results = {}
+        for name in names:
+            if name == "bruteforce" and len(corpus["ids"]) > options["bruteforce_max"]:
+                results[name] = {"skipped": f"more than --bruteforce-max={options['bruteforce_max']} chunks"}
+                continue
+            self.stdout.write(f"Running {name} ...")
+            queries = options["bruteforce_queries"] if name == "bruteforce" else None
+            results[name] = self._run(name, corpus, options, ks, queries)
+
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "params": {
+                key: options[key]
+                for key in (
+                    "chunks", "queries", "dim", "topics", "query_noise", "seed", "corpus",
+                    "embed", "k", "nprobe", "ef", "candidates",
+                )
+            },
+            "corpus": {"chunks": int(len(corpus["ids"])), "queries": int(len(corpus["relevant"]))},
+            "environment": {
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "cpus": os.cpu_count(),
+                "machine": platform.machine(),
+            },
+            "backends": results,
+        }
+        if options["e2e_queries"]:
+            report["end_to_end"] = self._end_to_end(corpus, options["e2e_queries"])
+
+        self._report(results, baseline)
+        if "end_to_end" in report:
+            e2e = report["end_to_end"]
+            self.stdout.write(
+                f"retrieve + pack + stub LLM: p50 {e2e['latency_ms']['p50']:.2f} ms, "
+                f"p99 {e2e['latency_ms']['p99']:.2f} ms, {e2e['prompt_tokens_mean']:.0f} prompt tokens"
+            )
+        if options["output"]:
+            Path(options["output"]).parent.mkdir(parents=True, exist_ok=True)
+            Path(options["output"]).write_text(json.dumps(report, indent=2))
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,59 @@
+# plant/management/commands/build_ann_index.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from plant.ann_index import ALGORITHMS, INDEX_DIR, AnnIndex
+from plant.vector_index import VectorIndex
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the approximate-nearest-neighbour index over DocumentChunk "
+        "embeddings and publish it in RAG_ANN_INDEX_DIR for "
+        "RAG_RETRIEVAL_BACKEND='ann'. "
+        "Re-run after build_rag_index so new chunks are searchable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--algorithm", choices=ALGORITHMS, default="ivf")
+        parser.add_argument(
+            "--nlist",
+            type=int,
+            default=None,
+            help="Number of k-means lists (default: 4*sqrt(N)).",
+        )
+        parser.add_argument(
+            "--degree",
+            type=int,
+            default=16,
+            help="Neighbours per node for the graph algorithm.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        source = VectorIndex()
+        source.rebuild()
+        if not len(source):
+            raise CommandError("No DocumentChunk embeddings to index")
+        matrix, ids = source.snapshot()
+        self.stdout.write(
+            f"Loaded {len(ids)} embeddings (dim={source.dim}, skipped={source.skipped}) "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+        started = time.perf_counter()
+        index = AnnIndex.build(
+            ids,
+            matrix,
+            algorithm=options["algorithm"],
+            nlist=options["nlist"],
+            degree=options["degree"],
+        )
+        path = index.save(INDEX_DIR)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Built {index.algorithm} index ({index.nlist} lists) in "
+                f"{time.perf_counter() - started:.1f}s -> {path}"
+            )
+        )
@@ -1,57 +1,375 @@
 # plant/management/commands/build_rag_index.py
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
 from django.core.management.base import BaseCommand
+from django.db import transaction
+
 from ragapp.models import Document, DocumentChunk
-from pathlib import Path
-import textwrap
-from ragapp.embeddings import embed_text
-
-# # TODO: replace with real embedding model (OpenAI, local, etc.)
-# def embed_text(text: str) -> list[float]:
-#     # Dummy embedding: DO NOT USE IN PROD
-#     # Replace with real call to your embedding model.
-#     return [float(len(text) % 10)] * 16
-
-def chunk_text(text: str, max_chars: int = 800):
-    # Very simple splitter by paragraphs
-    paragraphs = [p.strip() for p in text.split("\n") if p.strip()]
-    chunks, buf = [], ""
-    for p in paragraphs:
-        if len(buf) + len(p) + 1 > max_chars:
-            if buf:
-                chunks.append(buf)
-            buf = p
-        else:
-            buf = (buf + "\n" + p) if buf else p
-    if buf:
-        chunks.append(buf)
-    return chunks
+from ragapp.embeddings import MODEL_NAME, embed_texts
+from ragapp.vectors import encode_vector
+from plant.chunking import CHUNK_OVERLAP, CHUNK_SIZE, CHUNK_UNIT, iter_file_chunks
+from plant.lexical_index import INDEX_DIR as BM25_INDEX_DIR, update_lexical_index
+
+RAG_DB = "pg_rag"
+HASH_BLOCK = 1 << 20
+# files above this size are chunked, embedded and written batch by batch
+# instead of being held in memory whole
+STREAM_THRESHOLD = 16 * 1024 * 1024
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
 
 class Command(BaseCommand):
-    help = "Build RAG index from plain-text files in a folder"
+    help = (
+        "Build or incrementally update the RAG index from plain-text files in a "
+        "folder. Unchanged files (same sha256) are skipped, only chunks whose "
+        "text changed are re-embedded, and chunks of removed/shrunk files are "
+        "deleted. Files are hashed and chunked in a worker pool, chunks are "
+        "embedded in batches and each document is written in a single "
+        "transaction; very large files are streamed in bounded memory."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument("folder", type=str, help="Folder with .txt files")
         parser.add_argument("--doctype", type=str, default="SOP")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Threads used to read and chunk files.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=128,
+            help="Chunks per embedding batch (64-256 works well on CPU).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=CHUNK_SIZE,
+            help="Maximum chunk size in --unit (default RAG_CHUNK_SIZE).",
+        )
+        parser.add_argument(
+            "--overlap",
+            type=int,
+            default=CHUNK_OVERLAP,
+            help="Size repeated from the end of one chunk at the start of the next.",
+        )
+        parser.add_argument("--unit", choices=["chars", "tokens"], default=CHUNK_UNIT)
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-embed every chunk even if its content hash is unchanged.",
+        )
+        parser.add_argument(
+            "--keep-removed",
+            action="store_true",
+            help="Do not delete documents whose source file no longer exists.",
+        )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep running and apply changes in the folder as they appear.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=10.0,
+            help="Seconds between folder scans in --watch mode.",
+        )
 
     def handle(self, *args, **options):
-        folder = Path(options["folder"])
-        doc_type = options["doctype"]
+        self.folder = Path(options["folder"])
+        self.doc_type = options["doctype"]
+        self.batch_size = max(1, options["batch_size"])
+        self.workers = max(1, options["workers"])
+        self.force = options["force"]
+        self.prune = not options["keep_removed"]
+        self.chunking = {
+            "max_size": options["chunk_size"],
+            "overlap": options["overlap"],
+            "unit": options["unit"],
+        }
+        # path -> (mtime_ns, size, sha256) from earlier scans in --watch mode
+        self.seen = {}
+
+        self.sync()
+        if not options["watch"]:
+            return
+
+        self.stdout.write(f"Watching {self.folder} every {options['interval']}s (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(options["interval"])
+                self.sync(quiet=True)
+        except KeyboardInterrupt:
+            pass
+
+    # ---- one pass over the folder ----
+    def sync(self, quiet: bool = False):
+        self.started = time.perf_counter()
+        self.stats = dict.fromkeys(
+            ["new", "changed", "unchanged", "removed", "embedded", "reused", "kept", "deleted"], 0
+        )
+        paths = sorted(self.folder.glob("*.txt"))
+        self.total_files = len(paths)
+        self.files_done = 0
+        self.docs = self._existing_documents(paths)
+
+        pending = []          # [(path, digest, chunks, doc)] waiting for a full embedding batch
+        pending_chunks = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            # map() keeps reading ahead while we embed/write earlier files
+            for item in pool.map(self._read, paths):
+                if item is None:
+                    self.stats["unchanged"] += 1
+                    self.files_done += 1
+                    continue
+                if item[2] is None:
+                    self._ingest_streaming(*item[:2], item[3])
+                    continue
+                pending.append(item)
+                pending_chunks += len(item[2])
+                if pending_chunks >= self.batch_size:
+                    self._flush(pending)
+                    pending, pending_chunks = [], 0
+        if pending:
+            self._flush(pending)
+
+        if self.prune:
+            self._prune(paths)
+
+        s = self.stats
+        if s["new"] or s["changed"] or s["removed"] or not (BM25_INDEX_DIR / "terms.json").exists():
+            # keep the on-disk BM25 index used by hybrid retrieval in step
+            update_lexical_index()
+        if quiet and not (s["new"] or s["changed"] or s["removed"]):
+            return
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Files: {s['new']} new, {s['changed']} changed, {s['unchanged']} unchanged, "
+                f"{s['removed']} removed. Chunks: {s['embedded']} embedded, {s['reused']} reused, "
+                f"{s['kept']} kept, {s['deleted']} deleted. "
+                f"{elapsed:.1f}s ({s['embedded'] / max(elapsed, 1e-9):.1f} chunks/sec)"
+            )
+        )
+
+    def _existing_documents(self, paths):
+        """
+        Map source_path -> Document. Older duplicates left by
+        non-incremental runs are deleted so each file has one document.
+        """
+        docs = {}
+        qs = Document.objects.filter(source_path__in=[str(p) for p in paths]).order_by("id")
+        for doc in qs:
+            if doc.source_path in docs:
+                self.stats["deleted"] += docs[doc.source_path].chunks.count()
+                docs[doc.source_path].delete()
+            docs[doc.source_path] = doc
+        return docs
+
+    def _read(self, path: Path):
+        """
+        Return (path, digest, chunks, doc) for new or changed files, None for
+        unchanged ones. chunks is None for files above STREAM_THRESHOLD,
+        which are chunked lazily by _ingest_streaming. Runs in the worker pool.
+        """
+        doc = self.docs.get(str(path))
+        st = path.stat()
+        seen = self.seen.get(path)
+        if (
+            not self.force
+            and doc is not None
+            and seen is not None
+            and seen[:2] == (st.st_mtime_ns, st.st_size)
+            and seen[2] == doc.content_hash
+        ):
+            return None
+
+        digest = sha256_file(path)
+        self.seen[path] = (st.st_mtime_ns, st.st_size, digest)
+        if not self.force and doc is not None and doc.content_hash == digest:
+            return None
+        if st.st_size > STREAM_THRESHOLD:
+            return path, digest, None, doc
+        return path, digest, list(iter_file_chunks(path, **self.chunking)), doc
+
+    def _flush(self, pending):
+        """
+        Diff each pending document against its stored chunks, embed only the
+        new/changed chunk texts (one batched encode for all documents), then
+        apply each document's delta in one transaction.
+        """
+        plans = []
+        to_embed = []         # chunk rows that still need an embedding
+        for path, digest, chunks, doc in pending:
+            old = {}          # chunk_index -> (id, text_hash)
+            reusable = {}     # text_hash -> embedding bytes (chunks that moved)
+            if doc is not None and not self.force:
+                rows = doc.chunks.values_list(
+                    "id", "chunk_index", "text_hash", "embedding_model", "embedding"
+                )
+                for chunk_id, index, text_hash, model_name, embedding in rows:
+                    old[index] = (chunk_id, text_hash)
+                    if model_name == MODEL_NAME:
+                        reusable[text_hash] = bytes(embedding)
+            elif doc is not None:
+                old = {
+                    index: (chunk_id, None)
+                    for chunk_id, index in doc.chunks.values_list("id", "chunk_index")
+                }
+
+            new_rows, delete_ids = self._diff(chunks, 0, old, reusable, to_embed)
+            # chunks past the end of a shrunk file
+            delete_ids.extend(chunk_id for chunk_id, _ in old.values())
+            plans.append((path, digest, doc, new_rows, delete_ids))
+
+        self._embed(to_embed)
 
-        for path in folder.glob("*.txt"):
-            self.stdout.write(f"Indexing {path.name}")
-            text = path.read_text(encoding="utf-8")
-            doc = Document.objects.create(
+        for path, digest, doc, new_rows, delete_ids in plans:
+            with transaction.atomic(using=RAG_DB):
+                doc = self._save_document(path, digest, doc)
+                self._apply(doc, new_rows, delete_ids)
+            self.files_done += 1
+        self._progress()
+
+    def _ingest_streaming(self, path: Path, digest: str, doc):
+        """
+        Index a large file in bounded memory: chunks are generated from the
+        file as it is read and diffed, embedded and written batch_size at a
+        time. Only the stored chunks of the current index window are
+        loaded, and moved texts are reused by hash within the document.
+        """
+        with transaction.atomic(using=RAG_DB):
+            doc = self._save_document(path, digest, doc)
+            start = 0
+            chunks = iter_file_chunks(path, **self.chunking)
+            while True:
+                batch = list(islice(chunks, self.batch_size))
+                if not batch:
+                    break
+                old, reusable = {}, {}
+                window = doc.chunks.filter(chunk_index__gte=start, chunk_index__lt=start + len(batch))
+                if self.force:
+                    old = {index: (chunk_id, None) for chunk_id, index in window.values_list("id", "chunk_index")}
+                else:
+                    for chunk_id, index, text_hash in window.values_list("id", "chunk_index", "text_hash"):
+                        old[index] = (chunk_id, text_hash)
+                    hashes = {sha256_text(text) for text in batch}
+                    rows = doc.chunks.filter(text_hash__in=hashes, embedding_model=MODEL_NAME)
+                    reusable = {h: bytes(e) for h, e in rows.values_list("text_hash", "embedding")}
+                to_embed = []
+                new_rows, delete_ids = self._diff(batch, start, old, reusable, to_embed)
+                self._embed(to_embed)
+                self._apply(doc, new_rows, delete_ids)
+                start += len(batch)
+                self._progress(f"{path.name}: {start} chunks")
+            # chunks past the end of a shrunk file
+            tail = doc.chunks.filter(chunk_index__gte=start)
+            self.stats["deleted"] += tail.count()
+            tail.delete()
+        self.files_done += 1
+
+    def _diff(self, chunks, start, old, reusable, to_embed):
+        """
+        Compare chunk texts (numbered from `start`) with the stored
+        {chunk_index: (id, text_hash)} map, popping matched entries.
+        Returns (new_rows, delete_ids); rows that need an embedding are
+        appended to to_embed.
+        """
+        new_rows, delete_ids = [], []
+        for i, text in enumerate(chunks, start):
+            text_hash = sha256_text(text)
+            previous = old.pop(i, None)
+            if previous is not None and previous[1] == text_hash:
+                self.stats["kept"] += 1
+                continue
+            if previous is not None:
+                delete_ids.append(previous[0])
+            row = DocumentChunk(
+                chunk_index=i,
+                text=text,
+                text_hash=text_hash,
+                embedding=reusable.get(text_hash),
+                embedding_model=MODEL_NAME,
+            )
+            if row.embedding is None:
+                to_embed.append(row)
+            else:
+                row.embedding_dim = len(row.embedding) // 4
+                self.stats["reused"] += 1
+            new_rows.append(row)
+        return new_rows, delete_ids
+
+    def _embed(self, rows):
+        if not rows:
+            return
+        vectors = embed_texts([row.text for row in rows], batch_size=self.batch_size)
+        for row, emb in zip(rows, vectors):
+            row.embedding = encode_vector(emb)
+            row.embedding_dim = len(emb)
+        self.stats["embedded"] += len(rows)
+
+    def _save_document(self, path: Path, digest: str, doc):
+        if doc is None:
+            self.stats["new"] += 1
+            return Document.objects.create(
                 title=path.name,
-                doc_type=doc_type,
+                doc_type=self.doc_type,
                 source_path=str(path),
+                content_hash=digest,
             )
+        doc.doc_type = self.doc_type
+        doc.content_hash = digest
+        doc.save(update_fields=["doc_type", "content_hash"])
+        self.stats["changed"] += 1
+        return doc
 
-            chunks = chunk_text(text)
-            for i, chunk in enumerate(chunks):
-                emb = embed_text(chunk)
-                DocumentChunk.objects.create(
-                    document=doc,
-                    chunk_index=i,
-                    text=chunk,
-                    embedding=emb,
-                )
+    def _apply(self, doc, new_rows, delete_ids):
+        if delete_ids:
+            DocumentChunk.objects.filter(id__in=delete_ids).delete()
+            self.stats["deleted"] += len(delete_ids)
+        for row in new_rows:
+            row.document = doc
+        DocumentChunk.objects.bulk_create(new_rows, batch_size=500)
+
+    def _progress(self, detail: str = ""):
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(
+            f"{self.files_done}/{self.total_files} files, {self.stats['embedded']} chunks embedded, "
+            f"{self.stats['embedded'] / max(elapsed, 1e-9):.1f} chunks/sec"
+            + (f" ({detail})" if detail else "")
+        )
+
+    def _prune(self, paths):
+        """
+        Delete documents that were indexed from this folder but whose file
+        is gone.
+        """
+        present = {str(p) for p in paths}
+        removed = [
+            doc for doc in Document.objects.filter(source_path__startswith=str(self.folder))
+            if Path(doc.source_path).parent == self.folder and doc.source_path not in present
+        ]
+        for doc in removed:
+            self.stdout.write(f"Removing {doc.title} (source file deleted)")
+            self.stats["deleted"] += doc.chunks.count()
+            doc.delete()
+            self.seen.pop(Path(doc.source_path), None)
+        self.stats["removed"] += len(removed)
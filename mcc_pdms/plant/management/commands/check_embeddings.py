@@ -0,0 +1,96 @@
+# plant/management/commands/check_embeddings.py
+import time
+from pathlib import Path
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from ragapp.embeddings import BACKENDS, get_embedder
+from ragapp.models import DocumentChunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare an embedding backend against the reference model (cosine "
+        "agreement per text) and benchmark it: batch throughput in texts/sec "
+        "and single-question latency p50/p99. Texts come from DocumentChunk, "
+        "or from .txt files in --folder."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", choices=sorted(BACKENDS), default="onnx")
+        parser.add_argument("--reference", choices=sorted(BACKENDS), default="torch")
+        parser.add_argument("--folder", type=str, help="Read texts from .txt files instead of the DB.")
+        parser.add_argument("--limit", type=int, default=500, help="Max texts to use.")
+        parser.add_argument("--batch-size", type=int, default=64)
+        parser.add_argument("--queries", type=int, default=200, help="Single-text encodes for latency.")
+        parser.add_argument(
+            "--min-cosine",
+            type=float,
+            default=0.97,
+            help="Fail if any text's cosine with the reference is below this.",
+        )
+        parser.add_argument("--skip-parity", action="store_true", help="Only benchmark --backend.")
+
+    def _texts(self, folder, limit):
+        if folder:
+            texts = []
+            for path in sorted(Path(folder).glob("*.txt")):
+                texts.extend(p.strip() for p in path.read_text(encoding="utf-8").split("\n\n") if p.strip())
+            return texts[:limit]
+        return list(DocumentChunk.objects.order_by("id").values_list("text", flat=True)[:limit])
+
+    def _benchmark(self, embedder, texts, questions, batch_size):
+        embedder.encode(texts[:batch_size], batch_size=batch_size)      # warm-up
+        started = time.perf_counter()
+        vectors = embedder.encode(texts, batch_size=batch_size)
+        throughput = len(texts) / max(time.perf_counter() - started, 1e-9)
+
+        latencies = []
+        for q in questions:
+            t0 = time.perf_counter()
+            embedder.encode([q], batch_size=1)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        p50, p99 = np.percentile(latencies, [50, 99])
+        self.stdout.write(
+            f"  {embedder.name:<6} {throughput:9.1f} texts/sec (batch {batch_size})   "
+            f"single text p50 {p50:.2f} ms  p99 {p99:.2f} ms"
+        )
+        return vectors
+
+    def handle(self, *args, **options):
+        texts = self._texts(options["folder"], options["limit"])
+        if not texts:
+            raise CommandError("No texts found (index some documents or pass --folder)")
+        # question-sized inputs for the latency numbers
+        questions = [" ".join(t.split()[:16]) for t in texts]
+        questions = (questions * (options["queries"] // len(questions) + 1))[: options["queries"]]
+
+        backends = [options["backend"]]
+        if not options["skip_parity"] and options["reference"] != options["backend"]:
+            backends.append(options["reference"])
+
+        self.stdout.write(f"{len(texts)} texts, {len(questions)} single-text queries")
+        vectors = {}
+        for name in backends:
+            try:
+                embedder = get_embedder(name)
+            except (ImportError, FileNotFoundError) as exc:
+                raise CommandError(f"{name} backend unavailable: {exc}")
+            vectors[name] = self._benchmark(embedder, texts, questions, options["batch_size"])
+
+        if len(vectors) < 2:
+            return
+        candidate, reference = vectors[options["backend"]], vectors[options["reference"]]
+        cosines = np.sum(candidate * reference, axis=1)
+        worst = int(np.argmin(cosines))
+        self.stdout.write(
+            f"cosine vs {options['reference']}: mean {cosines.mean():.4f}  "
+            f"p1 {np.percentile(cosines, 1):.4f}  min {cosines[worst]:.4f}"
+        )
+        if cosines[worst] < options["min_cosine"]:
+            raise CommandError(
+                f"Parity check failed: min cosine {cosines[worst]:.4f} < {options['min_cosine']} "
+                f"for text: {texts[worst][:80]!r}"
+            )
+        self.stdout.write(self.style.SUCCESS("Parity check passed"))
@@ -0,0 +1,69 @@
+# plant/management/commands/export_onnx_embeddings.py
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from ragapp.embeddings import MODEL_NAME, ONNX_MODEL_DIR, ONNX_MODEL_FILE
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the sentence-transformers embedding model to ONNX and quantise "
+        "its weights to int8 for RAG_EMBEDDING_BACKEND='onnx'. Needs torch, "
+        "sentence-transformers and onnxruntime on the exporting machine only; "
+        "servers then need just onnxruntime and tokenizers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", type=str, default=ONNX_MODEL_DIR)
+        parser.add_argument("--opset", type=int, default=17)
+        parser.add_argument(
+            "--keep-fp32",
+            action="store_true",
+            help="Keep the unquantised model.onnx next to the int8 model.",
+        )
+
+    def handle(self, *args, **options):
+        import torch
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        from sentence_transformers import SentenceTransformer
+
+        started = time.perf_counter()
+        out = options["output"]
+        os.makedirs(out, exist_ok=True)
+        fp32_path = os.path.join(out, "model.onnx")
+        int8_path = os.path.join(out, ONNX_MODEL_FILE)
+
+        st_model = SentenceTransformer(MODEL_NAME, device="cpu")
+        transformer = st_model[0].auto_model.eval()
+        transformer.config.return_dict = False
+        tokenizer = st_model.tokenizer
+        # writes tokenizer.json, read by the `tokenizers` library at runtime
+        tokenizer.save_pretrained(out)
+
+        sample = tokenizer(["Dryer outlet temperature for batch PB-2025-010"], return_tensors="pt")
+        names = ["input_ids", "attention_mask", "token_type_ids"]
+        dynamic = {name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]}
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(sample[name] for name in names),
+                fp32_path,
+                input_names=names,
+                output_names=["last_hidden_state", "pooler_output"],
+                dynamic_axes=dynamic,
+                opset_version=options["opset"],
+            )
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        if not options["keep_fp32"]:
+            os.remove(fp32_path)
+
+        size_mb = os.path.getsize(int8_path) / 1e6
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Exported {MODEL_NAME} to {int8_path} ({size_mb:.1f} MB, int8) "
+                f"in {time.perf_counter() - started:.1f}s. "
+                "Run `manage.py check_embeddings` to verify parity."
+            )
+        )
@@ -0,0 +1,73 @@
+# plant/management/commands/register_model.py
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from plant import model_registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Register a trained model artefact as a new version in the model "
+        "registry (and activate it), list versions, or switch the active one. "
+        "Running workers pick up the change within ML_REGISTRY_CHECK_SECONDS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", help="Model name, e.g. quality, anomaly, batch_anomaly")
+        parser.add_argument("artefact", nargs="?", help="joblib/pickle file to register")
+        parser.add_argument("--features", help="Comma-separated feature names, in column order")
+        parser.add_argument(
+            "--training-data",
+            action="append",
+            default=[],
+            help="File the model was trained on (repeatable); its sha256 is recorded.",
+        )
+        parser.add_argument("--metrics", help='JSON object, e.g. \'{"auc": 0.91}\'')
+        parser.add_argument("--no-activate", action="store_true", help="Register without activating.")
+        parser.add_argument("--activate", metavar="VERSION", help="Make an existing version active.")
+        parser.add_argument("--list", action="store_true", help="List registered versions.")
+
+    def handle(self, *args, **options):
+        name = options["name"]
+        if options["list"]:
+            active = model_registry.current_version(name)
+            versions = model_registry.list_versions(name)
+            if not versions:
+                self.stdout.write(f"No registered versions of {name}.")
+            for meta in versions:
+                marker = "*" if meta["version"] == active else " "
+                self.stdout.write(
+                    f"{marker} {meta['version']}  {meta.get('model_class', '')}  "
+                    f"features={meta.get('features')}  metrics={meta.get('metrics')}"
+                )
+            return
+
+        if options["activate"]:
+            try:
+                model_registry.activate(name, options["activate"])
+            except FileNotFoundError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(self.style.SUCCESS(f"{name} now at version {options['activate']}"))
+            return
+
+        if not options["artefact"]:
+            raise CommandError("Give an artefact to register, or --list / --activate VERSION")
+        try:
+            metrics = json.loads(options["metrics"]) if options["metrics"] else None
+        except json.JSONDecodeError as exc:
+            raise CommandError(f"--metrics is not valid JSON: {exc}")
+        features = options["features"].split(",") if options["features"] else None
+        try:
+            version = model_registry.register_model(
+                name,
+                artefact=options["artefact"],
+                features=features,
+                training_data=options["training_data"],
+                metrics=metrics,
+                activate_now=not options["no_activate"],
+            )
+        except FileNotFoundError as exc:
+            raise CommandError(str(exc))
+        state = "registered" if options["no_activate"] else "registered and activated"
+        self.stdout.write(self.style.SUCCESS(f"{name} version {version} {state}"))
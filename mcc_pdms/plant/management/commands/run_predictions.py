@@ -0,0 +1,45 @@
+# plant/management/commands/run_predictions.py
+from django.core.management.base import BaseCommand, CommandError
+
+from plant.bulk_predictions import CHUNK_SIZE, run_bulk_predictions
+
+
+class Command(BaseCommand):
+    help = (
+        "Predict quality for all COMPLETED production batches in chunks "
+        "(one model call and one bulk write per chunk), updating each "
+        "batch's latest QCReport or creating one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            "--only-stale",
+            action="store_true",
+            help="Skip batches whose latest prediction was made by the current model.",
+        )
+
+    def handle(self, *args, **options):
+        def progress(stats):
+            if options["verbosity"] >= 1:
+                self.stdout.write(
+                    f"  {stats['batches']} batches  ({stats['updated']} updated, "
+                    f"{stats['created']} created, {stats['invalid']} invalid)  {stats['seconds']:.1f}s"
+                )
+
+        try:
+            stats = run_bulk_predictions(
+                chunk_size=options["chunk_size"],
+                only_stale=options["only_stale"],
+                progress=progress,
+            )
+        except FileNotFoundError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Predicted {stats['batches'] - stats['invalid']} of {stats['batches']} batches "
+                f"with model {stats['model_version']} in {stats['seconds']:.1f}s "
+                f"({stats['updated']} QC reports updated, {stats['created']} created, "
+                f"{stats['invalid']} without valid parameters)"
+            )
+        )
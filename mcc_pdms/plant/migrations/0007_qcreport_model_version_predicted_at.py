@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plant', '0006_delete_batch_alter_productionbatch_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='qcreport',
+            name='model_version',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='qcreport',
+            name='predicted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
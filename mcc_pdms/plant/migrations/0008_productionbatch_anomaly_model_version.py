@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('plant', '0007_qcreport_model_version_predicted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productionbatch',
+            name='anomaly_model_version',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -13,4 +13,5 @@ def detect_anomaly_for_batch(batch: ProductionBatch) -> dict:
     return {
         "score": float(res["score"]),
         "is_anomaly": bool(res["is_anomaly"]),
+        "model_version": res["model_version"],
     }
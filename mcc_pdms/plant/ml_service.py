@@ -1,18 +1,9 @@
 # plant/ml_service.py
-import os
-import joblib
-import numpy as np
-from django.conf import settings
+from .model_registry import get_model
 
-MODEL_PATH = os.path.join(
-    os.path.dirname(os.path.dirname(__file__)),  # up from plant/ to project root
-    "quality_model.pkl",
-)
+# joblib / numpy (and sklearn, via unpickling) are imported on first use so
+# importing this module stays cheap; see plant/warmup.py to preload them.
 
-MODEL_PATH = os.path.join(settings.BASE_DIR, "ml_models", "anomaly_iforest.joblib")
-_model = None
-
-_model = None
 _feature_cols = [
     "pretreatment_temperature",
     "hydrolysis_temperature",
@@ -24,41 +15,94 @@ _feature_cols = [
 ]
 
 
-def load_model():
-    global _model
-    if _model is None:
-        if not os.path.exists(MODEL_PATH):
-            raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
-        _model = joblib.load(MODEL_PATH)
-    return _model
-
-
-def predict_quality(parameters_json: dict):
-    model = load_model()
-
-    x = [parameters_json.get(col) for col in _feature_cols]
-
-    if any(v is None for v in x):
-        raise ValueError("Missing features for prediction")
+def quality_model():
+    """
+    Current quality model snapshot (model, version, meta) from the registry;
+    hot-reloaded when a new version is activated.
+    """
+    return get_model("quality")
 
-    X = np.array(x).reshape(1, -1)
 
-    proba = model.predict_proba(X)[0][1]
-    pred = model.predict(X)[0]
-
-    return bool(pred), float(proba)
-
-
-
-def get_model():
-    global _model
-    if _model is None:
-        _model = joblib.load(MODEL_PATH)
-    return _model
-
-def predict_anomaly(moisture, particle_size):
-    model = get_model()
+def load_model():
+    return quality_model().model
+
+
+def model_version() -> str:
+    """
+    Version of the active quality model, stored on QCReport.model_version
+    so predictions made by an older model can be found and re-run.
+    """
+    return quality_model().version
+
+
+def _feature_row(parameters_json: dict, features=None) -> list[float]:
+    features = features or _feature_cols
+    x = [parameters_json.get(col) for col in features]
+    missing = [col for col, v in zip(features, x) if v is None]
+    if missing:
+        raise ValueError(f"Missing features for prediction: {', '.join(missing)}")
+    try:
+        return [float(v) for v in x]
+    except (TypeError, ValueError):
+        raise ValueError("Features must be numeric")
+
+
+def predict_quality(parameters_json: dict, loaded=None):
+    result = predict_quality_many([parameters_json], loaded)[0]
+    if isinstance(result, ValueError):
+        raise result
+    return result
+
+
+def predict_quality_many(parameter_dicts, loaded=None) -> list:
+    """
+    Score many parameter dicts with a single predict_proba call on an
+    N x 7 matrix; the class is taken from the probabilities (what
+    model.predict would do), so the forest is traversed once.
+
+    Pass the `loaded` snapshot from quality_model() when the caller records
+    which version made the prediction.
+
+    Returns one entry per input, in order: (predicted_pass, probability),
+    or a ValueError for an input that could not be scored.
+    """
+    import numpy as np
+
+    loaded = loaded or quality_model()
+    results, rows, positions = [], [], []
+    for i, params in enumerate(parameter_dicts):
+        try:
+            rows.append(_feature_row(params or {}, loaded.features))
+        except ValueError as e:
+            results.append(e)
+            continue
+        results.append(None)
+        positions.append(i)
+    if not rows:
+        return results
+
+    model = loaded.model
+    proba = model.predict_proba(np.asarray(rows, dtype=np.float64))
+    predicted = model.classes_[np.argmax(proba, axis=1)]
+    for i, pred, p in zip(positions, predicted, proba[:, 1]):
+        results[i] = (bool(pred), float(p))
+    return results
+
+
+
+def anomaly_model():
+    """
+    Current QC anomaly model snapshot (IsolationForest on moisture and
+    particle size).
+    """
+    return get_model("anomaly")
+
+
+def predict_anomaly(moisture, particle_size, loaded=None):
+    import numpy as np
+
+    model = (loaded or anomaly_model()).model
     X = np.array([[moisture, particle_size]])
     score = float(model.decision_function(X)[0])   # higher = more normal [web:1311]
-    is_anomaly = bool(model.predict(X)[0] == -1)   # -1 = anomaly
-    return score, is_anomaly
\ No newline at end of file
+    is_anomaly = score < 0                          # what model.predict(X) == -1 computes
+    return score, is_anomaly
@@ -0,0 +1,326 @@
+# plant/model_registry.py
+"""
+Versioned store for the ML models, with hot reload.
+
+Layout, one directory per model name (like the ANN index):
+
+    ML_REGISTRY_DIR/<name>/<version>/model.joblib
+    ML_REGISTRY_DIR/<name>/<version>/meta.json   features, training data hash, metrics
+    ML_REGISTRY_DIR/<name>/CURRENT               active version, replaced atomically
+
+Workers read CURRENT at most every ML_REGISTRY_CHECK_SECONDS. When it
+names a new version, that version is loaded in a background thread while
+requests keep using the old model, then swapped in with one assignment,
+so deploying a retrained model needs no restart. Names with nothing
+registered fall back to their legacy file in ML_LEGACY_MODEL_PATHS, which
+is reloaded the same way when its mtime or size changes.
+
+Artefacts are loaded with joblib mmap_mode=ML_MODEL_MMAP_MODE, so numpy
+arrays in the pickle are mapped from the page cache (shared by all worker
+processes) instead of being copied into each one.
+"""
+import hashlib
+import json
+import logging
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_DIR = Path(getattr(settings, "ML_REGISTRY_DIR", Path(settings.BASE_DIR) / "ml_models" / "registry"))
+CHECK_INTERVAL = getattr(settings, "ML_REGISTRY_CHECK_SECONDS", 10.0)
+MMAP_MODE = getattr(settings, "ML_MODEL_MMAP_MODE", "r")
+LEGACY_PATHS = getattr(
+    settings,
+    "ML_LEGACY_MODEL_PATHS",
+    {
+        "quality": Path(settings.BASE_DIR) / "quality_model.pkl",
+        "anomaly": Path(settings.BASE_DIR) / "ml_models" / "anomaly_iforest.joblib",
+        "batch_anomaly": Path(settings.BASE_DIR) / "models" / "anomaly_iforest.joblib",
+    },
+)
+
+ARTEFACT_FILE = "model.joblib"
+META_FILE = "meta.json"
+CURRENT_FILE = "CURRENT"
+
+
+def sha256_file(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_stamp(path) -> list:
+    st = Path(path).stat()
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _load_artefact(path):
+    import joblib
+
+    # arrays of compressed or plain-pickle files cannot be mapped; joblib
+    # then reads them normally
+    return joblib.load(path, mmap_mode=MMAP_MODE)
+
+
+class LoadedModel:
+    """
+    An immutable (model, version, meta) snapshot; callers keep the one they
+    predicted with so the recorded version always matches.
+    """
+
+    __slots__ = ("name", "version", "model", "meta", "loaded_at")
+
+    def __init__(self, name, version, model, meta):
+        self.name = name
+        self.version = version
+        self.model = model
+        self.meta = meta
+        self.loaded_at = time.time()
+
+    @property
+    def features(self) -> list | None:
+        return self.meta.get("features")
+
+    @property
+    def legacy(self) -> bool:
+        return "legacy_path" in self.meta
+
+
+# ---- store ----
+def current_version(name: str, root: Path = REGISTRY_DIR) -> str | None:
+    try:
+        return (Path(root) / name / CURRENT_FILE).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def list_versions(name: str, root: Path = REGISTRY_DIR) -> list[dict]:
+    base = Path(root) / name
+    if not base.is_dir():
+        return []
+    return [
+        json.loads((path / META_FILE).read_text())
+        for path in sorted(base.iterdir())
+        if (path / META_FILE).exists()
+    ]
+
+
+def activate(name: str, version: str, root: Path = REGISTRY_DIR):
+    base = Path(root) / name
+    if not (base / version / ARTEFACT_FILE).exists():
+        raise FileNotFoundError(f"No {name} model version {version} in {base}")
+    tmp = base / (CURRENT_FILE + ".tmp")
+    tmp.write_text(version)
+    tmp.replace(base / CURRENT_FILE)
+
+
+def register_model(
+    name: str,
+    model=None,
+    artefact=None,
+    features=None,
+    training_data=(),
+    metrics=None,
+    activate_now: bool = True,
+    keep: int = 5,
+    root: Path = REGISTRY_DIR,
+) -> str:
+    """
+    Store a fitted `model` (or an existing joblib `artefact` file) as a new
+    version of `name` and, by default, make it active. Models are dumped
+    uncompressed so they can be memory-mapped. `training_data` are
+    the files it was fitted on; their sha256 goes into the metadata.
+    Versions beyond `keep` (never the active one) are removed.
+    """
+    import joblib
+
+    if (model is None) == (artefact is None):
+        raise ValueError("Pass exactly one of model or artefact")
+    base = Path(root) / name
+    base.mkdir(parents=True, exist_ok=True)
+    staging = base / f".staging-{time.time_ns()}"
+    staging.mkdir()
+    target = staging / ARTEFACT_FILE
+    if artefact is not None:
+        shutil.copyfile(artefact, target)
+        if model is None:
+            model = joblib.load(target)
+    else:
+        joblib.dump(model, target)
+
+    artefact_sha = sha256_file(target)
+    version = f"{time.strftime('%Y%m%d%H%M%S')}-{artefact_sha[:8]}"
+    if features is None and hasattr(model, "feature_names_in_"):
+        features = [str(f) for f in model.feature_names_in_]
+    meta = {
+        "name": name,
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "model_class": type(model).__name__,
+        "features": list(features) if features is not None else None,
+        "training_data": {str(p): sha256_file(p) for p in training_data},
+        "metrics": metrics or {},
+        "artefact_sha256": artefact_sha,
+    }
+    try:
+        import sklearn
+
+        meta["sklearn_version"] = sklearn.__version__
+    except ImportError:
+        pass
+    (staging / META_FILE).write_text(json.dumps(meta, indent=2))
+    staging.rename(base / version)
+
+    if activate_now:
+        activate(name, version, root)
+    active = current_version(name, root)
+    versions = sorted(p for p in base.iterdir() if p.is_dir() and not p.name.startswith("."))
+    for old in versions[:-keep]:
+        if old.name != active:
+            shutil.rmtree(old, ignore_errors=True)
+    return version
+
+
+def load_version(name: str, version: str | None, root: Path = REGISTRY_DIR) -> LoadedModel:
+    """
+    Load `version` of `name`, or the legacy file when version is None.
+    """
+    if version is None:
+        path = LEGACY_PATHS.get(name)
+        if path is None or not Path(path).exists():
+            raise FileNotFoundError(f"No active {name} model in {Path(root) / name} and no legacy file")
+        meta = {"name": name, "features": None, "legacy_path": str(path), "stamp": file_stamp(path)}
+        # same short hash as predictions stamped before the registry existed
+        return LoadedModel(name, sha256_file(path)[:12], _load_artefact(path), meta)
+
+    path = Path(root) / name / version
+    meta = json.loads((path / META_FILE).read_text())
+    return LoadedModel(name, version, _load_artefact(path / ARTEFACT_FILE), meta)
+
+
+# ---- per-process handles ----
+class ModelHandle:
+    """
+    The active model of one name in this process. get() never blocks on a
+    reload after the first load: a new version is loaded by a background
+    thread and replaces the current snapshot atomically.
+    """
+
+    def __init__(self, name: str, root: Path = REGISTRY_DIR):
+        self.name = name
+        self.root = Path(root)
+        self._current = None
+        self._checked = None
+        self._loading = None            # version being loaded in the background
+        self._failed = None             # version whose load failed (not retried)
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self.last_error = None
+
+    def get(self) -> LoadedModel:
+        current = self._current
+        if current is None:
+            return self.reload()
+        now = time.monotonic()
+        if self._checked is None or now - self._checked >= CHECK_INTERVAL:
+            self._checked = now
+            self._maybe_reload(current)
+        return current
+
+    def reload(self) -> LoadedModel:
+        """
+        Load the active version synchronously (first use, or forced).
+        """
+        with self._lock:
+            loaded = load_version(self.name, current_version(self.name, self.root), self.root)
+            self._current = loaded
+            self._checked = time.monotonic()
+            return loaded
+
+    def _maybe_reload(self, current: LoadedModel):
+        # one small file read; None means "unregistered, use the legacy file"
+        version = current_version(self.name, self.root)
+        if version is None:
+            if current.legacy and not self._legacy_changed(current):
+                return
+        elif version == current.version or version == self._failed:
+            return
+        with self._lock:
+            if self._loading is not None:
+                return
+            self._loading = version or "legacy"
+        threading.Thread(
+            target=self._load_in_background, args=(version,), name=f"model-reload-{self.name}", daemon=True
+        ).start()
+
+    def _legacy_changed(self, current: LoadedModel) -> bool:
+        try:
+            stamp = file_stamp(current.meta["legacy_path"])
+        except OSError:
+            return False                # removed or being replaced: keep serving
+        return stamp != current.meta["stamp"] and stamp != self._failed
+
+    def _load_in_background(self, version):
+        try:
+            loaded = load_version(self.name, version, self.root)
+        except Exception as exc:
+            logger.warning("model registry: loading %s %s failed: %s", self.name, version or "legacy file", exc)
+            # a legacy file is identified by its stamp instead of a version
+            self._failed = version or self._legacy_stamp()
+            self.last_error = str(exc)
+        else:
+            self._current = loaded      # atomic swap; in-flight requests keep their snapshot
+            self.reloads += 1
+            logger.info("model registry: %s now at version %s", self.name, loaded.version)
+        finally:
+            with self._lock:
+                self._loading = None
+
+    def _legacy_stamp(self):
+        try:
+            return file_stamp(LEGACY_PATHS[self.name])
+        except (KeyError, OSError):
+            return None
+
+    def stats(self) -> dict:
+        current = self._current
+        return {
+            "version": current.version if current else None,
+            "active": current_version(self.name, self.root),
+            "reloads": self.reloads,
+            "loading": self._loading,
+            "last_error": self.last_error,
+        }
+
+
+_handles = {}
+_handles_lock = threading.Lock()
+
+
+def get_handle(name: str) -> ModelHandle:
+    handle = _handles.get(name)
+    if handle is None:
+        with _handles_lock:
+            handle = _handles.setdefault(name, ModelHandle(name))
+    return handle
+
+
+def get_model(name: str) -> LoadedModel:
+    """
+    Current snapshot of model `name`; raises FileNotFoundError if there is
+    neither a registered version nor a legacy file.
+    """
+    return get_handle(name).get()
+
+
+def registry_stats() -> dict:
+    return {name: handle.stats() for name, handle in list(_handles.items())}
@@ -58,6 +58,8 @@ class ProductionBatch(models.Model):
     # anomaly fields
     anomaly_score = models.FloatField(null=True, blank=True)
     is_anomaly = models.BooleanField(null=True, blank=True)
+    # registry version of the anomaly model that produced the score
+    anomaly_model_version = models.CharField(max_length=64, blank=True, default="")
 
     def __str__(self):
         return self.batch_no
@@ -79,6 +81,9 @@ class QCReport(models.Model):
 
     predicted_pass = models.BooleanField(default=False)
     predicted_probability = models.FloatField(blank=True, null=True)
+    # which quality model produced the prediction, and when (see ml_service.model_version)
+    model_version = models.CharField(max_length=64, blank=True, default="")
+    predicted_at = models.DateTimeField(blank=True, null=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
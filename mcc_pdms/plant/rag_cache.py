@@ -0,0 +1,226 @@
+# plant/rag_cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries also expire after
+    `ttl` seconds. The cache is tied to a corpus version: call
+    `sync_version()` with the current version before use and everything is
+    dropped when it changes.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 300.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._data = OrderedDict()      # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def sync_version(self, version):
+        if version == self.version:
+            return
+        with self._lock:
+            if version != self.version:
+                if self.version is not None:
+                    self.invalidations += 1
+                self._data.clear()
+                self.version = version
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class SemanticAnswerCache:
+    """
+    Reuses LLM answers for near-duplicate questions. An entry matches when
+    the retrieved chunk ids and batch context are identical and the cosine
+    similarity of the question embeddings is at least `threshold`. Entries
+    are LRU-evicted, expire after `ttl` seconds and are dropped when one of
+    their source chunks disappears (changed chunks are re-inserted with new
+    ids by build_rag_index).
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 1800.0, threshold: float = 0.95):
+        self.name = "answer"
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()   # entry id -> entry dict
+        self._groups = {}               # (chunk_ids, batch_context) -> {entry ids}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        group = self._groups.get(entry["group"])
+        if group is not None:
+            group.discard(entry_id)
+            if not group:
+                del self._groups[entry["group"]]
+
+    def lookup(self, q_vec, chunk_ids, batch_context):
+        group_key = (tuple(chunk_ids), batch_context or "")
+        q = np.asarray(q_vec, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        now = time.monotonic()
+        with self._lock:
+            best, best_sim = None, self.threshold
+            for entry_id in list(self._groups.get(group_key, ())):
+                entry = self._entries[entry_id]
+                if entry["expires_at"] < now:
+                    self._drop(entry_id)
+                    continue
+                sim = float(entry["vector"] @ q)
+                if sim >= best_sim:
+                    best, best_sim = entry_id, sim
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            return self._entries[best]["answer"], best_sim
+
+    def store(self, q_vec, chunk_ids, batch_context, answer):
+        group_key = (tuple(chunk_ids), batch_context or "")
+        q = np.asarray(q_vec, dtype=np.float32)
+        q = q / (np.linalg.norm(q) or 1.0)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "vector": q,
+                "group": group_key,
+                "answer": answer,
+                "expires_at": time.monotonic() + self.ttl,
+            }
+            self._groups.setdefault(group_key, set()).add(entry_id)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def cached_chunk_ids(self) -> set:
+        with self._lock:
+            return {i for chunk_ids, _ in self._groups for i in chunk_ids}
+
+    def sync_version(self, version, live_ids_fn):
+        """
+        On a corpus change, keep only entries whose source chunks all still
+        exist. `live_ids_fn(ids)` returns the subset of ids that exist.
+        """
+        if version == self.version:
+            return
+        live = set(live_ids_fn(self.cached_chunk_ids())) if self._entries else set()
+        with self._lock:
+            for group_key in list(self._groups):
+                if not set(group_key[0]) <= live:
+                    for entry_id in list(self._groups[group_key]):
+                        self._drop(entry_id)
+                        self.invalidations += 1
+            self.version = version
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+def vector_key(vector) -> bytes:
+    return hashlib.blake2b(
+        np.asarray(vector, dtype=np.float32).tobytes(), digest_size=16
+    ).digest()
+
+
+# question text -> embedding vector
+embedding_cache = TTLCache(
+    "embedding",
+    maxsize=getattr(settings, "RAG_EMBEDDING_CACHE_SIZE", 2048),
+    ttl=getattr(settings, "RAG_EMBEDDING_CACHE_TTL", 3600),
+)
+# (embedding, k, search knobs) -> (chunk_ids, scores)
+retrieval_cache = TTLCache(
+    "retrieval",
+    maxsize=getattr(settings, "RAG_RETRIEVAL_CACHE_SIZE", 2048),
+    ttl=getattr(settings, "RAG_RETRIEVAL_CACHE_TTL", 300),
+)
+
+# (question embedding ~ threshold, chunk ids, batch context) -> LLM answer
+answer_cache = SemanticAnswerCache(
+    maxsize=getattr(settings, "RAG_ANSWER_CACHE_SIZE", 512),
+    ttl=getattr(settings, "RAG_ANSWER_CACHE_TTL", 1800),
+    threshold=getattr(settings, "RAG_ANSWER_CACHE_THRESHOLD", 0.95),
+)
+
+
+def cache_stats() -> dict:
+    return {c.name: c.stats() for c in (embedding_cache, retrieval_cache, answer_cache)}
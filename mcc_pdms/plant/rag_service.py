@@ -1,18 +1,38 @@
+import asyncio
+import contextvars
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Iterable
 from math import sqrt
+import numpy as np
 from django.conf import settings
-from langchain_groq import ChatGroq
 # from langchain.schema import HumanMessage, SystemMessage
 from ragapp.models import DocumentChunk
+from ragapp import embeddings as chunk_embeddings
+from .vector_index import FILTER_KEYS, get_vector_index
+from .ann_index import get_ann_index
+from .llm_backends import get_llm
+from .context_packer import count_tokens, pack_context, section_header
+from .lexical_index import get_lexical_index, reciprocal_rank_fusion
+from .admission import AdmissionRejected, llm_admission
+from .singleflight import flight_key, rag_flight
+from .rag_cache import answer_cache, embedding_cache, normalize_question, retrieval_cache, vector_key
 from django.db.models import F
+from asgiref.sync import sync_to_async
 
-try:
-    # Newer LangChain
-    from langchain_core.messages import HumanMessage, SystemMessage
-except ImportError:
-    # Older LangChain
-    from langchain.schema import HumanMessage, SystemMessage
+
+@lru_cache(maxsize=1)
+def _message_classes():
+    # langchain is only needed once a prompt is built
+    try:
+        # Newer LangChain
+        from langchain_core.messages import HumanMessage, SystemMessage
+    except ImportError:
+        # Older LangChain
+        from langchain.schema import HumanMessage, SystemMessage
+    return HumanMessage, SystemMessage
 
 
 EMBED_DIM = 768  # adjust based on model
@@ -21,32 +41,9 @@ api_key = os.environ.get("GROQ_API_KEY")
 # groqapi=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
 
 
-def _groq_llm():
-    return ChatGroq(
-        model="llama-3.1-8b-instant",
-        api_key=os.environ.get("GROQ_API_KEY"),
-        temperature=0.1,
-    )
-
-# same dummy embedding size as before
-def embed_question(question: str) -> list[float]:
-    return [float(len(question) % 10)] * 16
-
-def cosine_sim(a, b):
-    num = sum(x*y for x, y in zip(a, b))
-    da = sqrt(sum(x*x for x in a))
-    db = sqrt(sum(x*x for x in b))
-    return num / (da * db + 1e-9)
-
-def retrieve_top_k(question: str, k: int = 5) -> list[DocumentChunk]:
-    q_emb = embed_question(question)
-    chunks = list(DocumentChunk.objects.select_related("document").all()[:500])  # simple
-    scored = [
-        (cosine_sim(q_emb, c.embedding), c)
-        for c in chunks
-    ]
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [c for _, c in scored[:k]]
+def _get_llm():
+    # one pooled, retrying client per process (see plant/llm_backends.py)
+    return get_llm()
 
 # def generate_answer(question: str, batch_context: str | None, chunks: Iterable[DocumentChunk]) -> str:
 #     context_snippets = "\n\n".join(f"- {c.text[:200]}" for c in chunks)
@@ -73,7 +70,9 @@ def embed_text(text: str) -> list[float]:
     return [x / norm for x in v]
 
 def embed_question(q: str) -> list[float]:
-    return embed_text(q)
+    # questions must live in the same space as the indexed chunks
+    # (build_rag_index embeds with ragapp.embeddings)
+    return chunk_embeddings.embed_text(q)
 
 def cosine_sim(a, b):
     num = sum(x*y for x, y in zip(a, b))
@@ -81,19 +80,221 @@ def cosine_sim(a, b):
     db = sqrt(sum(x*x for x in b))
     return num / (da * db + 1e-9)
 
-def retrieve_top_k(question: str, k: int = 5) -> list[DocumentChunk]:
-    q_emb = embed_question(question)
-    # naive in-DB scan; later you can move to pgvector/faiss
-    chunks = list(DocumentChunk.objects.select_related("document").all())
-    scored = [(cosine_sim(q_emb, c.embedding), c) for c in chunks]
-    scored.sort(key=lambda x: x[0], reverse=True)
-    return [c for _, c in scored[:k]]
-
-def generate_answer(question: str, batch_context: str | None, chunks: Iterable[DocumentChunk]) -> str:
-    context_text = "\n\n".join(
-        f"Document: {c.document.title} [type={c.document.doc_type}]\n{c.text}"
-        for c in chunks
+def corpus_version():
+    """
+    Changes whenever the searchable chunk set changes; caches key on it.
+    With the ANN backend filtered queries still use the exact index, so
+    its version is part of the key too.
+    """
+    exact_version = get_vector_index().version
+    if getattr(settings, "RAG_RETRIEVAL_BACKEND", "exact") == "ann":
+        ann = get_ann_index()
+        if ann is not None:
+            return ("ann", ann.meta["built_at"], exact_version)
+    return ("exact", exact_version)
+
+def _vector_search(q_emb, k: int = 5, ef: int | None = None, nprobe: int | None = None, filters: dict | None = None):
+    """
+    Return (chunk_ids, scores) from the configured vector backend.
+    "ann" uses the on-disk index built by build_ann_index and falls back to
+    the exact in-memory index until one has been published. Filtered
+    queries always use the exact index, which only scores the matching
+    doc_type partitions and document rows.
+    """
+    if not filters and getattr(settings, "RAG_RETRIEVAL_BACKEND", "exact") == "ann":
+        ann = get_ann_index()
+        if ann is not None:
+            return ann.search(q_emb, k, nprobe=nprobe, ef=ef)
+    # one matrix-vector product over the in-memory index instead of
+    # scoring every row of the table in Python
+    return get_vector_index().search(q_emb, k, filters=filters)
+
+def _vector_search_many(q_embs, k: int = 5, ef: int | None = None, nprobe: int | None = None, filters: dict | None = None):
+    if not filters and getattr(settings, "RAG_RETRIEVAL_BACKEND", "exact") == "ann":
+        ann = get_ann_index()
+        if ann is not None:
+            return [ann.search(q, k, nprobe=nprobe, ef=ef) for q in q_embs]
+    # one matrix-matrix product for all questions
+    return get_vector_index().search_many(q_embs, k, filters=filters)
+
+def _hybrid_enabled(question) -> bool:
+    return question is not None and getattr(settings, "RAG_RETRIEVAL_MODE", "vector") == "hybrid"
+
+def search_index(
+    q_emb,
+    k: int = 5,
+    ef: int | None = None,
+    nprobe: int | None = None,
+    question: str | None = None,
+    filters: dict | None = None,
+):
+    """
+    Return (chunk_ids, scores). In "hybrid" mode the vector and BM25
+    candidate lists are fused with reciprocal-rank fusion, so exact tokens
+    such as batch codes or equipment tags rank well at small k.
+    `filters` restricts the search (see VectorIndex.search).
+    """
+    if not _hybrid_enabled(question):
+        return _vector_search(q_emb, k, ef=ef, nprobe=nprobe, filters=filters)
+    n = _hybrid_candidates(k)
+    vec_ids, _ = _vector_search(q_emb, n, ef=ef, nprobe=nprobe, filters=filters)
+    return _fuse(question, vec_ids, k, n, filters)
+
+def search_index_many(
+    q_embs,
+    k: int = 5,
+    ef: int | None = None,
+    nprobe: int | None = None,
+    questions: list[str] | None = None,
+    filters: dict | None = None,
+):
+    """
+    search_index for several questions at once; returns a list of
+    (chunk_ids, scores) in the order of `q_embs`.
+    """
+    if questions is None or not _hybrid_enabled(questions[0] if questions else None):
+        return _vector_search_many(q_embs, k, ef=ef, nprobe=nprobe, filters=filters)
+    n = _hybrid_candidates(k)
+    vec_hits = _vector_search_many(q_embs, n, ef=ef, nprobe=nprobe, filters=filters)
+    return [_fuse(q, vec_ids, k, n, filters) for q, (vec_ids, _) in zip(questions, vec_hits)]
+
+def _hybrid_candidates(k: int) -> int:
+    return max(k, getattr(settings, "RAG_HYBRID_CANDIDATES", 50))
+
+def _fuse(question, vec_ids, k, n, filters):
+    lex_ids, _ = get_lexical_index().search(question, n)
+    if filters:
+        # BM25 postings are not partitioned; keep only candidates in the slice
+        lex_ids = lex_ids[np.isin(lex_ids, get_vector_index(refresh=False).allowed_ids(filters))]
+    return reciprocal_rank_fusion(
+        [vec_ids.tolist(), lex_ids.tolist()], k, rrf_k=getattr(settings, "RAG_RRF_K", 60)
     )
+
+def filters_key(filters: dict | None) -> tuple:
+    """
+    Hashable, order-independent form of a filters dict for cache keys.
+    """
+    if not filters:
+        return ()
+    key = []
+    for name in FILTER_KEYS:
+        value = filters.get(name)
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set, frozenset)):
+            value = tuple(sorted(value))
+        elif hasattr(value, "isoformat"):
+            value = value.isoformat()
+        key.append((name, value))
+    return tuple(key)
+
+def _retrieval_key(q_emb, k, ef, nprobe, question, filters=None):
+    lexical = normalize_question(question) if _hybrid_enabled(question) else None
+    return (vector_key(q_emb), k, ef, nprobe, lexical, filters_key(filters))
+
+def question_vector(question: str) -> np.ndarray:
+    key = normalize_question(question)
+    vec = embedding_cache.get(key)
+    if vec is None:
+        vec = np.asarray(embed_question(question), dtype=np.float32)
+        embedding_cache.set(key, vec)
+    return vec
+
+def _live_chunk_ids(ids):
+    return DocumentChunk.objects.filter(id__in=list(ids)).values_list("id", flat=True)
+
+def sync_caches():
+    version = corpus_version()
+    embedding_cache.sync_version(version)
+    retrieval_cache.sync_version(version)
+    answer_cache.sync_version(version, _live_chunk_ids)
+
+def _with_scores(by_id, hit) -> list[DocumentChunk]:
+    # chunks in score order, each carrying its retrieval score
+    chunks = []
+    for chunk_id, score in zip(*hit):
+        chunk = by_id.get(chunk_id)
+        if chunk is not None:
+            chunk.score = score
+            chunks.append(chunk)
+    return chunks
+
+def retrieve_chunks(
+    q_emb,
+    k: int = 5,
+    ef: int | None = None,
+    nprobe: int | None = None,
+    question: str | None = None,
+    filters: dict | None = None,
+) -> list[DocumentChunk]:
+    key = _retrieval_key(q_emb, k, ef, nprobe, question, filters)
+    hit = retrieval_cache.get(key)
+    if hit is None:
+        ids, scores = search_index(q_emb, k, ef=ef, nprobe=nprobe, question=question, filters=filters)
+        hit = (ids.tolist(), scores.tolist())
+        retrieval_cache.set(key, hit)
+    return _with_scores(DocumentChunk.objects.select_related("document").in_bulk(hit[0]), hit)
+
+def question_vectors(questions: list[str]) -> np.ndarray:
+    """
+    (len(questions), dim) embeddings; cache misses are encoded in one call.
+    """
+    keys = [normalize_question(q) for q in questions]
+    vectors = [embedding_cache.get(key) for key in keys]
+    missing = [i for i, vec in enumerate(vectors) if vec is None]
+    if missing:
+        encoded = chunk_embeddings.embed_texts([questions[i] for i in missing])
+        for i, vec in zip(missing, encoded):
+            vectors[i] = np.asarray(vec, dtype=np.float32)
+            embedding_cache.set(keys[i], vectors[i])
+    return np.stack(vectors)
+
+def retrieve_many(
+    q_embs,
+    questions: list[str],
+    k: int = 5,
+    ef: int | None = None,
+    nprobe: int | None = None,
+    filters: dict | None = None,
+) -> list[list[DocumentChunk]]:
+    """
+    retrieve_chunks for several questions: one index search for all
+    retrieval-cache misses and one DB round-trip for all chunks.
+    """
+    keys = [_retrieval_key(q_emb, k, ef, nprobe, q, filters) for q_emb, q in zip(q_embs, questions)]
+    hits = [retrieval_cache.get(key) for key in keys]
+    missing = [i for i, hit in enumerate(hits) if hit is None]
+    if missing:
+        results = search_index_many(
+            q_embs[missing], k, ef=ef, nprobe=nprobe, questions=[questions[i] for i in missing], filters=filters
+        )
+        for i, (ids, scores) in zip(missing, results):
+            hits[i] = (ids.tolist(), scores.tolist())
+            retrieval_cache.set(keys[i], hits[i])
+    all_ids = {chunk_id for ids, _ in hits for chunk_id in ids}
+    by_id = DocumentChunk.objects.select_related("document").in_bulk(list(all_ids))
+    return [_with_scores(by_id, hit) for hit in hits]
+
+def retrieve_top_k(
+    question: str,
+    k: int = 5,
+    ef: int | None = None,
+    nprobe: int | None = None,
+    filters: dict | None = None,
+) -> list[DocumentChunk]:
+    sync_caches()
+    return retrieve_chunks(question_vector(question), k, ef=ef, nprobe=nprobe, question=question, filters=filters)
+
+def build_messages(question: str, batch_context: str | None, chunks: Iterable[DocumentChunk]) -> list:
+    return build_prompt(question, batch_context, chunks)[0]
+
+def build_prompt(question: str, batch_context: str | None, chunks: Iterable[DocumentChunk]) -> tuple[list, dict]:
+    """
+    Returns (messages, packing stats). Chunks are packed into
+    RAG_CONTEXT_TOKEN_BUDGET tokens (see plant/context_packer.py).
+    """
+    sections, packing = pack_context(question, list(chunks), batch_context=batch_context)
+    context_text = "\n\n".join(f"{section_header(c)}\n{text}" for c, text in sections)
     system_prompt = (
         "You are an MCC PDMS plant assistant. Answer based only on the provided "
         "SOPs/manuals/QC/incident context and batch info, in a concise way."
@@ -103,17 +304,364 @@ def generate_answer(question: str, batch_context: str | None, chunks: Iterable[D
         user_prompt += f"Batch context:\n{batch_context}\n\n"
     user_prompt += f"Knowledge base:\n{context_text}\n\nAnswer clearly:"
 
-    llm = _groq_llm()
+    HumanMessage, SystemMessage = _message_classes()
     messages = [
         SystemMessage(content=system_prompt),
         HumanMessage(content=user_prompt),
     ]
-    # ChatGroq uses .invoke() in LangChain 0.2+
-    response = llm.invoke(messages)
+    packing["prompt_tokens"] = count_tokens(system_prompt) + count_tokens(user_prompt)
+    return messages, packing
+
+def generate_answer(
+    question: str,
+    batch_context: str | None,
+    chunks: Iterable[DocumentChunk],
+    messages: list | None = None,
+) -> str:
+    llm = _get_llm()
+    if messages is None:
+        messages = build_messages(question, batch_context, chunks)
+    # waits for (or is refused) an LLM slot, see plant/admission.py
+    with llm_admission.slot():
+        response = llm.invoke(messages)
+    return response.content
+
+def stream_answer(
+    question: str,
+    batch_context: str | None,
+    chunks: Iterable[DocumentChunk],
+    messages: list | None = None,
+):
+    """
+    Yield answer text fragments as the LLM produces them.
+    """
+    llm = _get_llm()
+    if messages is None:
+        messages = build_messages(question, batch_context, chunks)
+    with llm_admission.slot():
+        for piece in llm.stream(messages):
+            if piece.content:
+                yield piece.content
+
+
+def answer_with_rag(
+    question: str,
+    batch_context: str | None = None,
+    ef: int | None = None,
+    nprobe: int | None = None,
+    filters: dict | None = None,
+) -> tuple[str, list[DocumentChunk], dict]:
+    """
+    Returns (answer, source chunks, meta). meta["cached"] tells whether the
+    answer came from the semantic answer cache instead of the LLM and
+    meta["coalesced"] whether an identical in-flight request produced it.
+    """
+    key = _flight_key(question, batch_context, ef, nprobe, filters)
+    (answer, top_chunks, meta), coalesced = rag_flight.do(
+        key, lambda: _answer_with_rag(question, batch_context, ef, nprobe, filters)
+    )
+    return answer, top_chunks, {**meta, "coalesced": coalesced}
+
+
+def _flight_key(question, batch_context, ef, nprobe, filters=None):
+    return flight_key(
+        "rag", normalize_question(question), batch_context or "", ef, nprobe, filters_key(filters)
+    )
+
+
+def _cached_answer(q_emb, top_chunks, batch_context):
+    """
+    (answer, meta) from the semantic answer cache, or None on a miss.
+    """
+    hit = answer_cache.lookup(q_emb, [c.id for c in top_chunks], batch_context)
+    if hit is None:
+        return None
+    answer, similarity = hit
+    return answer, {"cached": True, "cache_similarity": round(similarity, 4)}
+
+
+def _store_answer(q_emb, top_chunks, batch_context, answer):
+    answer_cache.store(q_emb, [c.id for c in top_chunks], batch_context, answer)
+
+
+def _answer_one(question, batch_context, q_emb, top_chunks):
+    """
+    Cache lookup, prompt packing, LLM call and cache store for an already
+    retrieved question; shared by the single and batch endpoints.
+    """
+    cached = _cached_answer(q_emb, top_chunks, batch_context)
+    if cached is not None:
+        answer, meta = cached
+        return answer, top_chunks, meta
+    messages, packing = build_prompt(question, batch_context, top_chunks)
+    answer = generate_answer(question, batch_context, top_chunks, messages=messages)
+    _store_answer(q_emb, top_chunks, batch_context, answer)
+    return answer, top_chunks, {"cached": False, **packing}
+
+
+def _answer_with_rag(question, batch_context, ef, nprobe, filters=None):
+    sync_caches()
+    q_emb = question_vector(question)
+    top_chunks = retrieve_chunks(q_emb, k=5, ef=ef, nprobe=nprobe, question=question, filters=filters)
+    return _answer_one(question, batch_context, q_emb, top_chunks)
+
+
+def stream_rag_events(
+    question: str,
+    batch_context: str | None = None,
+    ef: int | None = None,
+    nprobe: int | None = None,
+    filters: dict | None = None,
+):
+    """
+    Streaming variant of answer_with_rag. Yields (event, payload) pairs:
+    ("sources", [chunks]) right after retrieval, then ("token", str) for
+    each answer fragment, then ("done", meta).
+    """
+    sync_caches()
+    q_emb = question_vector(question)
+    top_chunks = retrieve_chunks(q_emb, k=5, ef=ef, nprobe=nprobe, question=question, filters=filters)
+    yield "sources", top_chunks
+
+    cached = _cached_answer(q_emb, top_chunks, batch_context)
+    if cached is not None:
+        answer, meta = cached
+        yield "token", answer
+        yield "done", meta
+        return
+
+    parts = []
+    messages, packing = build_prompt(question, batch_context, top_chunks)
+    for token in stream_answer(question, batch_context, top_chunks, messages=messages):
+        parts.append(token)
+        yield "token", token
+    _store_answer(q_emb, top_chunks, batch_context, "".join(parts))
+    yield "done", {"cached": False, **packing}
+
+
+# ---- batch questions (shift hand-over reports) ----
+# LLM calls of batch requests share this pool, so the number in flight per
+# process stays bounded however many batches arrive at once.
+_llm_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "RAG_BATCH_LLM_CONCURRENCY", 8),
+    thread_name_prefix="rag-llm",
+)
+
+
+def _ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def _timed_answer(question, batch_context, ef, nprobe, filters, q_emb, top_chunks):
+    started = time.perf_counter()
+    try:
+        (answer, chunks, meta), coalesced = rag_flight.do(
+            _flight_key(question, batch_context, ef, nprobe, filters),
+            lambda: _answer_one(question, batch_context, q_emb, top_chunks),
+        )
+    except AdmissionRejected as exc:
+        # kept apart so answer_many can turn an all-rejected batch into a 429
+        return {
+            "answer": None,
+            "chunks": top_chunks,
+            "error": str(exc),
+            "rejected": exc,
+            "answer_ms": _ms(started),
+        }
+    except Exception as exc:
+        return {"answer": None, "chunks": top_chunks, "error": str(exc), "answer_ms": _ms(started)}
+    return {
+        "answer": answer,
+        "chunks": chunks,
+        **meta,
+        "coalesced": coalesced,
+        "answer_ms": _ms(started),
+    }
+
+
+def answer_many(
+    questions: list[str],
+    batch_context: str | None = None,
+    ef: int | None = None,
+    nprobe: int | None = None,
+    filters: dict | None = None,
+) -> tuple[list[dict], dict]:
+    """
+    Answer several questions in one go. All questions are embedded in one
+    encode call and retrieved with one matrix-matrix product; the LLM calls
+    then run concurrently (at most RAG_BATCH_LLM_CONCURRENCY per process),
+    so the wall time is close to the slowest single answer.
+
+    Returns (results, timings). Each result has "question", "answer",
+    "chunks", "cached", "answer_ms" and, if its LLM call failed, "error";
+    one failed question does not fail the others. Repeated questions are
+    answered once. Raises AdmissionRejected when no question was admitted
+    to the LLM, so the caller can answer 429 as for a single question.
+    """
+    started = time.perf_counter()
+    sync_caches()
+    unique = list(dict.fromkeys(questions))
+
+    t0 = time.perf_counter()
+    q_embs = question_vectors(unique)
+    embed_ms = _ms(t0)
+
+    t0 = time.perf_counter()
+    chunk_lists = retrieve_many(q_embs, unique, k=5, ef=ef, nprobe=nprobe, filters=filters)
+    retrieve_ms = _ms(t0)
+
+    t0 = time.perf_counter()
+    futures = [
+        # copy_context carries the request priority into the pool thread
+        _llm_executor.submit(
+            contextvars.copy_context().run,
+            _timed_answer, q, batch_context, ef, nprobe, filters, q_emb, chunks,
+        )
+        for q, q_emb, chunks in zip(unique, q_embs, chunk_lists)
+    ]
+    by_question = {q: {"question": q, **f.result()} for q, f in zip(unique, futures)}
+    answer_ms = _ms(t0)
+    rejections = [r.pop("rejected") for r in by_question.values() if "rejected" in r]
+    if rejections and len(rejections) == len(by_question):
+        raise max(rejections, key=lambda exc: exc.retry_after)
+
+    timings = {
+        "questions": len(questions),
+        "unique_questions": len(unique),
+        "embed_ms": embed_ms,
+        "retrieve_ms": retrieve_ms,
+        "answer_ms": answer_ms,
+        "slowest_answer_ms": max((r["answer_ms"] for r in by_question.values()), default=0.0),
+        "total_ms": _ms(started),
+    }
+    return [by_question[q] for q in questions], timings
+
+
+# ---- async pipeline (ASGI views in plant.views_async) ----
+# CPU-bound embedding and index scans run here so the event loop stays free
+# while hundreds of requests wait on the LLM.
+_cpu_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "RAG_ASYNC_CPU_THREADS", 4),
+    thread_name_prefix="rag-cpu",
+)
+
+
+async def _run_cpu(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_cpu_executor, lambda: fn(*args, **kwargs))
+
+
+async def aquestion_vector(question: str) -> np.ndarray:
+    key = normalize_question(question)
+    vec = embedding_cache.get(key)
+    if vec is None:
+        vec = np.asarray(await _run_cpu(embed_question, question), dtype=np.float32)
+        embedding_cache.set(key, vec)
+    return vec
+
+
+async def aretrieve_chunks(
+    q_emb,
+    k: int = 5,
+    ef: int | None = None,
+    nprobe: int | None = None,
+    question: str | None = None,
+    filters: dict | None = None,
+) -> list[DocumentChunk]:
+    key = _retrieval_key(q_emb, k, ef, nprobe, question, filters)
+    hit = retrieval_cache.get(key)
+    if hit is None:
+        ids, scores = await _run_cpu(
+            search_index, q_emb, k, ef=ef, nprobe=nprobe, question=question, filters=filters
+        )
+        hit = (ids.tolist(), scores.tolist())
+        retrieval_cache.set(key, hit)
+    return _with_scores(await DocumentChunk.objects.select_related("document").ain_bulk(hit[0]), hit)
+
+
+async def agenerate_answer(
+    question: str,
+    batch_context: str | None,
+    chunks: Iterable[DocumentChunk],
+    messages: list | None = None,
+) -> str:
+    llm = _get_llm()
+    if messages is None:
+        messages = build_messages(question, batch_context, chunks)
+    async with llm_admission.aslot():
+        response = await llm.ainvoke(messages)
     return response.content
 
 
-def answer_with_rag(question: str, batch_context: str | None = None) -> tuple[str, list[DocumentChunk]]:
-    top_chunks = retrieve_top_k(question, k=5)
-    answer = generate_answer(question, batch_context, top_chunks)
-    return answer, top_chunks
\ No newline at end of file
+async def aanswer_with_rag(
+    question: str,
+    batch_context: str | None = None,
+    ef: int | None = None,
+    nprobe: int | None = None,
+    filters: dict | None = None,
+) -> tuple[str, list[DocumentChunk], dict]:
+    """
+    Async answer_with_rag: async ORM reads, embedding/search in a thread
+    pool and a non-blocking LLM call.
+    """
+    key = _flight_key(question, batch_context, ef, nprobe, filters)
+    (answer, top_chunks, meta), coalesced = await rag_flight.ado(
+        key, lambda: _aanswer_with_rag(question, batch_context, ef, nprobe, filters)
+    )
+    return answer, top_chunks, {**meta, "coalesced": coalesced}
+
+
+async def _aanswer_with_rag(question, batch_context, ef, nprobe, filters=None):
+    # index refresh/version checks hit the DB through the sync ORM
+    await sync_to_async(sync_caches)()
+    q_emb = await aquestion_vector(question)
+    top_chunks = await aretrieve_chunks(q_emb, k=5, ef=ef, nprobe=nprobe, question=question, filters=filters)
+    return await _aanswer_one(question, batch_context, q_emb, top_chunks)
+
+
+async def _aanswer_one(question, batch_context, q_emb, top_chunks):
+    """
+    Async _answer_one: same cache and packing, non-blocking LLM call.
+    """
+    cached = _cached_answer(q_emb, top_chunks, batch_context)
+    if cached is not None:
+        answer, meta = cached
+        return answer, top_chunks, meta
+    messages, packing = build_prompt(question, batch_context, top_chunks)
+    answer = await agenerate_answer(question, batch_context, top_chunks, messages=messages)
+    _store_answer(q_emb, top_chunks, batch_context, answer)
+    return answer, top_chunks, {"cached": False, **packing}
+
+
+async def astream_rag_events(
+    question: str,
+    batch_context: str | None = None,
+    ef: int | None = None,
+    nprobe: int | None = None,
+    filters: dict | None = None,
+):
+    """
+    Async generator version of stream_rag_events.
+    """
+    await sync_to_async(sync_caches)()
+    q_emb = await aquestion_vector(question)
+    top_chunks = await aretrieve_chunks(q_emb, k=5, ef=ef, nprobe=nprobe, question=question, filters=filters)
+    yield "sources", top_chunks
+
+    cached = _cached_answer(q_emb, top_chunks, batch_context)
+    if cached is not None:
+        answer, meta = cached
+        yield "token", answer
+        yield "done", meta
+        return
+
+    parts = []
+    llm = _get_llm()
+    messages, packing = build_prompt(question, batch_context, top_chunks)
+    async with llm_admission.aslot():
+        async for piece in llm.astream(messages):
+            if piece.content:
+                parts.append(piece.content)
+                yield "token", piece.content
+    _store_answer(q_emb, top_chunks, batch_context, "".join(parts))
+    yield "done", {"cached": False, **packing}
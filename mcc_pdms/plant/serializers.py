@@ -77,4 +77,10 @@ class QualityPredictionRequestSerializer(serializers.Serializer):
             raise serializers.ValidationError(
                 "Either batch_id or process_parameters must be provided."
             )
-        return attrs
\ No newline at end of file
+        return attrs
+
+
+class QualityPredictionBatchRequestSerializer(serializers.Serializer):
+    # items are validated one by one in the view, so a bad item does not
+    # fail the whole request
+    items = serializers.ListField(child=serializers.JSONField(), allow_empty=False)
@@ -0,0 +1,248 @@
+# plant/singleflight.py
+"""
+Request coalescing. Concurrent calls with the same key share one
+computation: the first caller (the leader) runs it and everyone else waits
+for its result instead of repeating the retrieval / LLM / model call.
+
+Within a worker process callers are coalesced with threading events
+(sync views) or futures (async views). With SINGLEFLIGHT_SHARED = True the
+leader also takes a lock in the Django cache and publishes its result
+there for a few seconds, so duplicates arriving at other workers wait for
+it too. That needs a cache shared by all workers (Redis / Memcached); with
+the default per-process LocMemCache leave it off.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+SHARED = getattr(settings, "SINGLEFLIGHT_SHARED", False)
+LOCK_TTL = getattr(settings, "SINGLEFLIGHT_LOCK_TTL", 60)
+RESULT_TTL = getattr(settings, "SINGLEFLIGHT_RESULT_TTL", 5)
+POLL_INTERVAL = getattr(settings, "SINGLEFLIGHT_POLL_INTERVAL", 0.05)
+
+_MISSING = object()
+
+
+def flight_key(*parts) -> str:
+    """
+    Canonical key for a request: order-insensitive for dicts, stable across
+    processes.
+    """
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.leaders = 0
+        self.coalesced = 0
+        self.shared_hits = 0
+        self._calls = {}            # key -> _Call (threads)
+        self._futures = {}          # (loop, key) -> Task (asyncio)
+        self._lock = threading.Lock()
+
+    # ---- cross-worker ----
+    def _cache_keys(self, key):
+        return f"sf:{self.name}:{key}:lock", f"sf:{self.name}:{key}:result"
+
+    def _shared_wait(self, key, deadline):
+        """
+        Return (value, None) with another worker's result for key, or
+        (_MISSING, token) if we should compute it ourselves. token is the
+        value we stored in the shared lock, or None when the deadline passed
+        without getting the lock.
+        """
+        lock_key, result_key = self._cache_keys(key)
+        token = uuid.uuid4().hex
+        while True:
+            value = cache.get(result_key, _MISSING)
+            if value is not _MISSING:
+                return value, None
+            if cache.add(lock_key, token, LOCK_TTL):
+                # the previous holder may have published just before releasing
+                value = cache.get(result_key, _MISSING)
+                if value is not _MISSING:
+                    self._shared_release(lock_key, token)
+                    return value, None
+                return _MISSING, token
+            if time.monotonic() >= deadline:
+                return _MISSING, None
+            time.sleep(POLL_INTERVAL)
+
+    async def _ashared_wait(self, key, deadline):
+        lock_key, result_key = self._cache_keys(key)
+        token = uuid.uuid4().hex
+        while True:
+            value = await cache.aget(result_key, _MISSING)
+            if value is not _MISSING:
+                return value, None
+            if await cache.aadd(lock_key, token, LOCK_TTL):
+                value = await cache.aget(result_key, _MISSING)
+                if value is not _MISSING:
+                    await self._ashared_release(lock_key, token)
+                    return value, None
+                return _MISSING, token
+            if time.monotonic() >= deadline:
+                return _MISSING, None
+            await asyncio.sleep(POLL_INTERVAL)
+
+    @staticmethod
+    def _shared_release(lock_key, token):
+        # only delete our own lock: after LOCK_TTL another worker may hold it
+        # (the cache API has no compare-and-delete; the window is one round trip)
+        if token is not None and cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+    @staticmethod
+    async def _ashared_release(lock_key, token):
+        if token is not None and await cache.aget(lock_key) == token:
+            await cache.adelete(lock_key)
+
+    def _shared_publish(self, key, token, value, ok: bool):
+        lock_key, result_key = self._cache_keys(key)
+        if ok:
+            cache.set(result_key, value, RESULT_TTL)
+        self._shared_release(lock_key, token)
+
+    async def _ashared_publish(self, key, token, value, ok: bool):
+        lock_key, result_key = self._cache_keys(key)
+        if ok:
+            await cache.aset(result_key, value, RESULT_TTL)
+        await self._ashared_release(lock_key, token)
+
+    def _compute(self, key, fn):
+        """
+        Leader path: run fn (or take another worker's result).
+        Returns (value, shared_hit).
+        """
+        if not SHARED:
+            return fn(), False
+        value, token = self._shared_wait(key, time.monotonic() + LOCK_TTL)
+        if value is not _MISSING:
+            return value, True
+        ok = False
+        try:
+            value = fn()
+            ok = True
+            return value, False
+        finally:
+            self._shared_publish(key, token, value if ok else None, ok)
+
+    async def _acompute(self, key, coro_fn):
+        if not SHARED:
+            return await coro_fn(), False
+        value, token = await self._ashared_wait(key, time.monotonic() + LOCK_TTL)
+        if value is not _MISSING:
+            return value, True
+        ok = False
+        try:
+            value = await coro_fn()
+            ok = True
+            return value, False
+        finally:
+            await self._ashared_publish(key, token, value if ok else None, ok)
+
+    async def _alead(self, key, coro_fn):
+        value, shared = await self._acompute(key, coro_fn)
+        if shared:
+            self.shared_hits += 1
+        return value, shared
+
+    # ---- public API ----
+    def do(self, key: str, fn, timeout: float | None = None):
+        """
+        Run fn() once per key among concurrent callers.
+        Returns (value, coalesced) where coalesced is True when the value
+        was computed by another request.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                raise TimeoutError(f"timed out waiting for in-flight {self.name} request")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result, shared = self._compute(key, fn)
+            if shared:
+                self.shared_hits += 1
+            return call.result, shared
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: str, coro_fn, timeout: float | None = None):
+        """
+        Async variant of do(): coro_fn is an async callable. Callers on the
+        same event loop share one task. The task belongs to none of them, so
+        a cancelled caller (e.g. a disconnected client), leader included,
+        does not cancel it for the others.
+        """
+        loop = asyncio.get_running_loop()
+        slot = (loop, key)
+        with self._lock:
+            task = self._futures.get(slot)
+            leader = task is None
+            if leader:
+                task = self._futures[slot] = loop.create_task(self._alead(key, coro_fn))
+                task.add_done_callback(lambda t: self._task_done(slot, t))
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            value, _ = await asyncio.wait_for(asyncio.shield(task), timeout)
+            return value, True
+        return await asyncio.shield(task)
+
+    def _task_done(self, slot, task):
+        with self._lock:
+            if self._futures.get(slot) is task:
+                del self._futures[slot]
+        if not task.cancelled():
+            # mark retrieved so a result nobody awaited doesn't log a warning
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls) + len(self._futures),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "shared_hits": self.shared_hits,
+        }
+
+
+rag_flight = SingleFlight("rag")
+prediction_flight = SingleFlight("predict-quality")
+
+
+def singleflight_stats() -> dict:
+    return {f.name: f.stats() for f in (rag_flight, prediction_flight)}
@@ -1,7 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RawMaterialViewSet, ProductionBatchViewSet, QCReportViewSet, login_view, logout_view, dashboard_view, create_raw_material_view, create_production_batch_view, create_qc_report_view, predict_quality_view, batches_page_view,run_predictions_for_completed_batches, production_batches_list_view, qc_reports_list_view, predicted_to_pass_list_view 
-from .views_api import dashboard_summary_api, qc_reports_predicted_pass_api, current_user_api, rag_query_api, detect_anomaly_api
+from .views import RawMaterialViewSet, ProductionBatchViewSet, QCReportViewSet, login_view, logout_view, dashboard_view, create_raw_material_view, create_production_batch_view, create_qc_report_view, predict_quality_view, predict_quality_batch_view, prediction_run_status_view, batches_page_view,run_predictions_for_completed_batches, production_batches_list_view, qc_reports_list_view, predicted_to_pass_list_view 
+from .views_api import dashboard_summary_api, qc_reports_predicted_pass_api, current_user_api, rag_query_api, rag_query_batch_api, rag_query_stream_api, rag_stats_api, detect_anomaly_api
+from .views_async import rag_query_async_api, rag_query_stream_async_api
 # from . import views
 
 router = DefaultRouter()
@@ -12,6 +13,8 @@ router.register(r"qc/report", QCReportViewSet, basename="qc-report")
 urlpatterns = [
     path("api/", include(router.urls)),
     path("api/ml/predict-quality/", predict_quality_view, name="predict_quality"),
+    path("api/ml/predict-quality/batch/", predict_quality_batch_view, name="predict_quality_batch"),
+    path("api/ml/predictions/run/", prediction_run_status_view, name="prediction_run_status"),
     path("login/", login_view, name="login"),
     path("logout/", logout_view, name="logout"),
     path("", dashboard_view, name="dashboard"),
@@ -33,5 +36,11 @@ urlpatterns = [
     path("api/qc-reports/predicted-pass/", qc_reports_predicted_pass_api, name="qc_reports_predicted_pass_api"),
     path("api/me/", current_user_api, name="current_user_api"),
     path("api/rag/query/", rag_query_api, name="rag_query_api"),
+    path("api/rag/query/stream/", rag_query_stream_api, name="rag_query_stream_api"),
+    path("api/rag/query/batch/", rag_query_batch_api, name="rag_query_batch_api"),
+    path("api/rag/stats/", rag_stats_api, name="rag_stats_api"),
+    # async (ASGI) variants of the LLM-bound endpoints
+    path("api/rag/aquery/", rag_query_async_api, name="rag_query_async_api"),
+    path("api/rag/aquery/stream/", rag_query_stream_async_api, name="rag_query_stream_async_api"),
     path("api/ml/detect-anomaly/", detect_anomaly_api, name="detect_anomaly_api"),
 ]
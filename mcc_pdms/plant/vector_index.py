@@ -0,0 +1,377 @@
+# plant/vector_index.py
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from ragapp import embeddings as chunk_embeddings
+from ragapp.models import DocumentChunk
+from ragapp.vectors import decode_matrix
+
+
+REFRESH_INTERVAL = getattr(settings, "RAG_INDEX_REFRESH_SECONDS", 5.0)
+LOAD_CHUNK_SIZE = 2000
+
+FILTER_KEYS = ("doc_types", "document_ids", "created_after", "created_before")
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    if hasattr(value, "timestamp"):
+        return value.timestamp()
+    return float(value)
+
+
+def _empty_result():
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+
+def _top_k(ids, scores, k: int):
+    k = min(k, len(scores))
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return ids[top], scores[top]
+
+
+class _Partition:
+    """
+    The rows of one doc_type: embeddings in a contiguous float32 matrix with
+    chunk ids, document ids and document created_at (epoch seconds) in
+    parallel arrays. Sort orders over the document columns are built on the
+    first filtered query after a change, so document-id and date filters
+    resolve to row positions by binary search instead of a scan.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.size = 0
+        self._matrix = np.empty((0, dim), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._doc_ids = np.empty(0, dtype=np.int64)
+        self._created = np.empty(0, dtype=np.float64)
+        self._orders = {}       # column -> (size, order, sorted keys)
+
+    def snapshot(self):
+        return self._matrix[: self.size], self._ids[: self.size]
+
+    def _reserve(self, extra: int):
+        needed = self.size + extra
+        capacity = self._ids.shape[0]
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+        matrix = np.empty((capacity, self.dim), dtype=np.float32)
+        ids = np.empty(capacity, dtype=np.int64)
+        doc_ids = np.empty(capacity, dtype=np.int64)
+        created = np.empty(capacity, dtype=np.float64)
+        if self.size:
+            matrix[: self.size] = self._matrix[: self.size]
+            ids[: self.size] = self._ids[: self.size]
+            doc_ids[: self.size] = self._doc_ids[: self.size]
+            created[: self.size] = self._created[: self.size]
+        # readers holding the old views keep a consistent copy
+        self._matrix, self._ids = matrix, ids
+        self._doc_ids, self._created = doc_ids, created
+
+    def add(self, ids, vectors, doc_ids, created):
+        self._reserve(len(ids))
+        end = self.size + len(ids)
+        self._matrix[self.size:end] = vectors
+        self._ids[self.size:end] = ids
+        self._doc_ids[self.size:end] = doc_ids
+        self._created[self.size:end] = created
+        self.size = end
+
+    def _sorted(self, column: str):
+        size = self.size
+        cached = self._orders.get(column)
+        if cached is not None and cached[0] == size:
+            return cached[1], cached[2]
+        values = (self._doc_ids if column == "doc_ids" else self._created)[:size]
+        order = np.argsort(values, kind="stable")
+        keys = values[order]
+        self._orders[column] = (size, order, keys)
+        return order, keys
+
+    def rows(self, document_ids=None, created_after=None, created_before=None):
+        """
+        Row positions matching the document filters, or None for all rows.
+        """
+        selected = None
+        if document_ids is not None:
+            order, keys = self._sorted("doc_ids")
+            wanted = np.unique(np.asarray(document_ids, dtype=np.int64))
+            lo = np.searchsorted(keys, wanted, side="left")
+            hi = np.searchsorted(keys, wanted, side="right")
+            selected = np.concatenate(
+                [order[a:b] for a, b in zip(lo, hi) if b > a] or [np.empty(0, dtype=np.int64)]
+            )
+        if created_after is not None or created_before is not None:
+            order, keys = self._sorted("created")
+            lo = 0 if created_after is None else np.searchsorted(keys, created_after, side="left")
+            hi = len(keys) if created_before is None else np.searchsorted(keys, created_before, side="right")
+            in_range = order[lo:hi]
+            selected = in_range if selected is None else np.intersect1d(selected, in_range)
+        return selected
+
+    def search_many(self, queries, k: int, rows=None):
+        matrix, ids = self.snapshot()
+        if rows is not None:
+            rows = np.sort(rows)
+            matrix, ids = matrix[rows], ids[rows]
+        if not len(ids):
+            return [_empty_result() for _ in range(len(queries))]
+        scores = matrix @ queries.T         # (rows, queries)
+        return [_top_k(ids, scores[:, j], k) for j in range(scores.shape[1])]
+
+
+class VectorIndex:
+    """
+    Process-level brute-force index over the DocumentChunk embeddings of
+    one embedding model.
+
+    Embeddings are kept L2-normalised in contiguous float32 matrices with
+    the chunk ids in parallel int64 arrays, so a query is a matrix-vector
+    product. The rows are partitioned by Document.doc_type, and each
+    partition can narrow itself to a document-id set or a created_at range
+    without scanning, so a filtered query only multiplies the rows it can
+    return. Buffers grow by doubling, so incremental refreshes only append
+    the new rows.
+    """
+
+    def __init__(self, model_name: str = chunk_embeddings.MODEL_NAME):
+        self.model_name = model_name
+        self.dim = None
+        self.size = 0
+        self.skipped = 0        # rows whose embedding dim does not match
+        self.max_id = 0
+        self.version = 0        # bumped whenever the indexed corpus changes
+        self._partitions = {}   # doc_type -> _Partition
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._last_refresh = None
+
+    def __len__(self):
+        return self.size
+
+    # ---- storage ----
+    def snapshot(self):
+        """
+        (matrix, ids) over all partitions; copies when there is more than one.
+        """
+        with self._lock:
+            parts = [p.snapshot() for p in self._partitions.values() if p.size]
+        if not parts:
+            return np.empty((0, self.dim or 0), dtype=np.float32), np.empty(0, dtype=np.int64)
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate([m for m, _ in parts]), np.concatenate([i for _, i in parts])
+
+    def partition_sizes(self) -> dict:
+        with self._lock:
+            return {doc_type: p.size for doc_type, p in self._partitions.items()}
+
+    def add(self, ids, vectors, doc_types=None, doc_ids=None, created=None):
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(ids):
+            return
+        vectors = normalize_rows(vectors)
+        n = len(ids)
+        doc_types = np.asarray([""] * n if doc_types is None else doc_types, dtype=object)
+        doc_ids = np.zeros(n, dtype=np.int64) if doc_ids is None else np.asarray(doc_ids, dtype=np.int64)
+        created = (
+            np.zeros(n, dtype=np.float64)
+            if created is None
+            else np.asarray([_timestamp(c) or 0.0 for c in created], dtype=np.float64)
+        )
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            for doc_type in dict.fromkeys(doc_types):
+                mask = doc_types == doc_type
+                partition = self._partitions.get(doc_type)
+                if partition is None:
+                    partition = self._partitions[doc_type] = _Partition(self.dim)
+                partition.add(ids[mask], vectors[mask], doc_ids[mask], created[mask])
+            self.size += n
+            self.max_id = max(self.max_id, int(ids.max()))
+            self.version += 1
+
+    def clear(self):
+        with self._lock:
+            self.dim = None
+            self.size = 0
+            self.skipped = 0
+            self.max_id = 0
+            self._partitions = {}
+            self.version += 1
+
+    # ---- query ----
+    def _plan(self, filters):
+        """
+        [(partition, row positions or None)] to score for `filters`.
+        """
+        filters = filters or {}
+        with self._lock:
+            partitions = dict(self._partitions)
+        doc_types = filters.get("doc_types")
+        if doc_types:
+            partitions = {t: partitions[t] for t in doc_types if t in partitions}
+        document_ids = filters.get("document_ids")
+        after = _timestamp(filters.get("created_after"))
+        before = _timestamp(filters.get("created_before"))
+        plan = []
+        for partition in partitions.values():
+            rows = partition.rows(document_ids, after, before)
+            if partition.size and (rows is None or len(rows)):
+                plan.append((partition, rows))
+        return plan
+
+    def count(self, filters=None) -> int:
+        """
+        Number of rows a query with `filters` would score.
+        """
+        return sum(p.size if rows is None else len(rows) for p, rows in self._plan(filters))
+
+    def allowed_ids(self, filters) -> np.ndarray:
+        """
+        Sorted chunk ids matching `filters`.
+        """
+        parts = [
+            p.snapshot()[1] if rows is None else p.snapshot()[1][rows]
+            for p, rows in self._plan(filters)
+        ]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    def search(self, query, k: int = 5, filters=None):
+        """
+        Return (chunk_ids, scores) of the k most similar chunks, best first.
+
+        `filters` may hold "doc_types" (list of Document.doc_type),
+        "document_ids" (list of Document ids) and "created_after" /
+        "created_before" (datetimes, inclusive, on Document.created_at).
+        Only the partitions and rows that match are scored.
+        """
+        return self.search_many(np.asarray(query).reshape(1, -1), k, filters=filters)[0]
+
+    def search_many(self, queries, k: int = 5, filters=None):
+        """
+        search() for a (n_queries, dim) array: one matrix-matrix product per
+        partition instead of one matrix-vector product per query. Returns a
+        list of (chunk_ids, scores), one per query.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.dim is None or k <= 0 or not len(queries):
+            return [_empty_result() for _ in range(len(queries))]
+        queries = normalize_rows(queries)
+        if queries.shape[1] != self.dim:
+            raise ValueError(
+                f"Query dim {queries.shape[1]} does not match index dim {self.dim}"
+            )
+
+        per_partition = [p.search_many(queries, k, rows) for p, rows in self._plan(filters)]
+        if not per_partition:
+            return [_empty_result() for _ in range(len(queries))]
+        if len(per_partition) == 1:
+            return per_partition[0]
+        merged = []
+        for results in zip(*per_partition):
+            ids = np.concatenate([r[0] for r in results])
+            scores = np.concatenate([r[1] for r in results])
+            merged.append(_top_k(ids, scores, k))
+        return merged
+
+    # ---- DB sync ----
+    def _queryset(self):
+        return DocumentChunk.objects.filter(embedding_model=self.model_name)
+
+    def _load_rows(self, qs):
+        """
+        Stream (id, embedding, document metadata) rows into the index,
+        decoding each batch of float32 blobs with one frombuffer call. Rows
+        whose dimension differs from the index dimension are skipped.
+        """
+        ids, bufs, doc_types, doc_ids, created = [], [], [], [], []
+        rows = qs.values_list(
+            "id",
+            "embedding_dim",
+            "embedding",
+            "document_id",
+            "document__doc_type",
+            "document__created_at",
+        ).iterator(chunk_size=LOAD_CHUNK_SIZE)
+        for chunk_id, dim, buf, doc_id, doc_type, doc_created in rows:
+            if self.dim is None:
+                self.dim = dim
+            if dim != self.dim:
+                self.skipped += 1
+                continue
+            ids.append(chunk_id)
+            bufs.append(buf)
+            doc_types.append(doc_type)
+            doc_ids.append(doc_id)
+            created.append(doc_created)
+            if len(ids) >= LOAD_CHUNK_SIZE:
+                self.add(ids, decode_matrix(bufs, self.dim), doc_types, doc_ids, created)
+                ids, bufs, doc_types, doc_ids, created = [], [], [], [], []
+        if ids:
+            self.add(ids, decode_matrix(bufs, self.dim), doc_types, doc_ids, created)
+
+    def refresh(self, force: bool = False):
+        """
+        Pick up chunks inserted since the last refresh. If rows were deleted
+        (table count no longer matches), rebuild from scratch.
+        """
+        now = time.monotonic()
+        if (
+            not force
+            and self._last_refresh is not None
+            and now - self._last_refresh < REFRESH_INTERVAL
+        ):
+            return
+
+        with self._refresh_lock:
+            self._load_rows(self._queryset().filter(id__gt=self.max_id).order_by("id"))
+            if self._queryset().count() != self.size + self.skipped:
+                self.rebuild()
+            self._last_refresh = now
+
+    def rebuild(self):
+        fresh = VectorIndex(self.model_name)
+        fresh._load_rows(fresh._queryset().order_by("id"))
+        with self._lock:
+            self.dim = fresh.dim
+            self.size = fresh.size
+            self.skipped = fresh.skipped
+            self.max_id = fresh.max_id
+            self._partitions = fresh._partitions
+            self.version += 1
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index(refresh: bool = True) -> VectorIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = VectorIndex()
+    if refresh:
+        _index.refresh()
+    return _index
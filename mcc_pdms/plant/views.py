@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import viewsets
 from .models import RawMaterial, ProductionBatch, QCReport
 from .serializers import (
@@ -25,8 +27,11 @@ from rest_framework.response import Response
 from rest_framework import status
 
 #ML 
-from .ml_service import predict_quality
-from .serializers import QualityPredictionRequestSerializer
+from .bulk_predictions import job_status, start_background_run
+from .ml_service import predict_quality, predict_quality_many, quality_model
+from .model_registry import registry_stats
+from .serializers import QualityPredictionBatchRequestSerializer, QualityPredictionRequestSerializer
+from .singleflight import flight_key, prediction_flight
 from .models import ProductionBatch, QCReport
 
 
@@ -204,42 +209,31 @@ def batches_page_view(request):
 @login_required
 @user_passes_test(is_admin)
 def run_predictions_for_completed_batches(request):
-    completed_batches = ProductionBatch.objects.filter(status="COMPLETED")
-
-    updated = 0
-    for batch in completed_batches:
-        params = batch.process_parameters_json or {}
-        try:
-            predicted_pass, probability = predict_quality(params)
-        except Exception:
-            # skip batches that don't have valid params
-            continue
-
-        qc = (
-            QCReport.objects
-            .filter(batch=batch)
-            .order_by("-created_at")
-            .first()
-        )
-        if qc is None:
-            qc = QCReport(batch=batch)
-
-        qc.predicted_pass = predicted_pass
-        qc.predicted_probability = probability
-        qc.save()
-        updated += 1
-
-    if updated == 0:
-        messages.warning(
+    # chunked bulk run in a background thread (plant/bulk_predictions.py);
+    # `manage.py run_predictions` does the same from cron
+    only_stale = request.GET.get("only_stale") == "1"
+    if start_background_run(only_stale=only_stale):
+        messages.success(
             request,
-            "No predictions were generated. Check that completed batches have valid process parameters."
+            "Prediction run started in the background for completed batches. "
+            "Results appear as it progresses.",
         )
     else:
-        messages.success(request, f"Predictions updated for {updated} completed batch(es).")
+        messages.warning(request, "A prediction run is already in progress.")
 
     return redirect("dashboard")
 
 
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def prediction_run_status_view(request):
+    """
+    GET /api/ml/predictions/run/ - state and progress of the background run,
+    plus the model versions loaded in this process.
+    """
+    return Response({**job_status(), "models": registry_stats()})
+
+
 @login_required
 def production_batches_list_view(request):
     batches = (
@@ -283,21 +277,30 @@ def predict_quality_view(request):
     else:
         params = data.get("process_parameters") or {}
 
+    def run():
+        loaded = quality_model()
+        predicted_pass, probability = predict_quality(params, loaded)
+        # if batch is given, optionally update or create QCReport with prediction
+        if batch:
+            QCReport.objects.create(
+                batch=batch,
+                predicted_pass=predicted_pass,
+                predicted_probability=probability,
+                model_version=loaded.version,
+                predicted_at=timezone.now(),
+            )
+        return predicted_pass, probability
+
+    # identical concurrent requests (same batch or same parameters) share
+    # one model call and one QCReport
+    key = flight_key("batch", batch.id) if batch else flight_key("params", params)
     try:
-        predicted_pass, probability = predict_quality(params)
+        (predicted_pass, probability), _ = prediction_flight.do(key, run)
     except ValueError as e:
         return Response(
             {"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST
         )
 
-    # if batch is given, optionally update or create QCReport with prediction
-    if batch:
-        QCReport.objects.create(
-            batch=batch,
-            predicted_pass=predicted_pass,
-            predicted_probability=probability,
-        )
-
     return Response(
         {
             "predicted_pass": predicted_pass,
@@ -306,6 +309,83 @@ def predict_quality_view(request):
     )
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def predict_quality_batch_view(request):
+    """
+    POST /api/ml/predict-quality/batch/
+    Body: { "items": [ { "batch_id": 1 }, { "process_parameters": { ... } }, ... ] }
+    All valid items are scored with one model call. Each result carries
+    either the prediction or that item's error; a QCReport is created for
+    every scored batch_id item, as in /api/ml/predict-quality/.
+    """
+    serializer = QualityPredictionBatchRequestSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    items = serializer.validated_data["items"]
+    max_items = getattr(settings, "ML_PREDICT_BATCH_MAX_ITEMS", 1000)
+    if len(items) > max_items:
+        return Response(
+            {"detail": f"At most {max_items} items per request."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    results = [{"index": i} for i in range(len(items))]
+    valid = []
+    for result, item in zip(results, items):
+        item_serializer = QualityPredictionRequestSerializer(data=item)
+        if item_serializer.is_valid():
+            valid.append((result, item_serializer.validated_data))
+        else:
+            result["error"] = item_serializer.errors
+
+    batch_ids = [data["batch_id"] for _, data in valid if data.get("batch_id")]
+    batches = ProductionBatch.objects.in_bulk(batch_ids)
+
+    to_score = []
+    for result, data in valid:
+        if data.get("batch_id"):
+            batch = batches.get(data["batch_id"])
+            result["batch_id"] = data["batch_id"]
+            if batch is None:
+                result["error"] = "Batch not found"
+                continue
+            to_score.append((result, batch, batch.process_parameters_json or {}))
+        else:
+            to_score.append((result, None, data["process_parameters"]))
+
+    reports = []
+    loaded = quality_model()
+    predictions = predict_quality_many([params for _, _, params in to_score], loaded)
+    now = timezone.now()
+    for (result, batch, _), prediction in zip(to_score, predictions):
+        if isinstance(prediction, ValueError):
+            result["error"] = str(prediction)
+            continue
+        predicted_pass, probability = prediction
+        result["predicted_pass"] = predicted_pass
+        result["predicted_probability"] = probability
+        if batch is not None:
+            reports.append(
+                QCReport(
+                    batch=batch,
+                    predicted_pass=predicted_pass,
+                    predicted_probability=probability,
+                    model_version=loaded.version,
+                    predicted_at=now,
+                )
+            )
+    QCReport.objects.bulk_create(reports)
+
+    return Response(
+        {
+            "count": len(results),
+            "scored": sum("predicted_pass" in r for r in results),
+            "errors": sum("error" in r for r in results),
+            "results": results,
+        }
+    )
+
+
 @login_required
 def predicted_to_pass_list_view(request):
     reports = (
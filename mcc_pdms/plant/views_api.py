@@ -1,4 +1,11 @@
+import json
+from datetime import datetime, time
+
+from django.conf import settings
 from django.db import models
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from rest_framework.decorators import api_view, permission_classes,authentication_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.authentication import SessionAuthentication
@@ -6,12 +13,13 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.response import Response
 from .models import ProductionBatch, QCReport
 from rest_framework import status
-from .rag_service import retrieve_top_k, generate_answer
-from .anomaly_service import detect_anomaly, extract_features
-from .rag_service import answer_with_rag
-from ragapp.models import DocumentChunk
-from .ml_anomaly import detect_anomaly_for_batch
-from .ml_service import predict_anomaly
+# RAG / ML services are imported inside the views that use them, so that
+# importing plant.urls (every manage.py command, every worker boot) does
+# not load numpy, sklearn, joblib, langchain or torch.
+from .admission import AdmissionRejected, admission_stats, llm_admission, priority_for, request_priority
+from .llm_backends import get_llm, llm_metrics
+from .singleflight import singleflight_stats
+from ragapp.models import Document, DocumentChunk
 from django.db.models import Count,Sum
 from django.db.models.functions import TruncDate
 
@@ -235,38 +243,247 @@ def current_user_api(request):
     })
 
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def rag_query_api(request):
-    question = request.data.get("question", "").strip()
-    batch_id = request.data.get("batch_id")
+def _rag_batch_context(batch_id):
+    if not batch_id:
+        return None
+    try:
+        batch = ProductionBatch.objects.get(id=batch_id)
+    except ProductionBatch.DoesNotExist:
+        return None
+    qcs = QCReport.objects.filter(batch=batch)
+    return (
+        f"Batch {batch.batch_no} status={batch.status}, "
+        f"raw={batch.raw_material}, qc_count={qcs.count()}"
+    )
+
+
+def _rag_search_knobs(data):
+    """
+    Optional ANN recall/latency knobs (ignored by the exact backend).
+    Raises ValueError if they are not integers.
+    """
+    ef = int(data["ef"]) if data.get("ef") else None
+    nprobe = int(data["nprobe"]) if data.get("nprobe") else None
+    return ef, nprobe
+
+
+def _as_list(value):
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    return list(value)
+
+
+def _parse_bound(value, end_of_day: bool):
+    dt = parse_datetime(value)
+    if dt is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"invalid date {value!r}")
+        dt = datetime.combine(day, time.max if end_of_day else time.min)
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
 
-    if not question:
-        return Response({"error": "question is required"}, status=400)
 
-    batch_context = None
-    if batch_id:
+def _rag_filters(data):
+    """
+    Optional retrieval filters: doc_type (one or a list of Document.doc_type),
+    document_ids, created_after / created_before (ISO date or datetime,
+    inclusive; a bare created_before date covers that whole day).
+    Returns a filters dict or None. Raises ValueError with a message.
+    """
+    filters = {}
+    if data.get("doc_type"):
+        doc_types = [t.upper() for t in _as_list(data["doc_type"])]
+        valid = {code for code, _ in Document.DOC_TYPES}
+        unknown = sorted(set(doc_types) - valid)
+        if unknown:
+            raise ValueError(f"unknown doc_type {', '.join(unknown)}; expected one of {', '.join(sorted(valid))}")
+        filters["doc_types"] = doc_types
+    if data.get("document_ids"):
         try:
-            batch = ProductionBatch.objects.get(id=batch_id)
-            qcs = QCReport.objects.filter(batch=batch)
-            batch_context = (
-                f"Batch {batch.batch_no} status={batch.status}, "
-                f"raw={batch.raw_material}, qc_count={qcs.count()}"
-            )
-        except ProductionBatch.DoesNotExist:
-            pass
-
-    answer, top_chunks = answer_with_rag(question, batch_context)
-    sources = [
+            filters["document_ids"] = [int(i) for i in _as_list(data["document_ids"])]
+        except (TypeError, ValueError):
+            raise ValueError("document_ids must be a list of integers")
+    if data.get("created_after"):
+        filters["created_after"] = _parse_bound(str(data["created_after"]), end_of_day=False)
+    if data.get("created_before"):
+        filters["created_before"] = _parse_bound(str(data["created_before"]), end_of_day=True)
+    return filters or None
+
+
+def _rag_sources(chunks):
+    return [
         {
             "document_id": c.document_id,
             "title": c.document.title,
             "doc_type": c.document.doc_type,
             "chunk_index": c.chunk_index,
         }
-        for c in top_chunks
+        for c in chunks
     ]
-    return Response({"question": question, "answer": answer, "sources": sources})
+
+
+def _overloaded(exc: AdmissionRejected):
+    response = Response({"error": str(exc), "reason": exc.reason}, status=429)
+    response["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def rag_query_api(request):
+    question = request.data.get("question", "").strip()
+    batch_id = request.data.get("batch_id")
+
+    if not question:
+        return Response({"error": "question is required"}, status=400)
+
+    try:
+        ef, nprobe = _rag_search_knobs(request.data)
+    except (TypeError, ValueError):
+        return Response({"error": "ef and nprobe must be integers"}, status=400)
+    try:
+        filters = _rag_filters(request.data)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+
+    batch_context = _rag_batch_context(batch_id)
+    from .rag_service import answer_with_rag
+
+    try:
+        with request_priority(priority_for(request.user, filters, question)):
+            answer, top_chunks, meta = answer_with_rag(question, batch_context, ef=ef, nprobe=nprobe, filters=filters)
+    except AdmissionRejected as exc:
+        return _overloaded(exc)
+    return Response({
+        "question": question,
+        "answer": answer,
+        "sources": _rag_sources(top_chunks),
+        "cached": meta["cached"],
+        "coalesced": meta["coalesced"],
+        "tokens_saved": meta.get("tokens_saved"),
+    })
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def rag_query_batch_api(request):
+    """
+    POST /api/rag/query/batch/
+    {"questions": [...], "batch_id": ..., plus the filters and ANN knobs of
+    /api/rag/query/}. Answers all questions in one round-trip and returns
+    per-question results and timings.
+    """
+    questions = request.data.get("questions")
+    if not isinstance(questions, list) or not questions:
+        return Response({"error": "questions must be a non-empty list"}, status=400)
+    questions = [str(q).strip() for q in questions]
+    if not all(questions):
+        return Response({"error": "questions must not be empty"}, status=400)
+    max_questions = getattr(settings, "RAG_BATCH_MAX_QUESTIONS", 50)
+    if len(questions) > max_questions:
+        return Response({"error": f"at most {max_questions} questions per request"}, status=400)
+
+    try:
+        ef, nprobe = _rag_search_knobs(request.data)
+    except (TypeError, ValueError):
+        return Response({"error": "ef and nprobe must be integers"}, status=400)
+    try:
+        filters = _rag_filters(request.data)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+
+    batch_context = _rag_batch_context(request.data.get("batch_id"))
+    from .rag_service import answer_many
+
+    try:
+        with request_priority(priority_for(request.user, filters, " ".join(questions))):
+            results, timings = answer_many(questions, batch_context, ef=ef, nprobe=nprobe, filters=filters)
+    except AdmissionRejected as exc:
+        return _overloaded(exc)
+    return Response({
+        "results": [
+            {
+                "question": r["question"],
+                "answer": r["answer"],
+                "sources": _rag_sources(r["chunks"]),
+                "cached": r.get("cached", False),
+                "coalesced": r.get("coalesced", False),
+                "tokens_saved": r.get("tokens_saved"),
+                "answer_ms": r["answer_ms"],
+                "error": r.get("error"),
+            }
+            for r in results
+        ],
+        "timings": timings,
+    })
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def rag_query_stream_api(request):
+    """
+    POST /api/rag/query/stream/
+    Same body as /api/rag/query/. Responds with server-sent events:
+    `sources` right after retrieval, one `token` per answer fragment,
+    then `done` (or `error`).
+    """
+    question = request.data.get("question", "").strip()
+    if not question:
+        return Response({"error": "question is required"}, status=400)
+    try:
+        ef, nprobe = _rag_search_knobs(request.data)
+    except (TypeError, ValueError):
+        return Response({"error": "ef and nprobe must be integers"}, status=400)
+    try:
+        filters = _rag_filters(request.data)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
+    priority = priority_for(request.user, filters, question)
+    try:
+        # refuse before the 200 is committed; a later rejection is in-band
+        llm_admission.check(priority)
+    except AdmissionRejected as exc:
+        return _overloaded(exc)
+    batch_context = _rag_batch_context(request.data.get("batch_id"))
+    from .rag_service import stream_rag_events
+
+    def events():
+        try:
+            with request_priority(priority):
+                for event, payload in stream_rag_events(question, batch_context, ef=ef, nprobe=nprobe, filters=filters):
+                    if event == "sources":
+                        payload = _rag_sources(payload)
+                    yield _sse(event, payload)
+        except Exception as exc:  # headers are already sent; report in-band
+            yield _sse("error", {"error": str(exc)})
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # don't let nginx buffer the stream
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def rag_stats_api(request):
+    """
+    Hit/miss counters of the RAG caches (used to size them), LLM call
+    latency/token metrics and LLM admission queue depth/waits/rejections.
+    """
+    from .rag_cache import cache_stats
+
+    return Response({
+        "cache": cache_stats(),
+        "llm": {"backend": get_llm().name, **llm_metrics.stats()},
+        "singleflight": singleflight_stats(),
+        "admission": admission_stats(),
+    })
 
 
 @api_view(["POST"])
@@ -311,12 +528,16 @@ def detect_anomaly_api(request):
         )
 
     # 2) Call ML model
-    score, is_anomaly = predict_anomaly(moisture, particle_size)
+    from .ml_service import anomaly_model, predict_anomaly
+
+    loaded = anomaly_model()
+    score, is_anomaly = predict_anomaly(moisture, particle_size, loaded)
 
     # 3) Persist to DB
     batch.anomaly_score = score
     batch.is_anomaly = is_anomaly
-    batch.save(update_fields=["anomaly_score", "is_anomaly"])
+    batch.anomaly_model_version = loaded.version
+    batch.save(update_fields=["anomaly_score", "is_anomaly", "anomaly_model_version"])
 
     # 4) Return response
     return Response(
@@ -325,5 +546,6 @@ def detect_anomaly_api(request):
             "batch_no": batch.batch_no,
             "score": score,
             "is_anomaly": is_anomaly,
+            "model_version": loaded.version,
         }
     )
@@ -0,0 +1,178 @@
+# plant/views_async.py
+"""
+Native async views for the LLM-bound RAG endpoints. Served by
+mcc_pdms/asgi.py, a single worker can hold many in-flight questions
+because waiting on the LLM no longer pins a thread.
+
+DRF function views are sync-only, so these are plain Django views that
+accept the same credentials as the DRF API (JWT bearer token or session
+with CSRF).
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .admission import AdmissionRejected, llm_admission, priority_for, request_priority
+from .models import ProductionBatch, QCReport
+from .views_api import _rag_filters, _rag_search_knobs, _rag_sources, _sse
+
+
+def _overloaded(exc: AdmissionRejected):
+    response = JsonResponse({"error": str(exc), "reason": exc.reason}, status=429)
+    response["Retry-After"] = str(exc.retry_after)
+    return response
+
+
+def _csrf_failed(request) -> bool:
+    # same check DRF's SessionAuthentication performs
+    check = CsrfViewMiddleware(lambda req: None)
+    check.process_request(request)
+    return check.process_view(request, None, (), {}) is not None
+
+
+def _jwt_user(request):
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+async def _authenticate(request):
+    """
+    Return the authenticated user or None (JWT first, then session).
+    """
+    user = await sync_to_async(_jwt_user)(request)
+    if user is not None:
+        return user
+    user = await request.auser()
+    if user.is_authenticated and not _csrf_failed(request):
+        return user
+    return None
+
+
+async def _parse_rag_request(request):
+    """
+    Return (params, error_response).
+    """
+    user = await _authenticate(request)
+    if user is None:
+        return None, JsonResponse(
+            {"detail": "Authentication credentials were not provided."}, status=401
+        )
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return None, JsonResponse({"error": "invalid JSON body"}, status=400)
+
+    question = str(data.get("question", "")).strip()
+    if not question:
+        return None, JsonResponse({"error": "question is required"}, status=400)
+    try:
+        ef, nprobe = _rag_search_knobs(data)
+    except (TypeError, ValueError):
+        return None, JsonResponse({"error": "ef and nprobe must be integers"}, status=400)
+    try:
+        filters = _rag_filters(data)
+    except ValueError as exc:
+        return None, JsonResponse({"error": str(exc)}, status=400)
+
+    return {
+        "question": question,
+        "batch_context": await _abatch_context(data.get("batch_id")),
+        "ef": ef,
+        "nprobe": nprobe,
+        "filters": filters,
+        # UserProfile is read through the sync ORM
+        "priority": await sync_to_async(priority_for)(user, filters, question),
+    }, None
+
+
+async def _abatch_context(batch_id):
+    if not batch_id:
+        return None
+    try:
+        batch = await ProductionBatch.objects.select_related("raw_material").aget(id=batch_id)
+    except (ProductionBatch.DoesNotExist, ValueError):
+        return None
+    qc_count = await QCReport.objects.filter(batch=batch).acount()
+    return (
+        f"Batch {batch.batch_no} status={batch.status}, "
+        f"raw={batch.raw_material}, qc_count={qc_count}"
+    )
+
+
+@csrf_exempt
+@require_POST
+async def rag_query_async_api(request):
+    """
+    POST /api/rag/aquery/ - async equivalent of /api/rag/query/.
+    """
+    params, error = await _parse_rag_request(request)
+    if error is not None:
+        return error
+    from .rag_service import aanswer_with_rag
+
+    try:
+        with request_priority(params["priority"]):
+            answer, top_chunks, meta = await aanswer_with_rag(
+                params["question"],
+                params["batch_context"],
+                ef=params["ef"],
+                nprobe=params["nprobe"],
+                filters=params["filters"],
+            )
+    except AdmissionRejected as exc:
+        return _overloaded(exc)
+    return JsonResponse({
+        "question": params["question"],
+        "answer": answer,
+        "sources": _rag_sources(top_chunks),
+        "cached": meta["cached"],
+        "coalesced": meta["coalesced"],
+        "tokens_saved": meta.get("tokens_saved"),
+    })
+
+
+@csrf_exempt
+@require_POST
+async def rag_query_stream_async_api(request):
+    """
+    POST /api/rag/aquery/stream/ - async equivalent of /api/rag/query/stream/.
+    """
+    params, error = await _parse_rag_request(request)
+    if error is not None:
+        return error
+    try:
+        # refuse before the 200 is committed; a later rejection is in-band
+        llm_admission.check(params["priority"])
+    except AdmissionRejected as exc:
+        return _overloaded(exc)
+    from .rag_service import astream_rag_events
+
+    async def events():
+        try:
+            with request_priority(params["priority"]):
+                async for event, payload in astream_rag_events(
+                    params["question"],
+                    params["batch_context"],
+                    ef=params["ef"],
+                    nprobe=params["nprobe"],
+                    filters=params["filters"],
+                ):
+                    if event == "sources":
+                        payload = _rag_sources(payload)
+                    yield _sse(event, payload)
+        except Exception as exc:  # headers are already sent; report in-band
+            yield _sse("error", {"error": str(exc)})
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
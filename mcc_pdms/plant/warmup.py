@@ -0,0 +1,103 @@
+# plant/warmup.py
+"""
+Optional preloading of the ML/LLM stack. The heavy libraries are imported
+lazily so manage.py commands and worker boots stay fast; a worker that is
+about to serve traffic can call warm_up() (mcc_pdms/wsgi.py and asgi.py do,
+driven by the WARMUP setting) to pay that cost before the first request.
+"""
+import logging
+import time
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def _embeddings():
+    from ragapp.embeddings import get_embedder
+
+    get_embedder()
+
+
+def _vector_index():
+    from .vector_index import get_vector_index
+
+    get_vector_index()
+
+
+def _ann_index():
+    # no-op unless RAG_RETRIEVAL_BACKEND == "ann"
+    from .ann_index import preload_ann_index
+
+    preload_ann_index()
+
+
+def _lexical_index():
+    if getattr(settings, "RAG_RETRIEVAL_MODE", "vector") == "hybrid":
+        from .lexical_index import get_lexical_index
+
+        get_lexical_index()
+
+
+def _llm():
+    from . import rag_service
+
+    rag_service._message_classes()
+    rag_service.get_llm()
+
+
+def _quality_model():
+    from .ml_service import load_model
+
+    load_model()
+
+
+def _anomaly_model():
+    from .anomaly_service import load_model
+
+    load_model()
+
+
+COMPONENTS = {
+    "embeddings": _embeddings,
+    "index": _vector_index,
+    "ann": _ann_index,
+    "lexical": _lexical_index,
+    "llm": _llm,
+    "quality": _quality_model,
+    "anomaly": _anomaly_model,
+}
+
+
+def warm_up(components=None) -> dict:
+    """
+    Preload the given components (names from COMPONENTS, or "all");
+    defaults to settings.WARMUP. Failures are logged, not raised, so a
+    missing model file never stops a worker from booting.
+    Returns {component: seconds or error string}.
+    """
+    if components is None:
+        components = getattr(settings, "WARMUP", ["ann"])
+    if isinstance(components, str):
+        components = [c.strip() for c in components.split(",") if c.strip()]
+    if "all" in components:
+        components = list(COMPONENTS)
+
+    timings = {}
+    for name in components:
+        loader = COMPONENTS.get(name)
+        if loader is None:
+            logger.warning("warm_up: unknown component %r", name)
+            continue
+        started = time.perf_counter()
+        try:
+            loader()
+        except Exception as exc:
+            logger.warning("warm_up: %s failed: %s", name, exc)
+            timings[name] = f"error: {exc}"
+            continue
+        timings[name] = round(time.perf_counter() - started, 3)
+    if timings:
+        logger.info("warm_up: %s", timings)
+    return timings
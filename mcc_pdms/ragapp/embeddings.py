@@ -1,12 +1,138 @@
 # mcc_pdms/ragapp/embeddings.py
+"""
+Sentence embeddings for RAG chunks and questions.
+
+RAG_EMBEDDING_BACKEND selects the runtime:
+  "torch" - sentence-transformers on PyTorch (reference, full precision)
+  "onnx"  - the same model exported to ONNX with int8 dynamic quantisation,
+            run by onnxruntime and the `tokenizers` library (no torch).
+            Create it with `manage.py export_onnx_embeddings`.
+
+Both produce L2-normalised, mean-pooled vectors of the same model, so they
+share MODEL_NAME and existing chunk embeddings stay searchable. Check the
+agreement with `manage.py check_embeddings`.
+"""
+import os
 from functools import lru_cache
-from sentence_transformers import SentenceTransformer
 
-@lru_cache(maxsize=1)
-def _get_model():
-    return SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+from django.conf import settings
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MAX_SEQ_LENGTH = 256        # all-MiniLM-L6-v2 was trained on 256 word pieces
+
+ONNX_MODEL_DIR = getattr(
+    settings, "RAG_ONNX_MODEL_DIR", os.path.join(settings.BASE_DIR, "ml_models", "minilm-onnx")
+)
+ONNX_MODEL_FILE = "model_int8.onnx"
+
+
+def _threads() -> int:
+    return getattr(settings, "RAG_EMBEDDING_THREADS", 0) or os.cpu_count() or 1
+
+
+class TorchEmbedder:
+    name = "torch"
+
+    def __init__(self):
+        # sentence_transformers pulls in torch; import it on first use only
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        torch.set_num_threads(_threads())
+        self.model = SentenceTransformer(MODEL_NAME, device="cpu")
+
+    def encode(self, texts, batch_size: int = 64):
+        return self.model.encode(
+            list(texts),
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+
+
+class OnnxEmbedder:
+    """
+    int8 ONNX export of MODEL_NAME. Texts are sorted by length before
+    batching so each batch is only padded to its own longest text.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"{model_path} not found; run `manage.py export_onnx_embeddings` first"
+            )
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = _threads()
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+    def _encode_batch(self, texts):
+        import numpy as np
+
+        encodings = self.tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feed["token_type_ids"] = np.zeros_like(ids)
+        hidden = self.session.run(None, feed)[0]              # (batch, seq, dim)
+
+        # mean pooling over real tokens, then L2 normalisation
+        weights = mask[:, :, None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+
+    def encode(self, texts, batch_size: int = 64):
+        import numpy as np
+
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = [None] * len(texts)
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            for i, vec in zip(batch, self._encode_batch([texts[i] for i in batch])):
+                out[i] = vec
+        return np.stack(out)
+
+
+BACKENDS = {"torch": TorchEmbedder, "onnx": OnnxEmbedder}
+
+
+@lru_cache(maxsize=None)
+def _load(backend: str):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown RAG_EMBEDDING_BACKEND {backend!r}")
+    return BACKENDS[backend]()
+
+
+def get_embedder(backend: str | None = None):
+    """
+    Process-wide embedder for `backend` (default: RAG_EMBEDDING_BACKEND).
+    """
+    return _load(backend or getattr(settings, "RAG_EMBEDDING_BACKEND", "torch"))
+
 
 def embed_text(text: str) -> list[float]:
-    model = _get_model()
-    emb = model.encode([text], normalize_embeddings=True)[0]
-    return emb.tolist()
+    return get_embedder().encode([text], batch_size=1)[0].tolist()
+
+
+def embed_texts(texts: list[str], batch_size: int = 64):
+    """
+    Encode many texts in one call; returns a (len(texts), dim) float32 array.
+    """
+    return get_embedder().encode(texts, batch_size=batch_size)
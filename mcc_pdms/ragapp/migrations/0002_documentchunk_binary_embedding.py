@@ -0,0 +1,96 @@
+# Converts DocumentChunk.embedding from double precision[] to float32 bytes.
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+import numpy as np
+
+BATCH_SIZE = 1000
+
+# existing rows do not record their model; infer it from the dimension
+MODELS_BY_DIM = {
+    384: "sentence-transformers/all-MiniLM-L6-v2",
+    768: "sha256-hash-768",
+}
+
+
+def arrays_to_bytes(apps, schema_editor):
+    DocumentChunk = apps.get_model("ragapp", "DocumentChunk")
+    db = schema_editor.connection.alias
+    qs = DocumentChunk.objects.using(db).only("id", "embedding").order_by("id")
+    batch = []
+    for chunk in qs.iterator(chunk_size=BATCH_SIZE):
+        vec = np.asarray(chunk.embedding or [], dtype="<f4")
+        chunk.embedding_blob = vec.tobytes()
+        chunk.embedding_dim = len(vec)
+        chunk.embedding_model = MODELS_BY_DIM.get(len(vec), "")
+        batch.append(chunk)
+        if len(batch) >= BATCH_SIZE:
+            DocumentChunk.objects.using(db).bulk_update(
+                batch, ["embedding_blob", "embedding_dim", "embedding_model"]
+            )
+            batch = []
+    if batch:
+        DocumentChunk.objects.using(db).bulk_update(
+            batch, ["embedding_blob", "embedding_dim", "embedding_model"]
+        )
+
+
+def bytes_to_arrays(apps, schema_editor):
+    DocumentChunk = apps.get_model("ragapp", "DocumentChunk")
+    db = schema_editor.connection.alias
+    qs = DocumentChunk.objects.using(db).only("id", "embedding_blob").order_by("id")
+    batch = []
+    for chunk in qs.iterator(chunk_size=BATCH_SIZE):
+        chunk.embedding = np.frombuffer(chunk.embedding_blob or b"", dtype="<f4").tolist()
+        batch.append(chunk)
+        if len(batch) >= BATCH_SIZE:
+            DocumentChunk.objects.using(db).bulk_update(batch, ["embedding"])
+            batch = []
+    if batch:
+        DocumentChunk.objects.using(db).bulk_update(batch, ["embedding"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ragapp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documentchunk',
+            name='embedding',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), null=True, size=1536),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='embedding_blob',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='embedding_model',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='embedding_dim',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(arrays_to_bytes, bytes_to_arrays),
+        migrations.RemoveField(
+            model_name='documentchunk',
+            name='embedding',
+        ),
+        migrations.RenameField(
+            model_name='documentchunk',
+            old_name='embedding_blob',
+            new_name='embedding',
+        ),
+        migrations.AlterField(
+            model_name='documentchunk',
+            name='embedding',
+            field=models.BinaryField(),
+        ),
+    ]
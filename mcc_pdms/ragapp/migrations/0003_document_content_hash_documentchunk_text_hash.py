@@ -0,0 +1,42 @@
+# Adds content hashes used by incremental build_rag_index runs.
+
+import hashlib
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_text_hashes(apps, schema_editor):
+    DocumentChunk = apps.get_model("ragapp", "DocumentChunk")
+    db = schema_editor.connection.alias
+    batch = []
+    for chunk in DocumentChunk.objects.using(db).only("id", "text").iterator(chunk_size=BATCH_SIZE):
+        chunk.text_hash = hashlib.sha256(chunk.text.encode("utf-8")).hexdigest()
+        batch.append(chunk)
+        if len(batch) >= BATCH_SIZE:
+            DocumentChunk.objects.using(db).bulk_update(batch, ["text_hash"])
+            batch = []
+    if batch:
+        DocumentChunk.objects.using(db).bulk_update(batch, ["text_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ragapp', '0002_documentchunk_binary_embedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='documentchunk',
+            name='text_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(fill_text_hashes, migrations.RunPython.noop),
+    ]
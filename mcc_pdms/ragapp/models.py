@@ -1,5 +1,4 @@
 from django.db import models
-from django.contrib.postgres.fields import ArrayField  # if using Postgres
 
 class Document(models.Model):
     DOC_TYPES = [
@@ -12,6 +11,7 @@ class Document(models.Model):
     title = models.CharField(max_length=255)
     doc_type = models.CharField(max_length=20, choices=DOC_TYPES)
     source_path = models.TextField(blank=True)  # optional: file path or URL
+    content_hash = models.CharField(max_length=64, blank=True, default="")  # sha256 of source file
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -22,9 +22,19 @@ class DocumentChunk(models.Model):
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name="chunks")
     chunk_index = models.IntegerField()
     text = models.TextField()
-    # simple embedding storage; for serious usage prefer a vector DB
-    embedding = ArrayField(models.FloatField(), size=1536)  # adjust to model dim
+    text_hash = models.CharField(max_length=64, blank=True, default="")  # sha256 of text
+    # little-endian float32 bytes, see ragapp.vectors
+    embedding = models.BinaryField()
+    embedding_model = models.CharField(max_length=100, blank=True, default="")
+    embedding_dim = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ("document", "chunk_index")
+
+    @property
+    def vector(self):
+        # numpy is loaded on first use, not whenever the app registry loads
+        from .vectors import decode_vector
+
+        return decode_vector(self.embedding)
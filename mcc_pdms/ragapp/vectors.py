@@ -0,0 +1,29 @@
+# mcc_pdms/ragapp/vectors.py
+"""
+Binary codec for DocumentChunk.embedding.
+
+Embeddings are stored as raw little-endian float32 bytes next to the
+embedding model name and dimension, so rows decode straight into NumPy
+with `frombuffer` (no per-element Python floats).
+"""
+import numpy as np
+
+DTYPE = np.dtype("<f4")
+
+
+def encode_vector(vector) -> bytes:
+    return np.asarray(vector, dtype=DTYPE).ravel().tobytes()
+
+
+def decode_vector(buf) -> np.ndarray:
+    return np.frombuffer(buf, dtype=DTYPE)
+
+
+def decode_matrix(bufs, dim: int) -> np.ndarray:
+    """
+    Decode many same-dimension embeddings into one (n, dim) float32 matrix
+    with a single buffer join + frombuffer.
+    """
+    if not bufs:
+        return np.empty((0, dim), dtype=DTYPE)
+    return np.frombuffer(b"".join(bufs), dtype=DTYPE).reshape(-1, dim)